@@ -1,16 +1,15 @@
 from fastapi import APIRouter, HTTPException
-from supabase import create_client, Client
+from fastapi.responses import PlainTextResponse
+from supabase import Client
 from app.services.analyzers import financial, environmental  # make sure your analysis modules are imported
-from app.core.config import settings
+from app.db.client import get_supabase_client
+from app.db.uploads import get_pending_waits_by_organization
+from app.workers.queue_waits import queue_wait_stats
+from app.core import telemetry
 router = APIRouter()
 
 # Setup Supabase
-  # assumes you're using a centralized supabase client setup
-url = settings.SUPABASE_URL
-key = settings.SUPABASE_SECRET_KEY
-# Create Supabase client
-
-supabase: Client = create_client(url, key)
+supabase: Client = get_supabase_client()
 # A mapping of category to its analyzer function
 ANALYZERS = {
     "financial": financial.analyze_financial_data,
@@ -47,3 +46,25 @@ def get_metrics(category: str):
         "record_count": len(all_data),
         "aggregated_analysis": result,
     }
+
+
+@router.get("/ingest/queue-wait")
+def get_ingest_queue_wait():
+    """
+    Per-organization queue wait: what is pending now and how long claimed
+    uploads waited on this instance.
+    """
+    return {
+        "pending": get_pending_waits_by_organization(),
+        "claimed": queue_wait_stats.snapshot(),
+    }
+
+
+@router.get("/ingest/metrics", response_class=PlainTextResponse)
+def get_ingest_metrics():
+    """
+    Ingest metrics in the Prometheus text format: per-stage timings and rows,
+    upload outcomes, queue depth, claim latency, queue waits and factor cache
+    hits. (`/metrics` is the ESG analysis endpoint above.)
+    """
+    return PlainTextResponse(telemetry.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
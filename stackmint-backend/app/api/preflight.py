@@ -14,6 +14,7 @@ Prevents silent zero-emissions runs.
 from __future__ import annotations
 
 import logging
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastapi import APIRouter, HTTPException
@@ -21,6 +22,7 @@ from pydantic import BaseModel
 
 from app.db.client import supabase
 from app.parsing.activity_type_inference import infer_activity_type
+from app.parsing.emissions import factor_catalogue
 from app.parsing.extractors import extract_rows
 from app.parsing.mapping import normalize_columns
 from app.parsing.pipeline import _preclean_row, _is_effectively_empty_row, _is_empty_cell
@@ -76,6 +78,13 @@ class PreflightResponse(BaseModel):
 
 def _check_factor_exists(activity_type: str, unit: Optional[str]) -> Tuple[bool, Optional[str], Optional[str]]:
     """Return (exists, factor_id, factor_name) for the broadest match."""
+    catalogue_index = factor_catalogue.index(supabase)
+    if catalogue_index is not None:
+        row = (unit and catalogue_index.first_factor(activity_type, unit)) or catalogue_index.first_factor(activity_type)
+        if row:
+            return True, str(row.get("id", "")), str(row.get("name", ""))
+        return False, None, None
+
     query = (
         supabase.table("emission_factors")
         .select("id, name")
@@ -108,10 +117,15 @@ def _check_factor_exists(activity_type: str, unit: Optional[str]) -> Tuple[bool,
 
 
 def _sample_rows(upload: Dict[str, Any], max_rows: int = 200) -> List[Dict[str, Any]]:
-    local_path, _ = resolve_upload_file_path(upload)
-    working_upload = {**upload, "file_path": local_path}
-    rows = extract_rows(working_upload)
-    return [_preclean_row(r) for r in rows[:max_rows] if not _is_effectively_empty_row(_preclean_row(r))]
+    # The download stays in the upload cache for the pipeline; only this copy is removed.
+    local_path, temp_path = resolve_upload_file_path(upload)
+    try:
+        working_upload = {**upload, "file_path": local_path}
+        rows = extract_rows(working_upload, max_rows=max_rows)
+    finally:
+        if temp_path:
+            Path(temp_path).unlink(missing_ok=True)
+    return [_preclean_row(r) for r in rows if not _is_effectively_empty_row(_preclean_row(r))]
 
 
 def _required_fields_for(activity_type: str, sample_rows: List[Dict[str, Any]]) -> List[FieldPresence]:
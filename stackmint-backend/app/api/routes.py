@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Query
 import httpx
 from pydantic import BaseModel
-from supabase import create_client, Client
+from supabase import Client
 from app.core.config import settings
+from app.db.client import get_supabase_client
 import pandas as pd
 import io
 from fastapi import HTTPException
 from app.services.analyzers import governance
 import numpy as np
 from fastapi.responses import JSONResponse
-from charset_normalizer import from_bytes # pyright: ignore[reportMissingImports]
+from app.parsing.sniffing import sniff_bytes
 
 
 class Site(BaseModel):
@@ -29,11 +30,8 @@ class InviteRequest(BaseModel):
     locations: list[str]  # List of location IDs the user should have access to
     organization_id: str
 
-url = settings.SUPABASE_URL
-key = settings.SUPABASE_SECRET_KEY
-# Create Supabase client
-
-supabase: Client = create_client(url, key)
+# Shared, pooled Supabase client
+supabase: Client = get_supabase_client()
 # Define FastAPI router
 router = APIRouter()
 
@@ -183,8 +181,9 @@ async def analyze(request: AnalyzeRequest):
     
         # 2. Route to the correct pandas reader based on file type
         if file_extension == "csv":
-            detection = from_bytes(file_bytes).best()
-            df = pd.read_csv(io.BytesIO(file_bytes), encoding=detection.encoding, on_bad_lines='skip')
+            # Only the head of the file is sniffed, whatever its size.
+            dialect = sniff_bytes(file_bytes)
+            df = pd.read_csv(io.BytesIO(file_bytes), on_bad_lines='skip', **dialect.read_csv_kwargs())
             # df = pd.read_csv(io.BytesIO(file_bytes))
         elif file_extension in ["xlsx", "xls"]:
             df = pd.read_excel(io.BytesIO(file_bytes))
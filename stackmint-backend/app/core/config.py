@@ -21,9 +21,54 @@ class Settings(BaseSettings):
     )
     CLERK_SECRET_KEY: str
     INGEST_WORKER_CONCURRENCY: int = 2
+    # Autoscaling bounds for the worker pool; INGEST_WORKER_CONCURRENCY is the starting size
+    # and the effective maximum is never below it.
+    INGEST_MIN_WORKERS: int = 1
+    INGEST_MAX_WORKERS: int = 0
+    INGEST_SCALE_SAMPLE_SECONDS: float = 10.0
+    INGEST_TARGET_DRAIN_SECONDS: float = 60.0
+    INGEST_IDLE_BACKOFF_MAX_SECONDS: float = 60.0
     INGEST_POLL_INTERVAL_SECONDS: float = 2.0
+    # Wake idle workers from realtime inserts; polling then only runs every INGEST_SAFETY_POLL_SECONDS.
+    INGEST_PUSH_NOTIFICATIONS: bool = True
+    INGEST_SAFETY_POLL_SECONDS: float = 30.0
+    INGEST_CHUNK_SIZE: int = 5000
+    # Claimed uploads are leased to their worker and renewed by a heartbeat every third of
+    # the lease; an upload whose lease runs out is reclaimed by another worker.
+    INGEST_LEASE_SECONDS: int = 30
+    # Fast lane: always-on workers that only claim uploads up to these sizes, so small
+    # uploads never queue behind a backfill. Everything larger runs in the bulk lane.
+    INGEST_FAST_LANE_WORKERS: int = 1
+    INGEST_FAST_LANE_MAX_BYTES: int = 5 * 1024 * 1024
+    INGEST_FAST_LANE_MAX_ROWS: int = 50_000
+    # Bulk lane limits; the memory budget is checked against an estimate per upload, 0 disables it.
+    INGEST_BULK_CONCURRENCY: int = 1
+    INGEST_BULK_MEMORY_BUDGET_MB: int = 2048
+    # Processes used to shard row processing of large chunks; 0 or 1 keeps it in-thread.
+    INGEST_PROCESS_POOL_SIZE: int = 0
+    INGEST_SHARD_MIN_ROWS: int = 1000
+    # Sheets of one workbook upload ingested side by side.
+    INGEST_SHEET_CONCURRENCY: int = 4
+    SUPABASE_HTTP_TIMEOUT_SECONDS: float = 30.0
+    SUPABASE_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    SUPABASE_HTTP_KEEPALIVE_SECONDS: float = 30.0
+    SUPABASE_HTTP_CONNECTIONS_PER_WORKER: int = 4
+    SUPABASE_HTTP_EXTRA_CONNECTIONS: int = 10
+    # Bulk writes (activities, emissions) are split into requests of at most this many
+    # bytes/rows, sent SUPABASE_BULK_CONCURRENCY at a time per upload.
+    SUPABASE_BULK_MAX_BYTES: int = 1_000_000
+    SUPABASE_BULK_MAX_ROWS: int = 1000
+    SUPABASE_BULK_CONCURRENCY: int = 4
+    SUPABASE_BULK_RETRIES: int = 2
     EMISSION_FACTOR_CACHE_SIZE: int = 2048
     EMISSION_FACTOR_CACHE_TTL_SECONDS: int = 300
+    EMISSION_FACTOR_LOOKUP_CONCURRENCY: int = 8
+    EMISSION_FACTOR_CATALOGUE_REFRESH_SECONDS: int = 300
+    EMISSION_FACTOR_CATALOGUE_MAX_ROWS: int = 50000
+    # Downloaded uploads are kept on disk, least recently used evicted first past the cap,
+    # so preflight, the pipeline and retries share one copy. 0 disables the cache.
+    UPLOAD_CACHE_DIR: str = ""
+    UPLOAD_CACHE_MAX_MB: int = 2048
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()  # pyright: ignore[reportCallIssue]
\ No newline at end of file
@@ -0,0 +1,225 @@
+# core/telemetry.py
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+
+_LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> _LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_pairs(self, key: _LabelValues) -> List[Tuple[str, str]]:
+        return list(zip(self.labelnames, key))
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+
+class _ValueMetric(_Metric):
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[_LabelValues, float] = {}
+
+    def value(self, **labels: object) -> float:
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self._label_pairs(key))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Counter(_ValueMetric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket plus one for +Inf, then sum and count.
+        self._series: Dict[_LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 3))
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: object) -> int:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            return int(series[-1]) if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            all_series = sorted((key, list(series)) for key, series in self._series.items())
+
+        lines: List[str] = []
+        for key, series in all_series:
+            pairs = self._label_pairs(key)
+            cumulative = 0.0
+            for bound, observed in zip((*self.buckets, math.inf), series):
+                cumulative += observed
+                bucket_labels = _format_labels([*pairs, ("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    """
+    In-process metrics, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets, labelnames))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+_STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+_CLAIM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+_QUEUE_WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900, 1800, 3600)
+
+# Pipeline stages, observed once per upload with the stage's total for that upload.
+stage_wall_seconds = registry.histogram(
+    "stackmint_ingest_stage_wall_seconds",
+    "Wall time an upload spent in each pipeline stage.",
+    _STAGE_BUCKETS,
+    ("stage",),
+)
+stage_cpu_seconds = registry.histogram(
+    "stackmint_ingest_stage_cpu_seconds",
+    "CPU time an upload spent in each pipeline stage, where it can be measured.",
+    _STAGE_BUCKETS,
+    ("stage",),
+)
+stage_rows = registry.counter(
+    "stackmint_ingest_stage_rows_total",
+    "Rows handled by each pipeline stage.",
+    ("stage",),
+)
+uploads_processed = registry.counter(
+    "stackmint_ingest_uploads_total",
+    "Uploads run through the pipeline, by outcome.",
+    ("status",),
+)
+
+# Worker pool.
+queue_depth = registry.gauge(
+    "stackmint_ingest_queue_depth",
+    "Pending uploads at the last autoscaler sample.",
+)
+active_workers = registry.gauge(
+    "stackmint_ingest_active_workers",
+    "Autoscaled ingest workers currently allowed to claim uploads.",
+)
+claim_seconds = registry.histogram(
+    "stackmint_ingest_claim_seconds",
+    "Time taken by one claim attempt, by whether it claimed an upload.",
+    _CLAIM_BUCKETS,
+    ("result",),
+)
+queue_wait_seconds = registry.histogram(
+    "stackmint_ingest_queue_wait_seconds",
+    "How long claimed uploads waited in the queue.",
+    _QUEUE_WAIT_BUCKETS,
+)
+
+# Emission factor lookups.
+factor_cache_lookups = registry.counter(
+    "stackmint_emission_factor_cache_lookups_total",
+    "Emission factor cache lookups, by hit or miss.",
+    ("result",),
+)
@@ -1,14 +1,32 @@
 # db/activities.py
 
-from app.db.client import supabase
+import logging
+
+from app.db.bulk import chunk_rows, write_chunks, write_chunks_async
+from app.db.client import get_async_supabase_client, supabase
+from app.db.schema import SchemaCapabilities, get_schema_capabilities, get_schema_capabilities_async
 from typing import List, Dict, Any
 from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 from uuid import UUID
+from postgrest.exceptions import APIError
 
 from app.parsing.schemas import SCHEMAS
 
 
+logger = logging.getLogger(__name__)
+
+# An upload's activities are unique per source row, so re-sending a row updates it in place.
+_ACTIVITY_CONFLICT_KEY = "source_upload_id,row_index"
+
+# Whether company_activities has row_index and its unique key
+# (scripts/sql/company_activities_row_index_migration.sql). Learned on first use.
+_activity_upsert_available: bool | None = None
+
+# PostgREST/Postgres errors meaning the row_index column or unique key is missing.
+_UPSERT_UNSUPPORTED_CODES = frozenset({"PGRST204", "42703", "42P10"})
+
+
 def _serialize_row(row: Dict) -> Dict:
     serialized: Dict = {}
     for key, value in row.items():
@@ -51,9 +69,13 @@ def _pick_quantity(row: Dict, activity_type: str) -> float | None:
     return None
 
 
-def _resolve_organization_id(raw_org_id: object) -> object:
+def _clerk_org_id(raw_org_id: object) -> str | None:
+    """
+    The Clerk org id to look up for `raw_org_id`, or None when the value can
+    be stored as-is (not a string, blank, or already an internal UUID).
+    """
     if not isinstance(raw_org_id, str):
-        return raw_org_id
+        return None
 
     org_id = raw_org_id.strip()
     if not org_id:
@@ -62,27 +84,73 @@ def _resolve_organization_id(raw_org_id: object) -> object:
     # Already an internal UUID.
     try:
         UUID(org_id)
-        return org_id
+        return None
     except ValueError:
-        pass
+        return org_id
 
-    # Try resolving Clerk external org id to internal UUID.
-    response = (
-        supabase.table("clerk_organisations")
+
+def _passthrough_org_id(raw_org_id: object) -> object:
+    if not isinstance(raw_org_id, str):
+        return raw_org_id
+    return raw_org_id.strip() or None
+
+
+def _org_lookup_query(client: Any, clerk_org_id: str):
+    return (
+        client.table("clerk_organisations")
         .select("id")
-        .eq("clerk_org_id", org_id)
+        .eq("clerk_org_id", clerk_org_id)
         .limit(1)
-        .execute()
     )
+
+
+def _resolved_org_id(response: Any, clerk_org_id: str) -> object:
     if response.data:
         first = response.data[0]
         if isinstance(first, dict):
             return first.get("id")
+    return clerk_org_id
 
-    return org_id
+
+def _resolve_organization_id(raw_org_id: object) -> object:
+    clerk_org_id = _clerk_org_id(raw_org_id)
+    if clerk_org_id is None:
+        return _passthrough_org_id(raw_org_id)
+
+    # Try resolving Clerk external org id to internal UUID.
+    response = _org_lookup_query(supabase, clerk_org_id).execute()
+    return _resolved_org_id(response, clerk_org_id)
 
 
-def _to_activity_insert_row(row: Dict) -> Dict:
+def _resolve_organization_ids(raw_org_ids: List[object]) -> Dict[str, object]:
+    resolved: Dict[str, object] = {}
+    for raw_org_id in raw_org_ids:
+        clerk_org_id = _clerk_org_id(raw_org_id)
+        if clerk_org_id is None or clerk_org_id in resolved:
+            continue
+        resolved[clerk_org_id] = _resolve_organization_id(clerk_org_id)
+    return resolved
+
+
+async def _resolve_organization_ids_async(raw_org_ids: List[object]) -> Dict[str, object]:
+    """
+    Resolve each distinct Clerk org id in `raw_org_ids` once. Returns a map
+    from Clerk org id to the value to store.
+    """
+    resolved: Dict[str, object] = {}
+    client = None
+    for raw_org_id in raw_org_ids:
+        clerk_org_id = _clerk_org_id(raw_org_id)
+        if clerk_org_id is None or clerk_org_id in resolved:
+            continue
+        if client is None:
+            client = await get_async_supabase_client()
+        response = await _org_lookup_query(client, clerk_org_id).execute()
+        resolved[clerk_org_id] = _resolved_org_id(response, clerk_org_id)
+    return resolved
+
+
+def _to_activity_insert_row(row: Dict, organization_id: object = None) -> Dict:
     activity_type = str(row.get("activity_type") or "")
     schema = SCHEMAS.get(activity_type, {})
     scope = schema.get("scope") if isinstance(schema, dict) else None
@@ -95,7 +163,7 @@ def _to_activity_insert_row(row: Dict) -> Dict:
         activity_date = str(raw_date) if raw_date is not None else None
 
     return {
-        "organization_id": _resolve_organization_id(row.get("organization_id")),
+        "organization_id": organization_id,
         "source_upload_id": row.get("upload_id"),
         "activity_date": activity_date,
         "activity_type": activity_type,
@@ -106,25 +174,142 @@ def _to_activity_insert_row(row: Dict) -> Dict:
         "spend_amount": _to_float(row.get("amount_spent")),
         "currency": row.get("currency"),
         "company_location_id": row.get("company_location_id"),
+        "row_index": row.get("row_index"),
     }
 
 
-def insert_activities(rows: List[Dict]) -> List[Dict[str, Any]]:
+def _activity_payload(rows: List[Dict], resolved_org_ids: Dict[str, object]) -> List[Dict]:
+    payload = []
+    for row in rows:
+        raw_org_id = row.get("organization_id")
+        clerk_org_id = _clerk_org_id(raw_org_id)
+        organization_id = (
+            resolved_org_ids[clerk_org_id]
+            if clerk_org_id is not None
+            else _passthrough_org_id(raw_org_id)
+        )
+        payload.append(_to_activity_insert_row(_serialize_row(row), organization_id=organization_id))
+    return payload
+
+
+def _upsert_unsupported(exc: APIError) -> bool:
+    global _activity_upsert_available
+
+    # Once upserts have worked, a failure is a real error, not a missing migration.
+    if _activity_upsert_available or exc.code not in _UPSERT_UNSUPPORTED_CODES:
+        return False
+
+    _activity_upsert_available = False
+    logger.warning(
+        "company_activities has no (source_upload_id, row_index) key, falling back to plain inserts; "
+        "retried uploads may duplicate activities: %s",
+        exc,
+    )
+    return True
+
+
+def _learn_upsert_support(capabilities: SchemaCapabilities) -> None:
+    global _activity_upsert_available
+
+    # Without the column there is no key to upsert on; skip the failing first attempt.
+    if _activity_upsert_available is None and capabilities.has_column("company_activities", "row_index") is False:
+        _activity_upsert_available = False
+        logger.warning(
+            "company_activities has no row_index column, using plain inserts; retried uploads may duplicate activities"
+        )
+
+
+def _without_row_index(chunk: List[Dict]) -> List[Dict]:
+    return [{key: value for key, value in row.items() if key != "row_index"} for row in chunk]
+
+
+def _keyed_by_row_index(chunk: List[Dict], written: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    keyed: Dict[int, Dict[str, Any]] = {}
+    for position, activity in enumerate(written):
+        row_index = activity.get("row_index")
+        # Plain inserts don't echo row_index; they return rows in request order.
+        if not isinstance(row_index, int) and position < len(chunk):
+            row_index = chunk[position].get("row_index")
+        if isinstance(row_index, int):
+            keyed[row_index] = activity
+    return keyed
+
+
+def _write_activity_chunk(chunk: List[Dict]) -> Dict[int, Dict[str, Any]]:
+    global _activity_upsert_available
+
+    if _activity_upsert_available is not False:
+        try:
+            response = supabase.table("company_activities").upsert(chunk, on_conflict=_ACTIVITY_CONFLICT_KEY).execute()
+            _activity_upsert_available = True
+            return _keyed_by_row_index(chunk, _dict_rows(response))
+        except APIError as exc:
+            if not _upsert_unsupported(exc):
+                raise
+
+    response = supabase.table("company_activities").insert(_without_row_index(chunk)).execute()
+    return _keyed_by_row_index(chunk, _dict_rows(response))
+
+
+async def _write_activity_chunk_async(chunk: List[Dict]) -> Dict[int, Dict[str, Any]]:
+    global _activity_upsert_available
+
+    client = await get_async_supabase_client()
+    if _activity_upsert_available is not False:
+        try:
+            response = await client.table("company_activities").upsert(chunk, on_conflict=_ACTIVITY_CONFLICT_KEY).execute()
+            _activity_upsert_available = True
+            return _keyed_by_row_index(chunk, _dict_rows(response))
+        except APIError as exc:
+            if not _upsert_unsupported(exc):
+                raise
+
+    response = await client.table("company_activities").insert(_without_row_index(chunk)).execute()
+    return _keyed_by_row_index(chunk, _dict_rows(response))
+
+
+def _merge_chunks(results: List[Dict[int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+    merged: Dict[int, Dict[str, Any]] = {}
+    for keyed in results:
+        merged.update(keyed)
+    return merged
+
+
+def upsert_activities(rows: List[Dict]) -> Dict[int, Dict[str, Any]]:
+    """
+    Write validated rows as company_activities and return them keyed by
+    row_index. Rows are sent in size-bounded chunks, several at a time, as
+    upserts on (source_upload_id, row_index), so writing the same rows again
+    returns the existing activities instead of duplicating them.
+    """
 
     if not rows:
-        return []
+        return {}
 
-    payload = [_to_activity_insert_row(_serialize_row(row)) for row in rows]
-    response = supabase.table("company_activities").insert(payload).execute()
-    if not isinstance(response.data, list):
-        return []
+    _learn_upsert_support(get_schema_capabilities())
+    resolved_org_ids = _resolve_organization_ids([row.get("organization_id") for row in rows])
+    chunks = chunk_rows(_activity_payload(rows, resolved_org_ids))
+    return _merge_chunks(write_chunks(_write_activity_chunk, chunks))
 
-    inserted_rows: List[Dict[str, Any]] = []
-    for item in response.data:
-        if isinstance(item, dict):
-            inserted_rows.append(item)
 
-    return inserted_rows
+async def upsert_activities_async(rows: List[Dict]) -> Dict[int, Dict[str, Any]]:
+    """
+    Async variant of `upsert_activities`.
+    """
+
+    if not rows:
+        return {}
+
+    _learn_upsert_support(await get_schema_capabilities_async())
+    resolved_org_ids = await _resolve_organization_ids_async([row.get("organization_id") for row in rows])
+    chunks = chunk_rows(_activity_payload(rows, resolved_org_ids))
+    return _merge_chunks(await write_chunks_async(_write_activity_chunk_async, chunks))
+
+
+def _dict_rows(response: Any) -> List[Dict[str, Any]]:
+    if not isinstance(response.data, list):
+        return []
+    return [row for row in response.data if isinstance(row, dict)]
 
 
 def get_activities_for_upload(upload_id: str) -> List[Dict[str, Any]]:
@@ -134,6 +319,4 @@ def get_activities_for_upload(upload_id: str) -> List[Dict[str, Any]]:
         .eq("source_upload_id", upload_id)
         .execute()
     )
-    if not isinstance(response.data, list):
-        return []
-    return [row for row in response.data if isinstance(row, dict)]
\ No newline at end of file
+    return _dict_rows(response)
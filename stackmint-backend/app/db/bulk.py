@@ -0,0 +1,108 @@
+# db/bulk.py
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+
+import httpx
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Brackets around the JSON array.
+_ARRAY_OVERHEAD_BYTES = 2
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    # +1 for the comma between rows.
+    return len(json.dumps(row, default=str, separators=(",", ":")).encode("utf-8")) + 1
+
+
+def chunk_rows(
+    rows: List[Dict[str, Any]],
+    max_bytes: int | None = None,
+    max_rows: int | None = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split `rows` into request bodies of at most `max_bytes` of JSON and
+    `max_rows` rows (SUPABASE_BULK_MAX_BYTES / SUPABASE_BULK_MAX_ROWS by
+    default). A single row over the byte limit gets a chunk of its own.
+    """
+    max_bytes = max_bytes or settings.SUPABASE_BULK_MAX_BYTES
+    max_rows = max(1, max_rows or settings.SUPABASE_BULK_MAX_ROWS)
+
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    size = _ARRAY_OVERHEAD_BYTES
+    for row in rows:
+        row_size = _row_bytes(row)
+        if current and (size + row_size > max_bytes or len(current) >= max_rows):
+            chunks.append(current)
+            current, size = [], _ARRAY_OVERHEAD_BYTES
+        current.append(row)
+        size += row_size
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _retry_delay(attempt: int) -> float:
+    return min(0.25 * (2 ** attempt), 4.0)
+
+
+def write_chunks(write: Callable[[List[Dict[str, Any]]], T], chunks: List[List[Dict[str, Any]]]) -> List[T]:
+    """
+    Call `write` on every chunk, SUPABASE_BULK_CONCURRENCY at a time, retrying
+    a chunk on transport errors up to SUPABASE_BULK_RETRIES times. Results come
+    back in chunk order. `write` must be safe to repeat.
+    """
+
+    def _write_with_retry(chunk: List[Dict[str, Any]]) -> T:
+        for attempt in range(max(0, settings.SUPABASE_BULK_RETRIES) + 1):
+            try:
+                return write(chunk)
+            except httpx.HTTPError as exc:
+                if attempt >= settings.SUPABASE_BULK_RETRIES:
+                    raise
+                logger.warning("[Bulk] Chunk of %s rows failed (%s), retrying", len(chunk), exc)
+                time.sleep(_retry_delay(attempt))
+        raise AssertionError("unreachable")
+
+    workers = min(max(1, settings.SUPABASE_BULK_CONCURRENCY), len(chunks))
+    if workers <= 1:
+        return [_write_with_retry(chunk) for chunk in chunks]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-write") as pool:
+        return list(pool.map(_write_with_retry, chunks))
+
+
+async def write_chunks_async(
+    write: Callable[[List[Dict[str, Any]]], Awaitable[T]],
+    chunks: List[List[Dict[str, Any]]],
+) -> List[T]:
+    """
+    Async variant of `write_chunks`.
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.SUPABASE_BULK_CONCURRENCY))
+
+    async def _write_with_retry(chunk: List[Dict[str, Any]]) -> T:
+        async with semaphore:
+            for attempt in range(max(0, settings.SUPABASE_BULK_RETRIES) + 1):
+                try:
+                    return await write(chunk)
+                except httpx.HTTPError as exc:
+                    if attempt >= settings.SUPABASE_BULK_RETRIES:
+                        raise
+                    logger.warning("[Bulk] Chunk of %s rows failed (%s), retrying", len(chunk), exc)
+                    await asyncio.sleep(_retry_delay(attempt))
+        raise AssertionError("unreachable")
+
+    return list(await asyncio.gather(*(_write_with_retry(chunk) for chunk in chunks)))
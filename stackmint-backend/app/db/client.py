@@ -1,6 +1,13 @@
+import asyncio
 import os
-from supabase import create_client
+import threading
+from typing import Dict, Optional
+
+import httpx
+from supabase import AsyncClient, Client, acreate_client
+from supabase.lib.client_options import AsyncClientOptions
 from app.core.config import settings
+from app.db.pooled import create_pooled_client
 
 SUPABASE_URL = os.getenv("SUPABASE_URL") or settings.SUPABASE_URL
 SUPABASE_KEY = (
@@ -14,4 +21,146 @@ SUPABASE_KEY = (
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise RuntimeError("Supabase credentials not configured")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+_async_client: Optional[AsyncClient] = None
+_async_client_lock = asyncio.Lock()
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.SUPABASE_HTTP_TIMEOUT_SECONDS,
+        connect=settings.SUPABASE_HTTP_CONNECT_TIMEOUT_SECONDS,
+    )
+
+
+def _http_limits() -> httpx.Limits:
+    # Every ingest worker can hold a few requests in flight (factor lookups,
+    # bulk inserts, log flushes); API handlers share the headroom on top.
+    workers = max(1, settings.INGEST_WORKER_CONCURRENCY, settings.INGEST_MAX_WORKERS)
+    workers += max(0, settings.INGEST_FAST_LANE_WORKERS)
+    keepalive = workers * max(1, settings.SUPABASE_HTTP_CONNECTIONS_PER_WORKER)
+    return httpx.Limits(
+        max_connections=keepalive + settings.SUPABASE_HTTP_EXTRA_CONNECTIONS,
+        max_keepalive_connections=keepalive,
+        keepalive_expiry=settings.SUPABASE_HTTP_KEEPALIVE_SECONDS,
+    )
+
+
+def _build_client() -> Client:
+    return create_pooled_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,  # type: ignore[arg-type]
+        timeout=_http_timeout(),
+        limits=_http_limits(),
+    )
+
+
+def get_supabase_client() -> Client:
+    """
+    Process-wide Supabase client. Built once, so every upload and endpoint
+    reuses the same keep-alive HTTP/2 connection pool.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+async def _build_async_client() -> AsyncClient:
+    client = await acreate_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,  # type: ignore[arg-type]
+        options=AsyncClientOptions(
+            storage_client_timeout=settings.SUPABASE_HTTP_TIMEOUT_SECONDS,
+        ),
+    )
+
+    # Same PostgREST session swap as create_pooled_client.
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = httpx.AsyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=_http_timeout(),
+        limits=_http_limits(),
+        follow_redirects=True,
+        http2=True,
+    )
+    await default_session.aclose()
+
+    return client
+
+
+async def get_async_supabase_client() -> AsyncClient:
+    """
+    Async Supabase client for code running on the worker event loop. Built
+    once on first use; its connections belong to that loop.
+    """
+    global _async_client
+
+    if _async_client is None:
+        async with _async_client_lock:
+            if _async_client is None:
+                _async_client = await _build_async_client()
+    return _async_client
+
+
+_storage_http: Optional[httpx.Client] = None
+_storage_http_lock = threading.Lock()
+
+_async_storage_http: Optional[httpx.AsyncClient] = None
+_async_storage_http_lock = asyncio.Lock()
+
+
+def _storage_base_url() -> str:
+    return f"{SUPABASE_URL.rstrip('/')}/storage/v1/"
+
+
+def _storage_headers() -> Dict[str, str]:
+    return {"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"}  # type: ignore[dict-item]
+
+
+def get_storage_http_client() -> httpx.Client:
+    """
+    Plain HTTP client for the Storage REST API, for streaming object
+    downloads; the storage client only returns whole objects as bytes.
+    """
+    global _storage_http
+
+    if _storage_http is None:
+        with _storage_http_lock:
+            if _storage_http is None:
+                _storage_http = httpx.Client(
+                    base_url=_storage_base_url(),
+                    headers=_storage_headers(),
+                    timeout=_http_timeout(),
+                    follow_redirects=True,
+                )
+    return _storage_http
+
+
+async def get_async_storage_http_client() -> httpx.AsyncClient:
+    """
+    Async variant of `get_storage_http_client`, bound to the worker event loop.
+    """
+    global _async_storage_http
+
+    if _async_storage_http is None:
+        async with _async_storage_http_lock:
+            if _async_storage_http is None:
+                _async_storage_http = httpx.AsyncClient(
+                    base_url=_storage_base_url(),
+                    headers=_storage_headers(),
+                    timeout=_http_timeout(),
+                    follow_redirects=True,
+                )
+    return _async_storage_http
+
+
+supabase = get_supabase_client()
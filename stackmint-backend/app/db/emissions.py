@@ -1,54 +1,180 @@
 # db/emissions.py
 
-from app.db.client import supabase
-from typing import List, Dict
+import time
+
+from app.db.bulk import chunk_rows, write_chunks, write_chunks_async
+from app.db.client import get_async_supabase_client, supabase
+from app.db.schema import SchemaCapabilities, get_schema_capabilities, get_schema_capabilities_async
+from typing import Any, List, Dict
 from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 import logging
 
 logger = logging.getLogger(__name__)
 
+_CORE_COLUMNS = ("activity_id", "emission_factor_id", "co2e", "calculated_at")
+
+# An activity has one emissions row, so re-sending it updates it in place.
+_EMISSION_CONFLICT_KEY = "activity_id"
+
+# Whether company_emissions accepts every column the calculator produces, or
+# only the core ones. Learned on first use when its columns couldn't be introspected.
+_emission_full_columns: bool | None = None
+
+# Whether company_emissions has its unique activity_id key
+# (scripts/sql/company_emissions_activity_unique_migration.sql). Learned on first use.
+_emission_upsert_available: bool | None = None
+
+# PostgREST/Postgres errors meaning a column is missing / there is no unique key to upsert on.
+_UNKNOWN_COLUMN_CODES = frozenset({"PGRST204", "42703"})
+_NO_CONFLICT_KEY_CODES = frozenset({"42P10"})
+
 
 def _core_payload(row: Dict) -> Dict:
-    return {
-        "activity_id": row.get("activity_id"),
-        "emission_factor_id": row.get("emission_factor_id"),
-        "co2e": row.get("co2e"),
-        "calculated_at": row.get("calculated_at"),
-    }
+    return {column: row.get(column) for column in _CORE_COLUMNS}
 
 
-def _build_insert_candidates(rows: List[Dict]) -> List[List[Dict]]:
-    full_rows = [dict(row) for row in rows]
-    core_rows = [_core_payload(row) for row in rows]
+def _shaped(chunk: List[Dict], full_columns: bool) -> List[Dict]:
+    return chunk if full_columns else [_core_payload(row) for row in chunk]
 
-    return [full_rows, core_rows]
 
+def _supported_rows(capabilities: SchemaCapabilities, rows: List[Dict]) -> List[Dict]:
+    # With the columns known, every row is sent in an accepted shape the first time.
+    columns = capabilities.columns("company_emissions")
+    if columns is None:
+        return rows
+    return [{key: value for key, value in row.items() if key in columns} for row in rows]
 
-def insert_emissions(rows: List[Dict]):
 
-    if not rows:
-        logger.info("[Emissions Insert] No rows to insert")
-        return
+def _unique_by_activity(rows: List[Dict]) -> List[Dict]:
+    # One upsert statement can't touch the same activity twice; the last row wins.
+    by_activity: Dict[Any, Dict] = {}
+    without_activity: List[Dict] = []
+    for row in rows:
+        activity_id = row.get("activity_id")
+        if activity_id is None:
+            without_activity.append(row)
+        else:
+            by_activity[activity_id] = row
+    return list(by_activity.values()) + without_activity
+
+
+def _learn_from(exc: APIError, full_columns: bool, upserted: bool) -> bool:
+    """
+    Record what `exc` says about the table and return True if the chunk should
+    be sent again in the downgraded shape, False if it is a real error.
+    `full_columns` / `upserted` describe the request that failed.
+    """
+    global _emission_full_columns, _emission_upsert_available
+
+    # Once a shape has worked, the same failure is a real error, not a missing column or key.
+    if exc.code in _UNKNOWN_COLUMN_CODES and full_columns and not _emission_full_columns:
+        if _emission_full_columns is None:
+            logger.warning("company_emissions rejected extra columns, sending core columns only: %s", exc)
+        _emission_full_columns = False
+        return True
+
+    if exc.code in _NO_CONFLICT_KEY_CODES and upserted and not _emission_upsert_available:
+        if _emission_upsert_available is None:
+            logger.warning(
+                "company_emissions has no unique activity_id key, falling back to plain inserts; "
+                "retried uploads may duplicate emissions: %s",
+                exc,
+            )
+        _emission_upsert_available = False
+        return True
+
+    return False
+
+
+def _learn_success(full_columns: bool, upserted: bool) -> None:
+    global _emission_full_columns, _emission_upsert_available
 
-    logger.info(f"[Emissions Insert] Attempting to insert {len(rows)} rows")
-    logger.info(f"[Emissions Insert] First row fields: {list(rows[0].keys()) if rows else 'N/A'}")
-    logger.info(f"[Emissions Insert] First row sample: {rows[0] if rows else 'N/A'}")
+    if full_columns:
+        _emission_full_columns = True
+    if upserted:
+        _emission_upsert_available = True
 
-    for attempt_num, candidate_rows in enumerate(_build_insert_candidates(rows), 1):
+
+def _write_query(client: Any, payload: List[Dict], upserted: bool):
+    table = client.table("company_emissions")
+    if not upserted:
+        return table.insert(payload, returning=ReturnMethod.minimal)
+    return table.upsert(payload, on_conflict=_EMISSION_CONFLICT_KEY, returning=ReturnMethod.minimal)
+
+
+def _write_emission_chunk(chunk: List[Dict]) -> int:
+    while True:
+        full_columns, upserted = _emission_full_columns is not False, _emission_upsert_available is not False
+        try:
+            _write_query(supabase, _shaped(chunk, full_columns), upserted).execute()
+        except APIError as exc:
+            if _learn_from(exc, full_columns, upserted):
+                continue
+            raise
+        _learn_success(full_columns, upserted)
+        return len(chunk)
+
+
+async def _write_emission_chunk_async(chunk: List[Dict]) -> int:
+    client = await get_async_supabase_client()
+    while True:
+        full_columns, upserted = _emission_full_columns is not False, _emission_upsert_available is not False
         try:
-            fields_in_attempt = list(candidate_rows[0].keys()) if candidate_rows else []
-            logger.info(f"[Emissions Insert] Attempt {attempt_num}: Inserting {len(candidate_rows)} rows with {len(fields_in_attempt)} fields: {fields_in_attempt}")
-            supabase.table("company_emissions").insert(candidate_rows).execute()
-            logger.info(f"[Emissions Insert] ✅ Success on attempt {attempt_num}")
-            return
-        except APIError as e:
-            logger.warning(f"[Emissions Insert] Attempt {attempt_num} failed with APIError: {str(e)}")
-            continue
-        except Exception as e:
-            logger.error(f"[Emissions Insert] Attempt {attempt_num} failed with unexpected error: {type(e).__name__}: {str(e)}")
-            continue
-
-    raise RuntimeError("Failed to insert emissions rows into company_emissions after all attempts")
+            await _write_query(client, _shaped(chunk, full_columns), upserted).execute()
+        except APIError as exc:
+            if _learn_from(exc, full_columns, upserted):
+                continue
+            raise
+        _learn_success(full_columns, upserted)
+        return len(chunk)
+
+
+def _write_stats(written: List[int], chunk_count: int, started: float) -> Dict[str, Any]:
+    seconds = time.perf_counter() - started
+    rows = sum(written)
+    rows_per_second = rows / seconds if seconds > 0 else float(rows)
+    logger.info(
+        "[Emissions Insert] Wrote %s rows in %s chunks in %.2fs (%.0f rows/s)",
+        rows, chunk_count, seconds, rows_per_second,
+    )
+    return {"rows": rows, "chunks": chunk_count, "seconds": seconds, "rows_per_second": rows_per_second}
+
+
+def insert_emissions(rows: List[Dict]) -> Dict[str, Any]:
+    """
+    Write emissions rows to company_emissions in size-bounded chunks, several
+    at a time, as upserts on activity_id so a retried chunk or upload doesn't
+    duplicate them. Returns row/chunk counts, elapsed seconds and rows/sec.
+    """
+
+    started = time.perf_counter()
+    if not rows:
+        return _write_stats([], 0, started)
+
+    chunks = chunk_rows(_unique_by_activity(_supported_rows(get_schema_capabilities(), rows)))
+    try:
+        written = write_chunks(_write_emission_chunk, chunks)
+    except APIError as exc:
+        raise RuntimeError(f"Failed to insert emissions rows into company_emissions: {exc}") from exc
+    return _write_stats(written, len(chunks), started)
+
+
+async def insert_emissions_async(rows: List[Dict]) -> Dict[str, Any]:
+    """
+    Async variant of `insert_emissions`.
+    """
+
+    started = time.perf_counter()
+    if not rows:
+        return _write_stats([], 0, started)
+
+    chunks = chunk_rows(_unique_by_activity(_supported_rows(await get_schema_capabilities_async(), rows)))
+    try:
+        written = await write_chunks_async(_write_emission_chunk_async, chunks)
+    except APIError as exc:
+        raise RuntimeError(f"Failed to insert emissions rows into company_emissions: {exc}") from exc
+    return _write_stats(written, len(chunks), started)
 
 
 def get_emission_factor(
@@ -1,33 +1,285 @@
 # db/logs.py
 
-from app.db.client import supabase
+import asyncio
+import logging
+import threading
+import time
 from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.db.client import get_async_supabase_client, supabase
+from app.db.schema import SchemaCapabilities, get_schema_capabilities, get_schema_capabilities_async
 from postgrest.exceptions import APIError
 
+logger = logging.getLogger(__name__)
 
-def log_parsing_event(upload_id: str, severity: str, message: str, row_number: int | None = None):
-    common_payload = {
+
+def _full_payload(upload_id: str, severity: str, message: str, row_number: int | None, created_at: str) -> Dict[str, Any]:
+    return {
         "raw_upload_id": upload_id,
         "row_number": row_number,
         "error_message": message,
         "severity": severity,
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": created_at,
+    }
+
+
+def _payload_without_row_number(upload_id: str, severity: str, message: str, row_number: int | None, created_at: str) -> Dict[str, Any]:
+    return {
+        "raw_upload_id": upload_id,
+        "error_message": message,
+        "severity": severity,
+        "created_at": created_at,
     }
 
-    candidate_payloads = [
-        common_payload,
-        {k: v for k, v in common_payload.items() if k != "row_number"},
-        {
-            "upload_id": upload_id,
-            "message": message,
-            "level": severity,
-            "created_at": datetime.utcnow().isoformat(),
-        },
+
+def _legacy_payload(upload_id: str, severity: str, message: str, row_number: int | None, created_at: str) -> Dict[str, Any]:
+    return {
+        "upload_id": upload_id,
+        "message": message,
+        "level": severity,
+        "created_at": created_at,
+    }
+
+
+# company_parsing_logs has shipped with several column layouts; these are
+# tried in order until one is accepted.
+_PAYLOAD_SHAPES: List[Callable[..., Dict[str, Any]]] = [
+    _full_payload,
+    _payload_without_row_number,
+    _legacy_payload,
+]
+
+# Index of the first shape the table accepted. Learned once per process, from
+# the introspected columns when available, so later inserts skip the shapes
+# that are known to fail.
+_accepted_shape: Optional[int] = None
+
+
+def _learn_shape(capabilities: SchemaCapabilities) -> None:
+    """Pick the first shape whose columns the table has, if its columns are known."""
+    global _accepted_shape
+
+    columns = capabilities.columns("company_parsing_logs")
+    if _accepted_shape is not None or columns is None:
+        return
+
+    for shape_index, build in enumerate(_PAYLOAD_SHAPES):
+        if set(build("", "", "", None, "")) <= columns:
+            _accepted_shape = shape_index
+            return
+
+
+def _shape_order() -> List[int]:
+    order = list(range(len(_PAYLOAD_SHAPES)))
+    if _accepted_shape is not None:
+        order.remove(_accepted_shape)
+        order.insert(0, _accepted_shape)
+    return order
+
+
+def _shape_payload(shape_index: int, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    build = _PAYLOAD_SHAPES[shape_index]
+    return [
+        build(
+            event["upload_id"],
+            event["severity"],
+            event["message"],
+            event.get("row_number"),
+            event["created_at"],
+        )
+        for event in events
     ]
 
-    for payload in candidate_payloads:
+
+def insert_parsing_events(events: List[Dict[str, Any]]) -> int:
+    """
+    Bulk insert parsing events in one request.
+
+    Each event holds upload_id, severity, message, row_number and created_at.
+    Returns how many events were written (0 if no payload shape was accepted).
+    """
+    global _accepted_shape
+
+    if not events:
+        return 0
+
+    _learn_shape(get_schema_capabilities())
+    for shape_index in _shape_order():
+        payload = _shape_payload(shape_index, events)
         try:
             supabase.table("company_parsing_logs").insert(payload).execute()
-            return
         except APIError:
-            continue
\ No newline at end of file
+            continue
+
+        _accepted_shape = shape_index
+        return len(events)
+
+    logger.warning("Dropped %s parsing events: no payload shape accepted", len(events))
+    return 0
+
+
+async def insert_parsing_events_async(events: List[Dict[str, Any]]) -> int:
+    """
+    Async variant of `insert_parsing_events`.
+    """
+    global _accepted_shape
+
+    if not events:
+        return 0
+
+    _learn_shape(await get_schema_capabilities_async())
+    client = await get_async_supabase_client()
+    for shape_index in _shape_order():
+        payload = _shape_payload(shape_index, events)
+        try:
+            await client.table("company_parsing_logs").insert(payload).execute()
+        except APIError:
+            continue
+
+        _accepted_shape = shape_index
+        return len(events)
+
+    logger.warning("Dropped %s parsing events: no payload shape accepted", len(events))
+    return 0
+
+
+def _new_event(upload_id: str, severity: str, message: str, row_number: int | None) -> Dict[str, Any]:
+    return {
+        "upload_id": upload_id,
+        "severity": severity,
+        "message": message,
+        "row_number": row_number,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def log_parsing_event(upload_id: str, severity: str, message: str, row_number: int | None = None):
+    insert_parsing_events([_new_event(upload_id, severity, message, row_number)])
+
+
+class _ParsingEventBuffer:
+    def __init__(self, upload_id: str, max_events: int, flush_interval_seconds: float):
+        self.upload_id = upload_id
+        self.max_events = max(1, max_events)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.written = 0
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _append(self, severity: str, message: str, row_number: int | None) -> bool:
+        """Queue one event; returns True when a flush is due."""
+        with self._lock:
+            self._events.append(_new_event(self.upload_id, severity, message, row_number))
+            return (
+                len(self._events) >= self.max_events
+                or time.monotonic() - self._last_flush >= self.flush_interval_seconds
+            )
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            events, self._events = self._events, []
+            self._last_flush = time.monotonic()
+        return events
+
+    def _write_failed(self, events: List[Dict[str, Any]], exc: Exception) -> None:
+        logger.warning("Failed to write %s parsing events for upload %s: %s", len(events), self.upload_id, exc)
+
+
+class ParsingEventLogger(_ParsingEventBuffer):
+    """
+    Per-upload buffer for parsing events.
+
+    Events are collected in memory and written with `insert_parsing_events`
+    once `max_events` are queued or `flush_interval_seconds` have passed since
+    the last flush. Call `flush()` (or use it as a context manager) when the
+    upload finishes so the tail is written too. Flushes are best-effort: a
+    failed write is logged and never interrupts the pipeline.
+    """
+
+    def __init__(
+        self,
+        upload_id: str,
+        max_events: int = 200,
+        flush_interval_seconds: float = 2.0,
+        sink: Callable[[List[Dict[str, Any]]], int] = insert_parsing_events,
+    ):
+        super().__init__(upload_id, max_events, flush_interval_seconds)
+        self._sink = sink
+
+    def log(self, severity: str, message: str, row_number: int | None = None) -> None:
+        if self._append(severity, message, row_number):
+            self.flush()
+
+    def flush(self) -> int:
+        events = self._drain()
+        if not events:
+            return 0
+
+        try:
+            written = self._sink(events)
+        except Exception as exc:
+            self._write_failed(events, exc)
+            return 0
+
+        self.written += written
+        return written
+
+    def __enter__(self) -> "ParsingEventLogger":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.flush()
+
+
+class AsyncParsingEventLogger(_ParsingEventBuffer):
+    """
+    `ParsingEventLogger` for code running on an event loop.
+
+    `log()` never blocks: a due flush is scheduled as a task that awaits the
+    async sink. `await aflush()` writes the tail and waits for any scheduled
+    flushes, so call it once the upload finishes.
+    """
+
+    def __init__(
+        self,
+        upload_id: str,
+        max_events: int = 200,
+        flush_interval_seconds: float = 2.0,
+        sink: Callable[[List[Dict[str, Any]]], Awaitable[int]] = insert_parsing_events_async,
+    ):
+        super().__init__(upload_id, max_events, flush_interval_seconds)
+        self._sink = sink
+        self._flushes: Set["asyncio.Task[int]"] = set()
+
+    def log(self, severity: str, message: str, row_number: int | None = None) -> None:
+        if self._append(severity, message, row_number):
+            task = asyncio.get_running_loop().create_task(self._write(self._drain()))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, events: List[Dict[str, Any]]) -> int:
+        if not events:
+            return 0
+
+        try:
+            written = await self._sink(events)
+        except Exception as exc:
+            self._write_failed(events, exc)
+            return 0
+
+        self.written += written
+        return written
+
+    async def aflush(self) -> int:
+        written = await self._write(self._drain())
+        if self._flushes:
+            await asyncio.gather(*self._flushes)
+        return written
+
+    async def __aenter__(self) -> "AsyncParsingEventLogger":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aflush()
@@ -1,61 +1,127 @@
 # db/mappings.py
 
-from app.db.client import supabase
+from typing import Any
+
+from app.db.client import get_async_supabase_client, supabase
+from app.db.schema import SchemaCapabilities, get_schema_capabilities, get_schema_capabilities_async
 from postgrest.exceptions import APIError
 
+_UPLOAD_ID_KEYS = ("upload_id", "raw_upload_id", "company_raw_upload_id")
+
+_MAPPING_COLUMNS = ("source_column_name", "canonical_field_name", "original_column", "mapped_field")
+
+
+def _known_columns(capabilities: SchemaCapabilities, candidates: tuple) -> tuple:
+    """The `candidates` company_upload_mappings has, or all of them if its columns are unknown."""
+    columns = capabilities.columns("company_upload_mappings")
+    if columns is None:
+        return candidates
+    return tuple(column for column in candidates if column in columns)
+
+
+def _company_mapping_query(client: Any, upload: dict, capabilities: SchemaCapabilities):
+    """
+    Query for the organization's saved mappings, or None when the upload
+    lacks the organization/activity type needed to look them up.
+    """
+    organization_id = upload.get("organization_id")
+    activity_type = upload.get("activity_type")
+    upload_type = upload.get("file_type") or upload.get("upload_method")
+
+    mapping_columns = _known_columns(capabilities, _MAPPING_COLUMNS)
+    if not (organization_id and activity_type and mapping_columns):
+        return None
+
+    query = (
+        client.table("company_upload_mappings")
+        .select(", ".join(mapping_columns))
+        .eq("organization_id", organization_id)
+        .eq("activity_type", activity_type)
+    )
+
+    if upload_type and capabilities.has_column("company_upload_mappings", "upload_type") is not False:
+        query = query.eq("upload_type", upload_type)
+
+    return query
+
+
+def _company_mappings(data: Any) -> dict | None:
+    mappings: dict[str, str] = {}
+
+    for entry in data or []:
+        if not isinstance(entry, dict):
+            continue
+
+        source = entry.get("source_column_name") or entry.get("original_column")
+        target = entry.get("canonical_field_name") or entry.get("mapped_field")
+
+        if isinstance(source, str) and isinstance(target, str):
+            mappings[source] = target
+
+    if mappings:
+        return {"mappings": mappings}
+    return None
+
+
+def _upload_id(upload: dict | str) -> str:
+    return upload if isinstance(upload, str) else str(upload.get("id") or "")
+
+
+def _upload_mapping_query(client: Any, key: str, upload_id: str):
+    return (
+        client.table("company_upload_mappings")
+        .select("*")
+        .eq(key, upload_id)
+        .limit(1)
+    )
+
 
 def get_upload_mapping(upload: dict | str):
+    capabilities = get_schema_capabilities()
+
+    if isinstance(upload, dict):
+        try:
+            query = _company_mapping_query(supabase, upload, capabilities)
+            if query is not None:
+                mapping = _company_mappings(query.execute().data)
+                if mapping:
+                    return mapping
+        except APIError:
+            pass
+
+    upload_id = _upload_id(upload)
+
+    for key in _known_columns(capabilities, _UPLOAD_ID_KEYS):
+        try:
+            response = _upload_mapping_query(supabase, key, upload_id).execute()
+            return response.data[0] if response.data else None
+        except APIError:
+            continue
+
+    return None
+
+
+async def get_upload_mapping_async(upload: dict | str):
+    client = await get_async_supabase_client()
+    capabilities = await get_schema_capabilities_async()
+
     if isinstance(upload, dict):
-        organization_id = upload.get("organization_id")
-        activity_type = upload.get("activity_type")
-        upload_type = upload.get("file_type") or upload.get("upload_method")
-
-        if organization_id and activity_type:
-            try:
-                query = (
-                    supabase.table("company_upload_mappings")
-                    .select("source_column_name, canonical_field_name, original_column, mapped_field")
-                    .eq("organization_id", organization_id)
-                    .eq("activity_type", activity_type)
-                )
-
-                if upload_type:
-                    try:
-                        query = query.eq("upload_type", upload_type)
-                    except APIError:
-                        pass
-
-                response = query.execute()
-                mappings: dict[str, str] = {}
-
-                for entry in response.data or []:
-                    if not isinstance(entry, dict):
-                        continue
-
-                    source = entry.get("source_column_name") or entry.get("original_column")
-                    target = entry.get("canonical_field_name") or entry.get("mapped_field")
-
-                    if isinstance(source, str) and isinstance(target, str):
-                        mappings[source] = target
-
-                if mappings:
-                    return {"mappings": mappings}
-            except APIError:
-                pass
-
-    upload_id = upload if isinstance(upload, str) else str(upload.get("id") or "")
-
-    for key in ("upload_id", "raw_upload_id", "company_raw_upload_id"):
         try:
-            response = (
-                supabase.table("company_upload_mappings")
-                .select("*")
-                .eq(key, upload_id)
-                .limit(1)
-                .execute()
-            )
+            query = _company_mapping_query(client, upload, capabilities)
+            if query is not None:
+                mapping = _company_mappings((await query.execute()).data)
+                if mapping:
+                    return mapping
+        except APIError:
+            pass
+
+    upload_id = _upload_id(upload)
+
+    for key in _known_columns(capabilities, _UPLOAD_ID_KEYS):
+        try:
+            response = await _upload_mapping_query(client, key, upload_id).execute()
             return response.data[0] if response.data else None
         except APIError:
             continue
 
-    return None
\ No newline at end of file
+    return None
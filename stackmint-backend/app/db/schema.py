@@ -0,0 +1,139 @@
+# db/schema.py
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Optional
+
+import httpx
+
+from app.db.client import get_async_supabase_client, supabase
+
+
+logger = logging.getLogger(__name__)
+
+# Tables whose column layout differs between environments; the db helpers
+# shape their payloads to whatever these actually have.
+_TABLES = (
+    "company_raw_uploads",
+    "company_parsing_logs",
+    "company_upload_mappings",
+    "company_activities",
+    "company_emissions",
+)
+
+# A failed introspection is retried after this long, not on every call.
+_RETRY_SECONDS = 300
+
+_OPENAPI_HEADERS = {"Accept": "application/openapi+json"}
+
+
+class SchemaCapabilities:
+    """
+    Column sets of the tables in `_TABLES`, as PostgREST describes them.
+    A table missing here is unknown, and callers fall back to probing it.
+    """
+
+    def __init__(self, tables: Dict[str, FrozenSet[str]]):
+        self.tables = tables
+
+    def columns(self, table: str) -> Optional[FrozenSet[str]]:
+        return self.tables.get(table)
+
+    def has_column(self, table: str, column: str) -> Optional[bool]:
+        """True/False when `table` is known, None when it isn't."""
+        columns = self.columns(table)
+        return None if columns is None else column in columns
+
+    def supported(self, table: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """`fields` without the columns `table` is known not to have."""
+        columns = self.columns(table)
+        if columns is None:
+            return dict(fields)
+        return {key: value for key, value in fields.items() if key in columns}
+
+
+_UNKNOWN = SchemaCapabilities({})
+
+_capabilities: Optional[SchemaCapabilities] = None
+_failed_at: Optional[float] = None
+_lock = threading.Lock()
+_async_lock = asyncio.Lock()
+
+
+def _parse_openapi(spec: Any) -> Dict[str, FrozenSet[str]]:
+    definitions = spec.get("definitions") if isinstance(spec, dict) else None
+    if not isinstance(definitions, dict):
+        raise ValueError("PostgREST OpenAPI description has no definitions")
+
+    tables: Dict[str, FrozenSet[str]] = {}
+    for table in _TABLES:
+        definition = definitions.get(table)
+        if isinstance(definition, dict) and isinstance(definition.get("properties"), dict):
+            tables[table] = frozenset(definition["properties"])
+    return tables
+
+
+def _retry_due() -> bool:
+    return _failed_at is None or time.monotonic() - _failed_at >= _RETRY_SECONDS
+
+
+def _loaded(spec: Any) -> SchemaCapabilities:
+    global _capabilities
+
+    _capabilities = SchemaCapabilities(_parse_openapi(spec))
+    logger.info("Loaded schema capabilities for %s", ", ".join(sorted(_capabilities.tables)) or "no tables")
+    return _capabilities
+
+
+def _failed(exc: Exception) -> SchemaCapabilities:
+    global _failed_at
+
+    _failed_at = time.monotonic()
+    logger.warning("Schema introspection failed, probing tables instead: %s", exc)
+    return _UNKNOWN
+
+
+def get_schema_capabilities() -> SchemaCapabilities:
+    """
+    Table capabilities, introspected from PostgREST's OpenAPI description on
+    first use and cached for the life of the process.
+    """
+    if _capabilities is not None:
+        return _capabilities
+
+    with _lock:
+        if _capabilities is not None:
+            return _capabilities
+        if not _retry_due():
+            return _UNKNOWN
+
+        try:
+            response = supabase.postgrest.session.get("/", headers=_OPENAPI_HEADERS)
+            response.raise_for_status()
+            return _loaded(response.json())
+        except (httpx.HTTPError, ValueError) as exc:
+            return _failed(exc)
+
+
+async def get_schema_capabilities_async() -> SchemaCapabilities:
+    """
+    Async variant of `get_schema_capabilities`.
+    """
+    if _capabilities is not None:
+        return _capabilities
+
+    async with _async_lock:
+        if _capabilities is not None:
+            return _capabilities
+        if not _retry_due():
+            return _UNKNOWN
+
+        client = await get_async_supabase_client()
+        try:
+            response = await client.postgrest.session.get("/", headers=_OPENAPI_HEADERS)
+            response.raise_for_status()
+            return _loaded(response.json())
+        except (httpx.HTTPError, ValueError) as exc:
+            return _failed(exc)
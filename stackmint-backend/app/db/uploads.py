@@ -1,11 +1,14 @@
 # db/uploads.py
 
 from typing import Optional, Dict, Any, List
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+import asyncio
 import re
 import logging
 import threading
-from app.db.client import supabase
+from app.db.client import get_async_supabase_client, supabase
+from app.db.schema import SchemaCapabilities, get_schema_capabilities, get_schema_capabilities_async
+from app.core.config import settings
 from postgrest.exceptions import APIError
 
 
@@ -13,6 +16,37 @@ logger = logging.getLogger(__name__)
 
 _status_column_cache: str | None = None
 _status_column_lock = threading.Lock()
+_status_column_async_lock = asyncio.Lock()
+
+_STATUS_COLUMNS = ("parsing_status", "status")
+
+# Processing uploads untouched for this long are assumed abandoned and reclaimed.
+# Only applies to uploads claimed without a lease; leased ones are reclaimed
+# as soon as lease_expires_at passes.
+STALE_PROCESSING_SECONDS = 300
+
+# Whether claim_pending_uploads() (scripts/sql/company_raw_uploads_claim_migration.sql)
+# is installed. Learned on first use; None until then.
+_claim_rpc_available: bool | None = None
+
+# Whether the installed claim_pending_uploads() takes worker_id/lease_seconds
+# (scripts/sql/company_raw_uploads_lease_migration.sql). Learned on first use.
+_claim_rpc_leases: bool | None = None
+
+# Whether the installed claim_pending_uploads() takes max_file_size_bytes
+# (scripts/sql/company_raw_uploads_lanes_migration.sql). Learned on first use.
+_claim_rpc_size_filter: bool | None = None
+
+
+def _status_probe(client: Any, column: str):
+    return client.table("company_raw_uploads").select("id").eq(column, "pending").limit(1)
+
+
+def _known_status_column(capabilities: SchemaCapabilities) -> str | None:
+    for column in _STATUS_COLUMNS:
+        if capabilities.has_column("company_raw_uploads", column):
+            return column
+    return None
 
 
 def _detect_status_column() -> str:
@@ -25,9 +59,13 @@ def _detect_status_column() -> str:
         if _status_column_cache:
             return _status_column_cache
 
-        for column in ("parsing_status", "status"):
+        _status_column_cache = _known_status_column(get_schema_capabilities())
+        if _status_column_cache:
+            return _status_column_cache
+
+        for column in _STATUS_COLUMNS:
             try:
-                supabase.table("company_raw_uploads").select("id").eq(column, "pending").limit(1).execute()
+                _status_probe(supabase, column).execute()
                 _status_column_cache = column
                 return column
             except APIError:
@@ -36,15 +74,54 @@ def _detect_status_column() -> str:
     raise RuntimeError("No supported upload status column found")
 
 
-def _claim_upload(upload: Dict[str, Any], status_column: str, expected_status: str) -> bool:
-    upload_id = upload.get("id")
-    if not upload_id:
-        return False
+async def _detect_status_column_async() -> str:
+    global _status_column_cache
+
+    if _status_column_cache:
+        return _status_column_cache
+
+    async with _status_column_async_lock:
+        if _status_column_cache:
+            return _status_column_cache
+
+        _status_column_cache = _known_status_column(await get_schema_capabilities_async())
+        if _status_column_cache:
+            return _status_column_cache
+
+        client = await get_async_supabase_client()
+        for column in _STATUS_COLUMNS:
+            try:
+                await _status_probe(client, column).execute()
+                _status_column_cache = column
+                return column
+            except APIError:
+                continue
+
+    raise RuntimeError("No supported upload status column found")
+
+
+def _lease_expiry() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=settings.INGEST_LEASE_SECONDS)).isoformat()
+
+
+def _lease_fields(upload: Dict[str, Any], worker_id: Optional[str]) -> Dict[str, Any]:
+    # Rows from before the lease migration have no lease columns to write.
+    if not worker_id or "lease_expires_at" not in upload:
+        return {}
+    return {"worker_id": worker_id, "lease_expires_at": _lease_expiry()}
 
+
+def _claim_query(
+    client: Any,
+    upload: Dict[str, Any],
+    status_column: str,
+    expected_status: str,
+    lease: Optional[Dict[str, Any]] = None,
+):
     query = (
-        supabase.table("company_raw_uploads")
-        .update({status_column: "processing"}, count="exact", returning="minimal")
-        .eq("id", upload_id)
+        client.table("company_raw_uploads")
+        .update({status_column: "processing", **(lease or {})}, count="exact", returning="minimal")
+        .eq("id", upload["id"])
         .eq(status_column, expected_status)
     )
 
@@ -54,28 +131,150 @@ def _claim_upload(upload: Dict[str, Any], status_column: str, expected_status: s
     if isinstance(previous_updated_at, str) and previous_updated_at.strip():
         query = query.eq("updated_at", previous_updated_at)
 
-    response = query.execute()
+    return query
+
+
+def _was_claimed(response: Any) -> bool:
     if response.count is not None:
         return response.count > 0
     return bool(getattr(response, "data", None))
 
 
-def _claim_pending_upload(status_column: str) -> Optional[Dict[str, Any]]:
-    response = (
-        supabase.table("company_raw_uploads")
+def _claim_upload(
+    upload: Dict[str, Any],
+    status_column: str,
+    expected_status: str,
+    worker_id: Optional[str] = None,
+) -> bool:
+    if not upload.get("id"):
+        return False
+
+    lease = _lease_fields(upload, worker_id)
+    response = _claim_query(supabase, upload, status_column, expected_status, lease).execute()
+    if not _was_claimed(response):
+        return False
+    upload.update(lease)
+    return True
+
+
+async def _claim_upload_async(
+    upload: Dict[str, Any],
+    status_column: str,
+    expected_status: str,
+    worker_id: Optional[str] = None,
+) -> bool:
+    if not upload.get("id"):
+        return False
+
+    lease = _lease_fields(upload, worker_id)
+    client = await get_async_supabase_client()
+    response = await _claim_query(client, upload, status_column, expected_status, lease).execute()
+    if not _was_claimed(response):
+        return False
+    upload.update(lease)
+    return True
+
+
+def _pending_query(client: Any, status_column: str):
+    # Wide enough to see past one organization's bulk drop to the others queued behind it.
+    return (
+        client.table("company_raw_uploads")
         .select("*")
         .eq(status_column, "pending")
-        .limit(25)
-        .execute()
+        .order("created_at")
+        .limit(200)
+    )
+
+
+def _in_flight_query(client: Any, status_column: str):
+    return (
+        client.table("company_raw_uploads")
+        .select("organization_id")
+        .eq(status_column, "processing")
+        .limit(1000)
     )
 
+
+def _priority(upload: Dict[str, Any]) -> int:
+    try:
+        return int(upload.get("priority") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _fair_order(pending: Any, in_flight: Any) -> List[Dict[str, Any]]:
+    """
+    Order pending uploads the way claim_pending_uploads() does
+    (scripts/sql/company_raw_uploads_fair_claim_migration.sql): priority tier
+    first, then each organization's turn, then age. An organization's Nth
+    oldest pending upload gets turn N, pushed back by the uploads it already
+    has processing, so organizations take turns instead of queueing behind
+    the biggest batch.
+    """
+    running: Dict[Any, int] = {}
+    for row in in_flight or []:
+        if isinstance(row, dict):
+            org_id = row.get("organization_id")
+            running[org_id] = running.get(org_id, 0) + 1
+
+    uploads = [row for row in pending or [] if isinstance(row, dict)]
+    uploads.sort(key=lambda row: (-_priority(row), str(row.get("created_at") or "~"), str(row.get("id"))))
+
+    turns: Dict[Any, int] = {}
+    keyed = []
+    for upload in uploads:
+        org_id = upload.get("organization_id")
+        turns[org_id] = turns.get(org_id, running.get(org_id, 0)) + 1
+        keyed.append(((-_priority(upload), turns[org_id]), upload))
+
+    # sort() is stable, so age order holds within a tier and turn.
+    keyed.sort(key=lambda pair: pair[0])
+    return [upload for _, upload in keyed]
+
+
+def _within_size(upload: Dict[str, Any], max_file_size_bytes: Optional[int]) -> bool:
+    if max_file_size_bytes is None:
+        return True
+    size = upload.get("file_size_bytes")
+    return isinstance(size, (int, float)) and size <= max_file_size_bytes
+
+
+def _claim_pending_upload(
+    status_column: str,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    response = _pending_query(supabase, status_column).execute()
+
     if not response.data:
         return None
 
-    for item in response.data:
-        if not isinstance(item, dict):
+    in_flight = _in_flight_query(supabase, status_column).execute()
+    for item in _fair_order(response.data, in_flight.data):
+        if not _within_size(item, max_file_size_bytes):
+            continue
+        if _claim_upload(item, status_column, "pending", worker_id):
+            return item
+
+    return None
+
+
+async def _claim_pending_upload_async(
+    status_column: str,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    client = await get_async_supabase_client()
+    response = await _pending_query(client, status_column).execute()
+
+    if not response.data:
+        return None
+
+    in_flight = await _in_flight_query(client, status_column).execute()
+    for item in _fair_order(response.data, in_flight.data):
+        if not _within_size(item, max_file_size_bytes):
             continue
-        if _claim_upload(item, status_column, "pending"):
+        if await _claim_upload_async(item, status_column, "pending", worker_id):
             return item
 
     return None
@@ -85,7 +284,9 @@ def _update_upload_status(upload_id: str, new_status: str, error: str | None = N
     status_column = _detect_status_column()
     payload: Dict[str, Any] = {status_column: new_status}
 
-    if error is not None:
+    # Skip the error_message attempt when the column is known to be missing.
+    capabilities = get_schema_capabilities()
+    if error is not None and capabilities.has_column("company_raw_uploads", "error_message") is not False:
         try:
             supabase.table("company_raw_uploads").update({**payload, "error_message": error}).eq("id", upload_id).execute()
             return
@@ -95,18 +296,342 @@ def _update_upload_status(upload_id: str, new_status: str, error: str | None = N
     supabase.table("company_raw_uploads").update(payload).eq("id", upload_id).execute()
 
 
-def get_pending_upload() -> Optional[Dict[str, Any]]:
+async def _update_upload_status_async(upload_id: str, new_status: str, error: str | None = None) -> None:
+    status_column = await _detect_status_column_async()
+    payload: Dict[str, Any] = {status_column: new_status}
+    client = await get_async_supabase_client()
+
+    capabilities = await get_schema_capabilities_async()
+    if error is not None and capabilities.has_column("company_raw_uploads", "error_message") is not False:
+        try:
+            await client.table("company_raw_uploads").update({**payload, "error_message": error}).eq("id", upload_id).execute()
+            return
+        except APIError:
+            pass
+
+    await client.table("company_raw_uploads").update(payload).eq("id", upload_id).execute()
+
+
+def _claim_rpc_params(
+    batch_size: int,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "batch_size": max(1, batch_size),
+        "stale_after_seconds": STALE_PROCESSING_SECONDS,
+    }
+    if max_file_size_bytes is not None:
+        params["max_file_size_bytes"] = max_file_size_bytes
+    if worker_id:
+        params["worker_id"] = worker_id
+        params["lease_seconds"] = settings.INGEST_LEASE_SECONDS
+    return params
+
+
+def _claimed_rows(response: Any) -> List[Dict[str, Any]]:
+    if not isinstance(response.data, list):
+        return []
+    return [row for row in response.data if isinstance(row, dict)]
+
+
+def _claim_rpc_unavailable(exc: APIError) -> None:
+    global _claim_rpc_available
+
+    # Once the function has worked, a failure is a real error, not a missing migration.
+    if _claim_rpc_available:
+        raise exc
+
+    _claim_rpc_available = False
+    logger.warning("claim_pending_uploads() unavailable, claiming with compare-and-swap updates: %s", exc)
+
+
+def _claim_rpc_missing_parameter(exc: APIError) -> bool:
+    # PGRST202: no function matches the parameters given.
+    return exc.code == "PGRST202"
+
+
+def _claim_rpc_leases_unavailable(exc: APIError) -> None:
+    global _claim_rpc_leases
+
+    _claim_rpc_leases = False
+    logger.warning("claim_pending_uploads() has no lease parameters, claiming without leases: %s", exc)
+
+
+def _claim_rpc_size_filter_unavailable(exc: APIError) -> bool:
+    """
+    Whether a size-limited claim failed only because the installed function
+    predates lanes. If so, size-limited claims use compare-and-swap, which
+    applies the limit itself; other claims keep using the function.
+    """
+    global _claim_rpc_size_filter
+
+    if _claim_rpc_size_filter or not _claim_rpc_missing_parameter(exc):
+        return False
+
+    _claim_rpc_size_filter = False
+    logger.warning(
+        "claim_pending_uploads() has no max_file_size_bytes parameter, "
+        "claiming size-limited uploads with compare-and-swap updates: %s",
+        exc,
+    )
+    return True
+
+
+def _claim_rpc_learned(leased: bool, sized: bool) -> None:
+    global _claim_rpc_available, _claim_rpc_leases, _claim_rpc_size_filter
+
+    _claim_rpc_available = True
+    if leased:
+        _claim_rpc_leases = True
+    if sized:
+        _claim_rpc_size_filter = True
+
+
+def _claim_rpc_skipped(max_file_size_bytes: Optional[int]) -> bool:
+    if _claim_rpc_available is False:
+        return True
+    return max_file_size_bytes is not None and _claim_rpc_size_filter is False
+
+
+def _claim_uploads_rpc(
+    batch_size: int,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Claim up to `batch_size` uploads in one call to claim_pending_uploads().
+    Returns None when the function isn't installed, or can't apply
+    `max_file_size_bytes`.
+    """
+    if _claim_rpc_skipped(max_file_size_bytes):
+        return None
+
+    sized = max_file_size_bytes is not None
+    leased = bool(worker_id) and _claim_rpc_leases is not False
+    try:
+        response = supabase.rpc(
+            "claim_pending_uploads",
+            _claim_rpc_params(batch_size, max_file_size_bytes, worker_id if leased else None),
+        ).execute()
+    except APIError as exc:
+        if leased and _claim_rpc_leases is None and _claim_rpc_missing_parameter(exc):
+            # A missing size parameter fails the same way; only blame the
+            # lease parameters if the same call without them works.
+            claimed = _claim_uploads_rpc(batch_size, max_file_size_bytes)
+            if claimed is not None:
+                _claim_rpc_leases_unavailable(exc)
+            return claimed
+        if sized and _claim_rpc_size_filter_unavailable(exc):
+            return None
+        _claim_rpc_unavailable(exc)
+        return None
+
+    _claim_rpc_learned(leased, sized)
+    return _claimed_rows(response)
+
+
+async def _claim_uploads_rpc_async(
+    batch_size: int,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    if _claim_rpc_skipped(max_file_size_bytes):
+        return None
+
+    sized = max_file_size_bytes is not None
+    leased = bool(worker_id) and _claim_rpc_leases is not False
+    client = await get_async_supabase_client()
+    try:
+        response = await client.rpc(
+            "claim_pending_uploads",
+            _claim_rpc_params(batch_size, max_file_size_bytes, worker_id if leased else None),
+        ).execute()
+    except APIError as exc:
+        if leased and _claim_rpc_leases is None and _claim_rpc_missing_parameter(exc):
+            claimed = await _claim_uploads_rpc_async(batch_size, max_file_size_bytes)
+            if claimed is not None:
+                _claim_rpc_leases_unavailable(exc)
+            return claimed
+        if sized and _claim_rpc_size_filter_unavailable(exc):
+            return None
+        _claim_rpc_unavailable(exc)
+        return None
+
+    _claim_rpc_learned(leased, sized)
+    return _claimed_rows(response)
+
+
+def claim_pending_uploads(
+    batch_size: int = 1,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Claim up to `batch_size` uploads (pending first, then ones whose lease
+    has expired) and transition them to processing. With `max_file_size_bytes`,
+    only uploads known to be at most that size are claimed. With `worker_id`,
+    each claim takes an INGEST_LEASE_SECONDS lease for that worker, to be
+    kept alive with `renew_upload_lease`.
+    """
+    claimed = _claim_uploads_rpc(batch_size, max_file_size_bytes, worker_id)
+    if claimed is not None:
+        return claimed
+
+    uploads: List[Dict[str, Any]] = []
+    while len(uploads) < batch_size:
+        upload = _claim_with_compare_and_swap(max_file_size_bytes, worker_id)
+        if not upload:
+            break
+        uploads.append(upload)
+    return uploads
+
+
+async def claim_pending_uploads_async(
+    batch_size: int = 1,
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Async variant of `claim_pending_uploads`.
+    """
+    claimed = await _claim_uploads_rpc_async(batch_size, max_file_size_bytes, worker_id)
+    if claimed is not None:
+        return claimed
+
+    uploads: List[Dict[str, Any]] = []
+    while len(uploads) < batch_size:
+        upload = await _claim_with_compare_and_swap_async(max_file_size_bytes, worker_id)
+        if not upload:
+            break
+        uploads.append(upload)
+    return uploads
+
+
+def get_pending_upload(
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
     """
     Claim one upload and transition it to processing.
     """
+    claimed = claim_pending_uploads(1, max_file_size_bytes, worker_id)
+    return claimed[0] if claimed else None
+
+
+async def get_pending_upload_async(
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Async variant of `get_pending_upload`.
+    """
+    claimed = await claim_pending_uploads_async(1, max_file_size_bytes, worker_id)
+    return claimed[0] if claimed else None
+
+
+def _pending_count_query(client: Any, status_column: str):
+    return (
+        client.table("company_raw_uploads")
+        .select("id", count="exact", head=True)
+        .eq(status_column, "pending")
+    )
+
+
+def count_pending_uploads() -> int:
+    """
+    Number of uploads waiting to be claimed.
+    """
+    response = _pending_count_query(supabase, _detect_status_column()).execute()
+    return response.count or 0
+
+
+async def count_pending_uploads_async() -> int:
+    client = await get_async_supabase_client()
+    response = await _pending_count_query(client, await _detect_status_column_async()).execute()
+    return response.count or 0
+
+
+def _queue_wait_seconds(upload: Dict[str, Any], now: datetime) -> Optional[float]:
+    ts = _parse_iso(upload.get("created_at"))
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - ts).total_seconds())
+
+
+def _pending_wait_summary(rows: Any) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    summary: Dict[Any, Dict[str, Any]] = {}
+    for row in rows or []:
+        if not isinstance(row, dict):
+            continue
+        org_id = row.get("organization_id")
+        entry = summary.setdefault(org_id, {"organization_id": org_id, "pending": 0, "oldest_wait_seconds": None})
+        entry["pending"] += 1
+        wait = _queue_wait_seconds(row, now)
+        if wait is not None and (entry["oldest_wait_seconds"] is None or wait > entry["oldest_wait_seconds"]):
+            entry["oldest_wait_seconds"] = round(wait, 3)
+
+    return sorted(summary.values(), key=lambda entry: -(entry["oldest_wait_seconds"] or 0))
+
+
+def get_pending_waits_by_organization(limit: int = 5000) -> List[Dict[str, Any]]:
+    """
+    Pending uploads per organization with how long the oldest one has been
+    waiting, longest wait first.
+    """
+    response = (
+        supabase.table("company_raw_uploads")
+        .select("organization_id, created_at")
+        .eq(_detect_status_column(), "pending")
+        .order("created_at")
+        .limit(limit)
+        .execute()
+    )
+    return _pending_wait_summary(response.data)
+
+
+def _claim_with_compare_and_swap(
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fallback claim for databases without claim_pending_uploads(): select
+    candidates, then claim one with a conditional update.
+    """
     status_column = _detect_status_column()
-    claimed_pending = _claim_pending_upload(status_column)
+    claimed_pending = _claim_pending_upload(status_column, max_file_size_bytes, worker_id)
     if claimed_pending:
         return claimed_pending
 
-    # Recovery path: reclaim stale processing uploads that likely got stuck.
+    # Size-limited claims are for the fast lane; recovery is left to the bulk lane.
+    if max_file_size_bytes is not None:
+        return None
+
+    # Recovery path: reclaim processing uploads whose lease expired (or, unleased, went stale).
     stale = _get_stale_processing_upload(status_column)
-    if stale and _claim_upload(stale, status_column, "processing"):
+    if stale and _claim_upload(stale, status_column, "processing", worker_id):
+        return stale
+
+    return None
+
+
+async def _claim_with_compare_and_swap_async(
+    max_file_size_bytes: Optional[int] = None,
+    worker_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    status_column = await _detect_status_column_async()
+    claimed_pending = await _claim_pending_upload_async(status_column, max_file_size_bytes, worker_id)
+    if claimed_pending:
+        return claimed_pending
+
+    if max_file_size_bytes is not None:
+        return None
+
+    stale = await _get_stale_processing_upload_async(status_column)
+    if stale and await _claim_upload_async(stale, status_column, "processing", worker_id):
         return stale
 
     return None
@@ -126,22 +651,33 @@ def _parse_iso(value: Any) -> Optional[datetime]:
         return None
 
 
-def _get_stale_processing_upload(status_column: str, stale_after_seconds: int = 300) -> Optional[Dict[str, Any]]:
-    response = (
-        supabase.table("company_raw_uploads")
+def _processing_query(client: Any, status_column: str):
+    return (
+        client.table("company_raw_uploads")
         .select("*")
         .eq(status_column, "processing")
         .limit(50)
-        .execute()
     )
 
-    if not response.data:
+
+def _first_stale(rows: Any, stale_after_seconds: int) -> Optional[Dict[str, Any]]:
+    if not rows:
         return None
 
     now = datetime.now(timezone.utc)
-    for item in response.data:
+    for item in rows:
         if not isinstance(item, dict):
             continue
+
+        # A leased upload is only up for grabs once its lease has run out.
+        lease = _parse_iso(item.get("lease_expires_at"))
+        if lease is not None:
+            if lease.tzinfo is None:
+                lease = lease.replace(tzinfo=timezone.utc)
+            if lease <= now:
+                return item
+            continue
+
         ts = _parse_iso(item.get("updated_at") or item.get("created_at"))
         if ts is None:
             continue
@@ -154,6 +690,70 @@ def _get_stale_processing_upload(status_column: str, stale_after_seconds: int =
     return None
 
 
+def _get_stale_processing_upload(status_column: str, stale_after_seconds: int = STALE_PROCESSING_SECONDS) -> Optional[Dict[str, Any]]:
+    response = _processing_query(supabase, status_column).execute()
+    return _first_stale(response.data, stale_after_seconds)
+
+
+async def _get_stale_processing_upload_async(status_column: str, stale_after_seconds: int = STALE_PROCESSING_SECONDS) -> Optional[Dict[str, Any]]:
+    client = await get_async_supabase_client()
+    response = await _processing_query(client, status_column).execute()
+    return _first_stale(response.data, stale_after_seconds)
+
+
+def _lease_renewal_query(client: Any, upload_id: str, worker_id: str, status_column: str):
+    return (
+        client.table("company_raw_uploads")
+        .update({"lease_expires_at": _lease_expiry()}, count="exact", returning="minimal")
+        .eq("id", upload_id)
+        .eq("worker_id", worker_id)
+        .eq(status_column, "processing")
+    )
+
+
+def renew_upload_lease(upload_id: str, worker_id: str) -> bool:
+    """
+    Push the upload's lease another INGEST_LEASE_SECONDS out. Returns False
+    when `worker_id` no longer holds it (it expired and was reclaimed, or the
+    upload has finished).
+    """
+    response = _lease_renewal_query(supabase, upload_id, worker_id, _detect_status_column()).execute()
+    return _was_claimed(response)
+
+
+async def renew_upload_lease_async(upload_id: str, worker_id: str) -> bool:
+    client = await get_async_supabase_client()
+    response = await _lease_renewal_query(client, upload_id, worker_id, await _detect_status_column_async()).execute()
+    return _was_claimed(response)
+
+
+def _lease_holder_query(client: Any, upload_id: str, worker_id: str, status_column: str):
+    return (
+        client.table("company_raw_uploads")
+        .select(status_column)
+        .eq("id", upload_id)
+        .eq("worker_id", worker_id)
+        .limit(1)
+    )
+
+
+def _finished(response: Any, status_column: str) -> bool:
+    rows = response.data if isinstance(response.data, list) else []
+    return bool(rows) and rows[0].get(status_column) != "processing"
+
+
+async def upload_finished_under_lease_async(upload_id: str, worker_id: str) -> bool:
+    """
+    Whether `worker_id` still holds the upload but it is no longer processing,
+    i.e. a failed renewal means the run already finished, not that the lease
+    was lost.
+    """
+    status_column = await _detect_status_column_async()
+    client = await get_async_supabase_client()
+    response = await _lease_holder_query(client, upload_id, worker_id, status_column).execute()
+    return _finished(response, status_column)
+
+
 def mark_as_processing(upload_id: str):
     """
     Mark upload as processing with real UTC timestamp
@@ -165,48 +765,123 @@ def mark_as_completed(upload_id: str):
     _update_upload_status(upload_id, "completed")
 
 
+async def mark_as_completed_async(upload_id: str):
+    await _update_upload_status_async(upload_id, "completed")
+
+
+def complete_upload(upload_id: str, fields: Dict[str, Any]):
+    """
+    Mark an upload completed and write its final `fields` in one update.
+    """
+    update_upload_fields(upload_id, {_detect_status_column(): "completed", **fields})
+
+
+async def complete_upload_async(upload_id: str, fields: Dict[str, Any]):
+    await update_upload_fields_async(upload_id, {await _detect_status_column_async(): "completed", **fields})
+
+
 def mark_as_failed(upload_id: str, error: str):
     _update_upload_status(upload_id, "failed", error=error)
 
 
-def mark_as_pending_review(upload_id: str, reason: str):
-    payload: Dict[str, Any] = {
+async def mark_as_failed_async(upload_id: str, error: str):
+    await _update_upload_status_async(upload_id, "failed", error=error)
+
+
+def _pending_review_payload(reason: str) -> Dict[str, Any]:
+    return {
         "parsing_status": "pending_review",
         "error_message": reason,
     }
+
+
+def mark_as_pending_review(upload_id: str, reason: str):
+    payload = _pending_review_payload(reason)
     supabase.table("company_raw_uploads").update(payload).eq("id", upload_id).execute()
 
 
+async def mark_as_pending_review_async(upload_id: str, reason: str):
+    client = await get_async_supabase_client()
+    payload = _pending_review_payload(reason)
+    await client.table("company_raw_uploads").update(payload).eq("id", upload_id).execute()
+
+
 def set_upload_activity_type(upload_id: str, activity_type: str):
     supabase.table("company_raw_uploads").update({"activity_type": activity_type}).eq("id", upload_id).execute()
 
 
+async def set_upload_activity_type_async(upload_id: str, activity_type: str):
+    client = await get_async_supabase_client()
+    await client.table("company_raw_uploads").update({"activity_type": activity_type}).eq("id", upload_id).execute()
+
+
+def _unknown_column(exc: APIError, remaining: Dict[str, Any]) -> str | None:
+    message = ""
+    if isinstance(exc.args, tuple) and exc.args:
+        first = exc.args[0]
+        if isinstance(first, dict):
+            message = str(first.get("message") or "")
+        else:
+            message = str(first)
+
+    match = re.search(r"Could not find the '([^']+)' column", message)
+    if not match:
+        return None
+
+    missing_column = match.group(1)
+    if missing_column not in remaining:
+        return None
+    return missing_column
+
+
+def _supported_upload_fields(capabilities: SchemaCapabilities, upload_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    supported = capabilities.supported("company_raw_uploads", fields)
+    skipped = sorted(set(fields) - set(supported))
+    if skipped:
+        logger.debug("Skipping columns %s missing from company_raw_uploads for upload %s", skipped, upload_id)
+    return supported
+
+
 def update_upload_fields(upload_id: str, fields: Dict[str, Any]):
     if not fields:
         return
 
-    # Some environments don't yet have all optional analytics columns.
-    # Retry by stripping unknown columns reported by PostgREST schema cache.
-    remaining = dict(fields)
+    # Some environments don't yet have all optional analytics columns. Known
+    # missing columns are dropped up front; if the schema couldn't be
+    # introspected, unknown columns reported by PostgREST are stripped one by one.
+    remaining = _supported_upload_fields(get_schema_capabilities(), upload_id, fields)
     while remaining:
         try:
             supabase.table("company_raw_uploads").update(remaining).eq("id", upload_id).execute()
             return
         except APIError as exc:
-            message = ""
-            if isinstance(exc.args, tuple) and exc.args:
-                first = exc.args[0]
-                if isinstance(first, dict):
-                    message = str(first.get("message") or "")
-                else:
-                    message = str(first)
-
-            match = re.search(r"Could not find the '([^']+)' column", message)
-            if not match:
+            missing_column = _unknown_column(exc, remaining)
+            if missing_column is None:
                 raise
 
-            missing_column = match.group(1)
-            if missing_column not in remaining:
+            logger.warning(
+                "Skipping unknown column '%s' while updating upload %s",
+                missing_column,
+                upload_id,
+            )
+            remaining.pop(missing_column, None)
+
+    logger.info("No supported metadata columns to update for upload %s", upload_id)
+
+
+async def update_upload_fields_async(upload_id: str, fields: Dict[str, Any]):
+    if not fields:
+        return
+
+    client = await get_async_supabase_client()
+    remaining = _supported_upload_fields(await get_schema_capabilities_async(), upload_id, fields)
+    while remaining:
+        try:
+            await client.table("company_raw_uploads").update(remaining).eq("id", upload_id).execute()
+            return
+        except APIError as exc:
+            missing_column = _unknown_column(exc, remaining)
+            if missing_column is None:
                 raise
 
             logger.warning(
@@ -219,7 +894,7 @@ def update_upload_fields(upload_id: str, fields: Dict[str, Any]):
     logger.info("No supported metadata columns to update for upload %s", upload_id)
 
 
-def save_upload_inference_audit(
+def _inference_audit_payload(
     upload_id: str,
     inferred_activity_type: Optional[str] = None,
     inference_confidence: Optional[float] = None,
@@ -227,7 +902,7 @@ def save_upload_inference_audit(
     inference_second_best_score: Optional[float] = None,
     activity_type_review_status: Optional[str] = None,
     activity_type_review_reason: Optional[str] = None,
-):
+) -> Dict[str, Any]:
     payload: Dict[str, Any] = {
         "id": upload_id,
     }
@@ -243,6 +918,27 @@ def save_upload_inference_audit(
         payload["activity_type_review_status"] = activity_type_review_status
     if activity_type_review_reason is not None:
         payload["activity_type_review_reason"] = activity_type_review_reason
+    return payload
+
+
+def save_upload_inference_audit(
+    upload_id: str,
+    inferred_activity_type: Optional[str] = None,
+    inference_confidence: Optional[float] = None,
+    inference_second_best_type: Optional[str] = None,
+    inference_second_best_score: Optional[float] = None,
+    activity_type_review_status: Optional[str] = None,
+    activity_type_review_reason: Optional[str] = None,
+):
+    payload = _inference_audit_payload(
+        upload_id,
+        inferred_activity_type=inferred_activity_type,
+        inference_confidence=inference_confidence,
+        inference_second_best_type=inference_second_best_type,
+        inference_second_best_score=inference_second_best_score,
+        activity_type_review_status=activity_type_review_status,
+        activity_type_review_reason=activity_type_review_reason,
+    )
 
     # Best effort: schema can differ per environment.
     try:
@@ -251,6 +947,19 @@ def save_upload_inference_audit(
         pass
 
 
+async def save_upload_inference_audit_async(upload_id: str, **audit: Any):
+    """
+    Async variant of `save_upload_inference_audit`; takes the same keywords.
+    """
+    payload = _inference_audit_payload(upload_id, **audit)
+
+    try:
+        client = await get_async_supabase_client()
+        await client.table("company_raw_uploads").update(payload).eq("id", upload_id).execute()
+    except Exception:
+        pass
+
+
 def store_validated_rows(upload_id: str, rows: List[Dict[str, Any]]):
     """
     Insert validated rows into company_processed_data
@@ -263,4 +972,4 @@ def store_validated_rows(upload_id: str, rows: List[Dict[str, Any]]):
         for row in rows
     ]
 
-    supabase.table("company_processed_data").insert(payload).execute()
\ No newline at end of file
+    supabase.table("company_processed_data").insert(payload).execute()
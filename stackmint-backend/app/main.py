@@ -7,6 +7,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.metrics import router as metrics_router
 from app.api.preflight import router as preflight_router
 from app.api.routes import router
+from app.db.schema import get_schema_capabilities_async
+from app.parsing.pipeline import shutdown_process_pool
 from app.workers.polling import start_worker_pool
 from app.core.config import settings
 
@@ -38,6 +40,8 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup_event():
+    # Learn the table layouts up front so the first uploads don't probe for them.
+    asyncio.create_task(get_schema_capabilities_async())
     asyncio.create_task(
         start_worker_pool(
             concurrency=settings.INGEST_WORKER_CONCURRENCY,
@@ -46,6 +50,11 @@ async def startup_event():
     )
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_process_pool()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Hello from Stackmint backend"}
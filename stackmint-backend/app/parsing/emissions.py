@@ -6,10 +6,14 @@ import re
 import time
 import threading
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+from postgrest.exceptions import APIError
 from supabase import Client
 from app.parsing.schemas import SCHEMAS
 from app.core.config import settings
+from app.core import telemetry
 
 
 logger = logging.getLogger(__name__)
@@ -33,16 +37,17 @@ class _TTLFactorCache:
         now = time.time()
         with self._lock:
             payload = self._store.get(key)
-            if payload is None:
-                return None
-
-            expires_at, value = payload
-            if expires_at < now:
+            if payload is not None and payload[0] < now:
                 self._store.pop(key, None)
+                payload = None
+
+            if payload is None:
+                telemetry.factor_cache_lookups.inc(result="miss")
                 return None
 
+            telemetry.factor_cache_lookups.inc(result="hit")
             self._store.move_to_end(key)
-            factor_row, attempts = value
+            factor_row, attempts = payload[1]
             return (dict(factor_row) if isinstance(factor_row, dict) else None, list(attempts))
 
     def set(
@@ -77,6 +82,7 @@ _factor_cache = _TTLFactorCache(
 
 def clear_emission_factor_cache() -> None:
     _factor_cache.clear()
+    factor_catalogue.clear()
 
 
 def _safe_get_str(data: Mapping[str, Any], key: str) -> Optional[str]:
@@ -224,31 +230,26 @@ def _select_best_factor_row(
     return numeric_rows[0]
 
 
-def _fetch_emission_factor(
-    supabase: Client,
-    activity_type: str,
-    unit: Optional[str],
-    region: Optional[str],
-    year: Optional[int],
-    match_token: Optional[str] = None,
-) -> tuple[Optional[Mapping[str, Any]], List[str]]:
-    """
-    Returns (factor_row | None, list_of_attempts_tried).
-    Each attempt string describes the exact filter tuple so callers can log why
-    a match was not found.
-    """
-    cache_key = (
+_FactorLookup = tuple[str, Optional[str], Optional[str], Optional[int], Optional[str]]
+
+
+def _factor_cache_key(lookup: _FactorLookup) -> tuple[str, str, str, int, str]:
+    activity_type, unit, region, year, match_token = lookup
+    return (
         activity_type,
         unit or "",
         region or "",
         year if year is not None else -1,
         _normalize_token(match_token),
     )
-    cached = _factor_cache.get(cache_key)
-    if cached is not None:
-        return cached
 
-    attempts_tried: List[str] = []
+
+def _factor_attempts(
+    unit: Optional[str],
+    region: Optional[str],
+    year: Optional[int],
+) -> List[tuple[bool, bool, bool]]:
+    """(use_region, use_year, use_unit) filter tuples, most specific first."""
     attempts: List[tuple[bool, bool, bool]] = []
 
     if unit:
@@ -268,18 +269,322 @@ def _fetch_emission_factor(
         attempts.append((False, True, False))
     attempts.append((False, False, False))
 
-    for use_region, use_year, use_unit in attempts:
+    return attempts
+
+
+def _describe_attempt(
+    activity_type: str,
+    filter_unit: Optional[str],
+    filter_region: Optional[str],
+    filter_year: Optional[int],
+) -> str:
+    return (
+        f"activity_type={activity_type}"
+        + (f" unit={filter_unit}" if filter_unit else "")
+        + (f" region={filter_region}" if filter_region else "")
+        + (f" year={filter_year}" if filter_year is not None else "")
+    )
+
+
+@lru_cache(maxsize=1024)
+def _ilike_pattern(token: str) -> re.Pattern[str]:
+    """Regex equivalent of PostgREST `ilike '%token%'`, wildcards included."""
+    parts = []
+    for ch in token:
+        if ch in ("%", "*"):
+            parts.append(".*")
+        elif ch == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+_ANY = object()
+
+
+class _FactorIndex:
+    """
+    Immutable in-memory view of emission_factors.
+
+    Rows are indexed by every (activity_type, unit, region, year) filter
+    combination `_fetch_emission_factor` can issue, with `_ANY` standing in
+    for an unfiltered column, so each attempt is one dict lookup. Token
+    variants of detail/name/category are computed once per row and kept in
+    an inverted index for `_select_best_factor_row`-style matching.
+    """
+
+    def __init__(self, rows: Sequence[Mapping[str, Any]], version: Any = None):
+        self.version = version
+        self.rows: List[Dict[str, Any]] = [dict(r) for r in rows if isinstance(r, Mapping)]
+        self.numeric: List[bool] = [_extract_factor_decimal(r) is not None for r in self.rows]
+        self.by_key: Dict[tuple[Any, Any, Any, Any], List[int]] = {}
+        self.token_index: Dict[str, List[int]] = {}
+        self._token_matches: Dict[frozenset[str], set[int]] = {}
+        self._lock = threading.Lock()
+
+        for position, row in enumerate(self.rows):
+            activity_type = row.get("activity_type")
+            if not isinstance(activity_type, str):
+                continue
+            unit = row.get("unit") if isinstance(row.get("unit"), str) and row.get("unit") else None
+            region = row.get("region") if isinstance(row.get("region"), str) and row.get("region") else None
+            year = _safe_get_int(row, "year")
+
+            for key_unit in ((unit, _ANY) if unit is not None else (_ANY,)):
+                for key_region in ((region, _ANY) if region is not None else (_ANY,)):
+                    for key_year in ((year, _ANY) if year is not None else (_ANY,)):
+                        self.by_key.setdefault((activity_type, key_unit, key_region, key_year), []).append(position)
+
+            for column in ("detail", "name", "category"):
+                value = row.get(column)
+                for variant in _token_variants(value if isinstance(value, str) else None):
+                    positions = self.token_index.setdefault(variant, [])
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _positions(
+        self,
+        activity_type: str,
+        unit: Optional[str],
+        region: Optional[str],
+        year: Optional[int],
+    ) -> List[int]:
+        return self.by_key.get((
+            activity_type,
+            unit if unit else _ANY,
+            region if region else _ANY,
+            year if year is not None else _ANY,
+        ), [])
+
+    def _matching_positions(self, token_variants: set[str]) -> set[int]:
+        key = frozenset(token_variants)
+        with self._lock:
+            cached = self._token_matches.get(key)
+        if cached is not None:
+            return cached
+
+        # Same containment rule as _select_best_factor_row: tv == dv or tv in dv.
+        matched: set[int] = set()
+        for variant, positions in self.token_index.items():
+            if any(tv in variant for tv in key):
+                matched.update(positions)
+
+        with self._lock:
+            self._token_matches[key] = matched
+        return matched
+
+    def _select_best(self, positions: Sequence[int], match_token: Optional[str]) -> Optional[Dict[str, Any]]:
+        numeric = [p for p in positions if self.numeric[p]]
+        if not numeric:
+            return None
+
+        token_variants = _token_variants(match_token)
+        if token_variants:
+            matched = self._matching_positions(token_variants)
+            for position in numeric:
+                if position in matched:
+                    return dict(self.rows[position])
+
+        return dict(self.rows[numeric[0]])
+
+    def lookup(
+        self,
+        activity_type: str,
+        unit: Optional[str],
+        region: Optional[str],
+        year: Optional[int],
+        match_token: Optional[str] = None,
+    ) -> tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        In-memory replay of the PostgREST lookup in `_fetch_emission_factor`:
+        same attempts, same ilike and limit semantics, same selection.
+        """
+        attempts_tried: List[str] = []
+
+        for use_region, use_year, use_unit in _factor_attempts(unit, region, year):
+            filter_unit = unit if use_unit else None
+            filter_region = region if use_region else None
+            filter_year = year if use_year else None
+            attempts_tried.append(_describe_attempt(activity_type, filter_unit, filter_region, filter_year))
+
+            positions = self._positions(activity_type, filter_unit, filter_region, filter_year)
+            if not positions:
+                continue
+
+            if match_token:
+                for token in _search_tokens(match_token):
+                    pattern = _ilike_pattern(token)
+                    for column in ("detail", "name"):
+                        hits = []
+                        for position in positions:
+                            text = self.rows[position].get(column)
+                            if isinstance(text, str) and pattern.search(text):
+                                hits.append(position)
+                                if len(hits) == 100:
+                                    break
+                        selected = self._select_best(hits, match_token)
+                        if selected is not None:
+                            return selected, attempts_tried
+
+            selected = self._select_best(positions[:200], match_token)
+            if selected is not None:
+                return selected, attempts_tried
+
+        return None, attempts_tried
+
+    def first_factor(self, activity_type: str, unit: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        positions = self._positions(activity_type, unit, None, None)
+        return dict(self.rows[positions[0]]) if positions else None
+
+
+class FactorCatalogue:
+    """
+    Process-wide emission factor catalogue.
+
+    Loads the whole emission_factors table once and serves lookups from a
+    `_FactorIndex`. Every `refresh_seconds` it compares a cheap version probe
+    (row count + latest created_at) and reloads only when that changed. When
+    the table cannot be loaded, `index()` returns None and callers keep using
+    PostgREST.
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, refresh_seconds: int, max_rows: int):
+        self.refresh_seconds = max(1, int(refresh_seconds))
+        self.max_rows = max(1, int(max_rows))
+        self._index: Optional[_FactorIndex] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Mapping[str, Any]]) -> "FactorCatalogue":
+        catalogue = cls(refresh_seconds=10 ** 9, max_rows=max(1, len(rows)))
+        catalogue._index = _FactorIndex(rows)
+        catalogue._checked_at = time.monotonic()
+        return catalogue
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._checked_at = None
+
+    def index(self, supabase: Client) -> Optional[_FactorIndex]:
+        now = time.monotonic()
+        current = self._index
+        if self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+            return current
+
+        with self._lock:
+            # Another thread may have refreshed while this one waited.
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return self._index
+
+            self._checked_at = time.monotonic()
+            try:
+                version = self._fetch_version(supabase)
+                if self._index is None or self._index.version != version:
+                    self._index = self._load(supabase, version)
+                    logger.info("[Emissions] Loaded %s emission factors into catalogue", len(self._index))
+            except Exception as exc:
+                logger.warning("[Emissions] Factor catalogue unavailable, using PostgREST lookups: %s", exc)
+
+            return self._index
+
+    def _fetch_version(self, supabase: Client) -> tuple[int, Optional[str]]:
+        try:
+            response = (
+                supabase.table("emission_factors")
+                .select("id, created_at", count="exact")
+                .order("created_at", desc=True)
+                .limit(1)
+                .execute()
+            )
+        except APIError:
+            response = (
+                supabase.table("emission_factors")
+                .select("id", count="exact")
+                .limit(1)
+                .execute()
+            )
+
+        count = getattr(response, "count", None)
+        data = getattr(response, "data", None)
+        if not isinstance(count, int) or not isinstance(data, list):
+            raise EmissionsCalculationError("emission_factors version probe returned no count")
+
+        latest = data[0].get("created_at") if data and isinstance(data[0], Mapping) else None
+        return count, str(latest) if latest is not None else None
+
+    def _load(self, supabase: Client, version: tuple[int, Optional[str]]) -> _FactorIndex:
+        if version[0] > self.max_rows:
+            raise EmissionsCalculationError(
+                f"emission_factors has {version[0]} rows, above the catalogue limit of {self.max_rows}"
+            )
+
+        rows: List[Mapping[str, Any]] = []
+        start = 0
+        while True:
+            response = (
+                supabase.table("emission_factors")
+                .select("*")
+                .order("id")
+                .range(start, start + self.PAGE_SIZE - 1)
+                .execute()
+            )
+            page = getattr(response, "data", None)
+            if not isinstance(page, list):
+                raise EmissionsCalculationError("emission_factors page returned no data")
+            rows.extend(r for r in page if isinstance(r, Mapping))
+            if len(page) < self.PAGE_SIZE:
+                break
+            start += self.PAGE_SIZE
+
+        return _FactorIndex(rows, version=version)
+
+
+factor_catalogue = FactorCatalogue(
+    refresh_seconds=settings.EMISSION_FACTOR_CATALOGUE_REFRESH_SECONDS,
+    max_rows=settings.EMISSION_FACTOR_CATALOGUE_MAX_ROWS,
+)
+
+
+def _fetch_emission_factor(
+    supabase: Client,
+    activity_type: str,
+    unit: Optional[str],
+    region: Optional[str],
+    year: Optional[int],
+    match_token: Optional[str] = None,
+) -> tuple[Optional[Mapping[str, Any]], List[str]]:
+    """
+    Returns (factor_row | None, list_of_attempts_tried).
+    Each attempt string describes the exact filter tuple so callers can log why
+    a match was not found.
+    """
+    cache_key = _factor_cache_key((activity_type, unit, region, year, match_token))
+    cached = _factor_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    catalogue_index = factor_catalogue.index(supabase)
+    if catalogue_index is not None:
+        factor_row, attempts_tried = catalogue_index.lookup(activity_type, unit, region, year, match_token)
+        _factor_cache.set(cache_key, factor_row, attempts_tried)
+        return factor_row, attempts_tried
+
+    attempts_tried: List[str] = []
+
+    for use_region, use_year, use_unit in _factor_attempts(unit, region, year):
         filter_unit = unit if use_unit else None
         filter_region = region if use_region else None
         filter_year = year if use_year else None
 
-        attempt_desc = (
-            f"activity_type={activity_type}"
-            + (f" unit={filter_unit}" if filter_unit else "")
-            + (f" region={filter_region}" if filter_region else "")
-            + (f" year={filter_year}" if filter_year is not None else "")
-        )
-        attempts_tried.append(attempt_desc)
+        attempts_tried.append(_describe_attempt(activity_type, filter_unit, filter_region, filter_year))
 
         def _build_base_query():
             base_query = (
@@ -331,15 +636,13 @@ def _fetch_emission_factor(
     return None, attempts_tried
 
 
-def calculate_emissions_for_row(
-    supabase: Client,
-    row: Dict[str, Any],
-    activity_id: str,
+def _resolve_factor_lookup(
+    row: Mapping[str, Any],
     inserted_activity: Optional[Mapping[str, Any]] = None,
-) -> Dict[str, Any]:
+) -> tuple[_FactorLookup, Decimal]:
     """
-    Synchronous, enterprise-safe emissions calculation.
-    Returns a row ready for DB insertion.
+    Returns ((activity_type, unit, region, year, match_token), activity value)
+    for a row, raising when the row cannot be calculated at all.
     """
 
     if not isinstance(row, Mapping):
@@ -367,15 +670,15 @@ def calculate_emissions_for_row(
             f"Missing required emissions fields: activity_type={activity_type!r} value={value!r}"
         )
 
-    factor_row, attempts_tried = _fetch_emission_factor(
-        supabase=supabase,
-        activity_type=activity_type,
-        unit=unit,
-        region=region,
-        year=year,
-        match_token=match_token,
-    )
+    return (activity_type, unit, region, year, match_token), value
+
 
+def _build_emissions_row(
+    factor_row: Optional[Mapping[str, Any]],
+    attempts_tried: List[str],
+    value: Decimal,
+    activity_id: str,
+) -> Dict[str, Any]:
     if not factor_row:
         attempts_str = "; ".join(attempts_tried) if attempts_tried else "none"
         raise EmissionsCalculationError(
@@ -396,40 +699,141 @@ def calculate_emissions_for_row(
     }
 
 
+def calculate_emissions_for_row(
+    supabase: Client,
+    row: Dict[str, Any],
+    activity_id: str,
+    inserted_activity: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Synchronous, enterprise-safe emissions calculation.
+    Returns a row ready for DB insertion.
+    """
+
+    lookup, value = _resolve_factor_lookup(row, inserted_activity)
+    activity_type, unit, region, year, match_token = lookup
+
+    factor_row, attempts_tried = _fetch_emission_factor(
+        supabase=supabase,
+        activity_type=activity_type,
+        unit=unit,
+        region=region,
+        year=year,
+        match_token=match_token,
+    )
+
+    return _build_emissions_row(factor_row, attempts_tried, value, activity_id)
+
+
+def _resolve_factor_lookups(
+    supabase: Client,
+    lookups: Dict[tuple[str, str, str, int, str], _FactorLookup],
+) -> Dict[tuple[str, str, str, int, str], Any]:
+    """
+    Fetch each distinct lookup once, concurrently when there is more than one.
+    Values are (factor_row, attempts_tried) or the exception the fetch raised.
+    """
+
+    def _fetch(lookup: _FactorLookup) -> Any:
+        activity_type, unit, region, year, match_token = lookup
+        try:
+            return _fetch_emission_factor(
+                supabase=supabase,
+                activity_type=activity_type,
+                unit=unit,
+                region=region,
+                year=year,
+                match_token=match_token,
+            )
+        except Exception as exc:
+            return exc
+
+    workers = min(max(1, settings.EMISSION_FACTOR_LOOKUP_CONCURRENCY), len(lookups))
+    if workers <= 1:
+        return {key: _fetch(lookup) for key, lookup in lookups.items()}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="factor-lookup") as pool:
+        futures = {key: pool.submit(_fetch, lookup) for key, lookup in lookups.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def _activity_for_row(
+    inserted_activities: List[Dict[str, Any]] | Mapping[int, Dict[str, Any]],
+    index: int,
+    row: Dict[str, Any],
+) -> Any:
+    if isinstance(inserted_activities, Mapping):
+        return inserted_activities.get(row.get("row_index"))
+    return inserted_activities[index] if index < len(inserted_activities) else None
+
+
 def calculate_emissions_for_batch(
     supabase: Client,
     rows: List[Dict[str, Any]],
-    inserted_activities: List[Dict[str, Any]],
+    inserted_activities: List[Dict[str, Any]] | Mapping[int, Dict[str, Any]],
 ) -> Dict[str, Any]:
     """
     Batch-safe emissions calculation.
     Fully Pylance clean.
+
+    `inserted_activities` is either keyed by each row's row_index (as
+    returned by `upsert_activities`) or a list in the same order as `rows`.
     """
 
     emissions_rows: List[Dict[str, Any]] = []
     skipped_rows: List[Dict[str, Any]] = []
     skip_reason_counts: Dict[str, int] = {}
 
+    # Rows sharing a factor lookup key resolve it once; the first row seen for
+    # a key supplies the raw values, as it would have with the sequential cache.
+    prepared: Dict[int, Any] = {}
+    lookups: Dict[tuple[str, str, str, int, str], _FactorLookup] = {}
     for index, row in enumerate(rows):
+        activity = _activity_for_row(inserted_activities, index, row)
+        activity_id = activity.get("id") if isinstance(activity, Mapping) else None
+        if not isinstance(activity_id, str) or not activity_id:
+            continue
         try:
-            activity = inserted_activities[index] if index < len(inserted_activities) else None
+            lookup, value = _resolve_factor_lookup(
+                row,
+                activity if isinstance(activity, Mapping) else None,
+            )
+        except Exception as exc:
+            prepared[index] = exc
+            continue
+        prepared[index] = (lookup, value)
+        lookups.setdefault(_factor_cache_key(lookup), lookup)
+
+    resolved_factors = _resolve_factor_lookups(supabase, lookups)
+    if lookups:
+        logger.info("[Emissions] Resolved %s distinct factor lookups for %s rows", len(lookups), len(rows))
+
+    for index, row in enumerate(rows):
+        # Pipeline rows carry their absolute file row; fall back to batch position.
+        row_index = row.get("row_index") if isinstance(row.get("row_index"), int) else index
+        try:
+            activity = _activity_for_row(inserted_activities, index, row)
             activity_id = activity.get("id") if isinstance(activity, Mapping) else None
             if not isinstance(activity_id, str) or not activity_id:
                 reason = "no_activity_id"
                 skip_reason_counts[reason] = skip_reason_counts.get(reason, 0) + 1
                 skipped_rows.append({
-                    "row_index": index,
+                    "row_index": row_index,
                     "reason": reason,
                     "status": "skipped",
                 })
                 continue
 
-            result = calculate_emissions_for_row(
-                supabase=supabase,
-                row=row,
-                activity_id=activity_id,
-                inserted_activity=activity if isinstance(activity, Mapping) else None,
-            )
+            if isinstance(prepared[index], Exception):
+                raise prepared[index]
+
+            lookup, value = prepared[index]
+            resolved = resolved_factors[_factor_cache_key(lookup)]
+            if isinstance(resolved, Exception):
+                raise resolved
+
+            factor_row, attempts_tried = resolved
+            result = _build_emissions_row(factor_row, attempts_tried, value, activity_id)
             emissions_rows.append(result)
         except EmissionsCalculationError as e:
             reason_str = str(e)
@@ -445,7 +849,7 @@ def calculate_emissions_for_batch(
             skip_reason_counts[bucket] = skip_reason_counts.get(bucket, 0) + 1
 
             skipped_rows.append({
-                "row_index": index,
+                "row_index": row_index,
                 "reason": reason_str,
                 "bucket": bucket,
                 "status": "skipped",
@@ -454,17 +858,17 @@ def calculate_emissions_for_batch(
                 "region": row.get("region"),
                 "year": row.get("year"),
             })
-            logger.warning("[Emissions] Row %s skipped (%s): %s", index, bucket, reason_str)
+            logger.warning("[Emissions] Row %s skipped (%s): %s", row_index, bucket, reason_str)
             continue
         except Exception as e:
             skip_reason_counts["unexpected_error"] = skip_reason_counts.get("unexpected_error", 0) + 1
             skipped_rows.append({
-                "row_index": index,
+                "row_index": row_index,
                 "reason": f"unexpected emissions error: {str(e)}",
                 "bucket": "unexpected_error",
                 "status": "skipped",
             })
-            logger.exception("[Emissions] Row %s unexpected error", index)
+            logger.exception("[Emissions] Row %s unexpected error", row_index)
             continue
 
     if skipped_rows:
@@ -1,19 +1,28 @@
 # parsing/extractors.py
 
-import pandas as pd
+import math
+from itertools import islice
 from pathlib import Path
 
-from typing import List, Dict, Any
+import pandas as pd
 
+from typing import List, Dict, Any, Iterator, Optional, Sequence
+
+from app.parsing.sniffing import CsvDialect, sniff_csv
+
+try:
+    import python_calamine  # noqa: F401  (enables pandas' "calamine" engine)
+    _HAS_CALAMINE = True
+except ImportError:
+    _HAS_CALAMINE = False
 
-    
-    
-def extract_rows(upload: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """
-    Convert uploaded file into list of dict rows.
-    Assumes upload contains 'file_path'.
-    """
 
+DEFAULT_CHUNK_SIZE = 5000
+
+_EXCEL_SUFFIXES = (".xlsx", ".xls")
+
+
+def _resolve_local_path(upload: Dict[str, Any]) -> Path:
     file_path = upload.get("file_path")
     if not file_path:
         raise ValueError("Upload missing file_path")
@@ -23,13 +32,180 @@ def extract_rows(upload: Dict[str, Any]) -> List[Dict[str, Any]]:
     if not path.exists():
         raise FileNotFoundError(f"{file_path} not found")
 
-    if path.suffix.lower() == ".csv":
-        df = pd.read_csv(path)
+    return path
+
+
+def _is_blank_cell(value: Any) -> bool:
+    return value is None or value == ""
+
+
+def _excel_header(values: Sequence[Any]) -> List[str]:
+    """Column names as pandas would give them: blanks become "Unnamed: i", repeats get ".1", ".2"..."""
+    values = list(values)
+    while values and _is_blank_cell(values[-1]):
+        values.pop()
+
+    header: List[str] = []
+    seen: Dict[str, int] = {}
+    for index, value in enumerate(values):
+        name = f"Unnamed: {index}" if _is_blank_cell(value) else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        header.append(name)
+    return header
+
+
+def _iter_openpyxl_rows(path: Path, sheet_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream one sheet (the first by default) row by row with openpyxl in
+    read-only mode, so the workbook's object model is never built. Rows come
+    out as pandas would give them: the first row is the header, blank cells
+    are NaN, blank rows are kept except at the end of the sheet.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0] if sheet_name is None else workbook[sheet_name]
+        # Exporters often write a wrong dimension; without this only part of the sheet is read.
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+
+        header = _excel_header(next(rows, ()))
+        blank_rows = 0
+        for values in rows:
+            if all(_is_blank_cell(value) for value in values):
+                # Held back until a later row shows they aren't trailing.
+                blank_rows += 1
+                continue
+
+            # A value past the last header gets an unnamed column from here on.
+            last = max(index for index, value in enumerate(values) if not _is_blank_cell(value))
+            header.extend(f"Unnamed: {index}" for index in range(len(header), last + 1))
+
+            for _ in range(blank_rows):
+                yield {column: math.nan for column in header}
+            blank_rows = 0
+            yield {
+                column: math.nan if index >= len(values) or _is_blank_cell(values[index]) else values[index]
+                for index, column in enumerate(header)
+            }
+    finally:
+        workbook.close()
+
+
+def _excel_engine() -> Optional[str]:
+    return "calamine" if _HAS_CALAMINE else None
+
+
+def _streams_with_openpyxl(path: Path) -> bool:
+    # .xlsx goes through the streaming reader unless the faster calamine engine is installed.
+    return path.suffix.lower() != ".xls" and not _HAS_CALAMINE
+
 
-    elif path.suffix.lower() in [".xlsx", ".xls"]:
-        df = pd.read_excel(path)
+def _read_excel_frame(path: Path, max_rows: Optional[int], sheet_name: Optional[str] = None) -> pd.DataFrame:
+    return pd.read_excel(
+        path,
+        engine=_excel_engine(),
+        nrows=max_rows,
+        sheet_name=0 if sheet_name is None else sheet_name,
+    )
+
+
+def _iter_excel_chunks(
+    path: Path,
+    chunk_size: int,
+    max_rows: Optional[int],
+    sheet_name: Optional[str] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    if _streams_with_openpyxl(path):
+        rows = _iter_openpyxl_rows(path, sheet_name)
+        if max_rows is not None:
+            rows = islice(rows, max_rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    df = _read_excel_frame(path, max_rows, sheet_name)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size].to_dict(orient="records")  # type: ignore
+
+
+def list_sheet_names(upload: Dict[str, Any]) -> List[str]:
+    """
+    Names of the worksheets in an uploaded workbook, in workbook order.
+    Files without sheets (CSV, PDF) have none.
+    """
+    file_path = upload.get("file_path")
+    if not isinstance(file_path, str) or not file_path.lower().endswith(_EXCEL_SUFFIXES):
+        return []
+
+    path = _resolve_local_path(upload)
+    if _streams_with_openpyxl(path):
+        from openpyxl import load_workbook
+
+        # Chart sheets have no rows and are left out.
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            return [sheet.title for sheet in workbook.worksheets]
+        finally:
+            workbook.close()
+
+    with pd.ExcelFile(path, engine=_excel_engine()) as workbook:
+        return [str(name) for name in workbook.sheet_names]
+
+
+def extract_rows(upload: Dict[str, Any], max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Convert uploaded file into list of dict rows.
+    Assumes upload contains 'file_path'. `max_rows` reads only the first rows.
+    """
+
+    rows: List[Dict[str, Any]] = []
+    for chunk in iter_row_chunks(upload, max_rows or DEFAULT_CHUNK_SIZE, max_rows=max_rows):
+        rows.extend(chunk)
+    return rows
+
+
+def iter_row_chunks(
+    upload: Dict[str, Any],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_rows: Optional[int] = None,
+    sheet_name: Optional[str] = None,
+    dialect: Optional[CsvDialect] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield the uploaded file as lists of at most `chunk_size` dict rows,
+    stopping after `max_rows` rows when given (for sampling). Workbooks are
+    read from `sheet_name`, or their first sheet. CSV files are read as
+    `dialect` describes, sniffed from the head of the file when not given.
+
+    CSV files are streamed with pandas `chunksize` and .xlsx files row by row
+    with openpyxl in read-only mode, so only one chunk is held in memory at a
+    time. With python-calamine installed, Excel files are read by its much
+    faster engine instead; .xls files are read by pandas in one pass.
+    """
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    if max_rows is not None and max_rows < 1:
+        raise ValueError("max_rows must be >= 1")
+
+    path = _resolve_local_path(upload)
+    suffix = path.suffix.lower()
+
+    if suffix == ".csv":
+        dialect = dialect or sniff_csv(path)
+        with pd.read_csv(path, chunksize=chunk_size, nrows=max_rows, **dialect.read_csv_kwargs()) as reader:
+            for chunk_df in reader:
+                yield chunk_df.to_dict(orient="records")  # type: ignore
+
+    elif suffix in _EXCEL_SUFFIXES:
+        yield from _iter_excel_chunks(path, chunk_size, max_rows, sheet_name)
 
     else:
         raise ValueError("Unsupported file type")
-
-    return df.to_dict(orient="records") #type: ignore
\ No newline at end of file
@@ -1,6 +1,7 @@
 # parsing/mapping.py
 
-from typing import Dict, Any, Tuple
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Tuple
 import re
 from app.parsing.schemas import SCHEMAS
 
@@ -214,25 +215,8 @@ def _normalize_key(k: str) -> str:
 # Core Mapping Logic
 # -----------------------------
 
-def normalize_columns(
-    row: Dict[str, Any],
-    activity_type: str,
-    company_mappings: Dict[str, str] | None = None,
-) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    """
-    Normalize row columns to canonical schema fields.
-
-    Order of resolution:
-    1. Company-specific saved mappings
-    2. Deterministic alias map
-    3. Strict schema field name match
-    """
-
-    if activity_type not in SCHEMAS:
-        raise ValueError(f"Unknown activity type: {activity_type}")
-
-    schema_fields = SCHEMAS[activity_type]["fields"].keys()
-    schema_field_set = set(schema_fields)
+def _resolve_activity_aliases(activity_type: str) -> Dict[str, List[str]]:
+    schema_field_set = set(SCHEMAS[activity_type]["fields"].keys())
 
     activity_aliases = COLUMN_ALIASES.get(activity_type, {})
     if not activity_aliases and activity_type in LEGACY_ACTIVITY_ALIAS_FALLBACKS:
@@ -242,7 +226,7 @@ def normalize_columns(
     legacy_field_renames = LEGACY_SCHEMA_FIELD_RENAMES.get(activity_type, {})
 
     # Normalize stale alias entries to current schema field names and drop unsupported ones.
-    normalized_activity_aliases: Dict[str, list] = {}
+    normalized_activity_aliases: Dict[str, List[str]] = {}
     for alias_field, aliases in activity_aliases.items():
         target_field = legacy_field_renames.get(alias_field, alias_field)
         if target_field not in schema_field_set:
@@ -252,66 +236,140 @@ def normalize_columns(
             normalized_activity_aliases[target_field] = []
         normalized_activity_aliases[target_field].extend(aliases)
 
-    activity_aliases = normalized_activity_aliases
+    return normalized_activity_aliases
+
+
+class MappingPlan:
+    """
+    Precompiled column resolution for one (activity_type, headers,
+    company mappings) layout.
+
+    Each canonical field keeps its candidate source columns in resolution
+    order (company mapping, alias, strict name). A row takes the first
+    candidate whose value is not None, exactly as `normalize_columns` always
+    has, so applying a plan is a handful of dict lookups per field.
+    """
 
+    def __init__(
+        self,
+        activity_type: str,
+        headers: Tuple[Any, ...],
+        candidates: Tuple[Tuple[str, Tuple[Any, ...]], ...],
+    ):
+        self.activity_type = activity_type
+        self.headers = headers
+        self.candidates = candidates
+
+    @property
+    def columns(self) -> Dict[Any, str]:
+        """Source column -> canonical field for each field's first candidate."""
+        return {keys[0]: field for field, keys in self.candidates}
+
+    def apply(self, row: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        normalized: Dict[str, Any] = {}
+        used_source_keys = set()
+
+        for canonical_field, keys in self.candidates:
+            for key in keys:
+                value = row.get(key)
+                if value is not None:
+                    normalized[canonical_field] = value
+                    used_source_keys.add(key)
+                    break
 
-    normalized = {}
-    unmapped = {}
-    #im not sure if this is meant to be here or further down.
-    used_source_keys = set()
-    
-    
+        unmapped = {
+            key: value
+            for key, value in row.items()
+            if key not in used_source_keys
+        }
+        return normalized, unmapped
 
-    company_mappings = company_mappings or {}
+
+@lru_cache(maxsize=256)
+def _compile_mapping_plan(
+    activity_type: str,
+    headers: Tuple[Any, ...],
+    company_mapping_items: Tuple[Tuple[str, str], ...],
+) -> MappingPlan:
+    schema_fields = SCHEMAS[activity_type]["fields"].keys()
+    activity_aliases = _resolve_activity_aliases(activity_type)
 
     normalized_input_map = {
-        _normalize_key(k): k for k in row.keys()
+        _normalize_key(k): k for k in headers
     }
+    normalized_company_mappings = [
+        (_normalize_key(source_col), target_col)
+        for source_col, target_col in company_mapping_items
+    ]
+
+    candidates: List[Tuple[str, Tuple[Any, ...]]] = []
 
     for canonical_field in schema_fields:
-        
-        orig_key = None
-        value = None
+        keys: List[Any] = []
 
         # ----------------------------------
         # 1️⃣ Company-Specific Saved Mapping
         # ----------------------------------
-        for source_col, target_col in company_mappings.items():
-            if target_col == canonical_field:
-                norm_source = _normalize_key(source_col)
-                if norm_source in normalized_input_map:
-                    orig_key = normalized_input_map[norm_source]
-                    value = row[orig_key]
-                    break
+        for norm_source, target_col in normalized_company_mappings:
+            if target_col == canonical_field and norm_source in normalized_input_map:
+                keys.append(normalized_input_map[norm_source])
+                break
 
         # ----------------------------------
         # 2️⃣ Alias-Based Matching
         # ----------------------------------
-        #activity_aliases = COLUMN_ALIASES.get(activity_type, {})
-        
-        if value is None and canonical_field in activity_aliases:
-            for alias in activity_aliases[canonical_field]:
-                alias_norm = _normalize_key(alias)
-                if alias_norm in normalized_input_map:
-                    orig_key = normalized_input_map[alias_norm]
-                    value = row[orig_key]
-                    break
+        for alias in activity_aliases.get(canonical_field, []):
+            alias_norm = _normalize_key(alias)
+            if alias_norm in normalized_input_map:
+                keys.append(normalized_input_map[alias_norm])
+                break
 
         # ----------------------------------
         # 3️⃣ Strict Field Match
         # ----------------------------------
-        if value is None:
-            canonical_norm = _normalize_key(canonical_field)
-            if canonical_norm in normalized_input_map:
-                orig_key = normalized_input_map[canonical_norm]
-                value = row[orig_key]
-
-        if value is not None and orig_key is not None:
-            normalized[canonical_field] = value
-            used_source_keys.add(orig_key)
-    # Collect unmapped fields
-    for original_key in row.keys():
-        if original_key not in used_source_keys:
-            unmapped[original_key] = row[original_key]
-
-    return normalized, unmapped
\ No newline at end of file
+        canonical_norm = _normalize_key(canonical_field)
+        if canonical_norm in normalized_input_map:
+            keys.append(normalized_input_map[canonical_norm])
+
+        if keys:
+            candidates.append((canonical_field, tuple(keys)))
+
+    return MappingPlan(activity_type, headers, tuple(candidates))
+
+
+def compile_mapping_plan(
+    activity_type: str,
+    headers: Iterable[Any],
+    company_mappings: Dict[str, str] | None = None,
+) -> MappingPlan:
+    """
+    Return the memoized MappingPlan for this layout. Uploads that share an
+    activity type, header row and company mappings reuse the same plan.
+    """
+
+    if activity_type not in SCHEMAS:
+        raise ValueError(f"Unknown activity type: {activity_type}")
+
+    return _compile_mapping_plan(
+        activity_type,
+        tuple(headers),
+        tuple((company_mappings or {}).items()),
+    )
+
+
+def normalize_columns(
+    row: Dict[str, Any],
+    activity_type: str,
+    company_mappings: Dict[str, str] | None = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Normalize row columns to canonical schema fields.
+
+    Order of resolution:
+    1. Company-specific saved mappings
+    2. Deterministic alias map
+    3. Strict schema field name match
+    """
+
+    plan = compile_mapping_plan(activity_type, row.keys(), company_mappings)
+    return plan.apply(row)
@@ -1,33 +1,47 @@
+import asyncio
+import multiprocessing
+import threading
 import time
 import logging
-import os
 import math
-from typing import Dict, Any, List, cast
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Dict, Any, Generator, Iterator, List, Tuple, cast
 from pathlib import Path
 import re
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 
-from app.parsing.extractors import extract_rows
-from app.parsing.mapping import normalize_columns
-from app.parsing.validation import validate_row, ValidationError
+import pandas as pd
+
+from app.parsing.extractors import iter_row_chunks, list_sheet_names
+from app.parsing.sniffing import sniff_csv
+from app.parsing.mapping import MappingPlan, compile_mapping_plan, normalize_columns
+from app.parsing.validation import DATE_FORMATS, DATE_PROFILE_SAMPLE_SIZE, DateFormatProfile
+from app.parsing.validation import validate_frame, ValidationError
 from app.parsing.pdf import extract_pdf_with_ai
-from app.parsing.storage import resolve_upload_file_path
+from app.parsing.storage import resolve_upload_file_path, resolve_upload_file_path_async
 from app.parsing.schemas import SCHEMAS
 from app.parsing.activity_type_inference import infer_activity_type
 
-from app.db.uploads import mark_as_completed, mark_as_failed
+from app.db.client import get_supabase_client
+from app.db.uploads import complete_upload, mark_as_failed
 from app.db.uploads import mark_as_pending_review, save_upload_inference_audit, set_upload_activity_type
 from app.db.uploads import update_upload_fields
-from app.db.mappings import get_upload_mapping
-from app.db.activities import insert_activities, get_activities_for_upload
-from app.db.emissions import insert_emissions
-from app.db.logs import log_parsing_event
+from app.db.uploads import complete_upload_async, mark_as_failed_async
+from app.db.uploads import mark_as_pending_review_async, save_upload_inference_audit_async, set_upload_activity_type_async
+from app.db.uploads import update_upload_fields_async
+from app.db.mappings import get_upload_mapping, get_upload_mapping_async
+from app.db.activities import upsert_activities, upsert_activities_async
+from app.db.emissions import insert_emissions, insert_emissions_async
+from app.db.logs import ParsingEventLogger, insert_parsing_events
+from app.db.logs import AsyncParsingEventLogger, insert_parsing_events_async
 from app.core.config import settings
+from app.core import telemetry
 
 from app.parsing.emissions import calculate_emissions_for_batch
 
-from supabase import create_client
-
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -36,6 +50,146 @@ class ActivityTypeReviewRequired(Exception):
     pass
 
 
+class _Step:
+    """
+    A blocking call the pipeline hands to its driver instead of making it.
+
+    I/O steps name a db/storage helper imported here: `run_parsing_pipeline`
+    calls it and `run_parsing_pipeline_async` awaits its `<name>_async`
+    counterpart. CPU steps name a function in this module; the async driver
+    runs them in a thread so the event loop stays free for other uploads.
+    """
+
+    __slots__ = ("name", "args", "kwargs", "cpu")
+
+    def __init__(self, name: str, args: Tuple[Any, ...], kwargs: Dict[str, Any], cpu: bool):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.cpu = cpu
+
+
+def _io(name: str, *args: Any, **kwargs: Any) -> _Step:
+    return _Step(name, args, kwargs, cpu=False)
+
+
+def _cpu(name: str, *args: Any, **kwargs: Any) -> _Step:
+    return _Step(name, args, kwargs, cpu=True)
+
+
+class _Fork:
+    """
+    Sub-pipelines the driver runs side by side, at most
+    INGEST_SHEET_CONCURRENCY at a time. The result sent back holds each
+    branch's return value, or the exception it raised, in branch order.
+    """
+
+    __slots__ = ("branches",)
+
+    def __init__(self, branches: List["_PipelineSteps"]):
+        self.branches = branches
+
+
+# Generators of steps; the value sent back in is the step's result and the
+# generator's return value is the pipeline's.
+_PipelineSteps = Generator[_Step | _Fork, Any, Any]
+
+# The stage each step's time is charged to. Steps not listed count as "other".
+_STEP_STAGES: Dict[str, str] = {
+    "resolve_upload_file_path": "download",
+    "list_sheet_names": "extract",
+    "sniff_csv": "extract",
+    "extract_pdf_with_ai": "extract",
+    "_next_chunk": "extract",
+    "infer_activity_type": "activity_type_inference",
+    "save_upload_inference_audit": "activity_type_inference",
+    "mark_as_pending_review": "activity_type_inference",
+    "set_upload_activity_type": "activity_type_inference",
+    "get_upload_mapping": "mapping_load",
+    "_profile_date_columns": "row_processing",
+    "_process_chunk": "row_processing",
+    "upsert_activities": "activity_insert",
+    "calculate_emissions_for_batch": "emissions_lookup",
+    "insert_emissions": "emissions_insert",
+    "flush_event_log": "log_flush",
+    "update_upload_fields": "checkpoint",
+    "complete_upload": "finalize",
+    "mark_as_failed": "finalize",
+}
+
+
+@dataclass
+class _StageTotals:
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    cpu_measured: bool = False
+    rows: int = 0
+    calls: int = 0
+
+
+class StageTimings:
+    """
+    Wall time, CPU time and rows per pipeline stage for one upload. The
+    drivers time every step; the pipeline reports how many rows each stage
+    handled. CPU time is only known for steps that ran on a thread of their
+    own, so async I/O steps contribute wall time only. Sheets of a workbook
+    run side by side and add up into the same stages.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, _StageTotals] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, stage: str) -> _StageTotals:
+        return self._stages.setdefault(stage, _StageTotals())
+
+    def record(self, step_name: str, wall_seconds: float, cpu_seconds: float | None) -> None:
+        with self._lock:
+            stage = self._stage(_STEP_STAGES.get(step_name, "other"))
+            stage.calls += 1
+            stage.wall_seconds += wall_seconds
+            if cpu_seconds is not None:
+                stage.cpu_seconds += cpu_seconds
+                stage.cpu_measured = True
+
+    def add_rows(self, stage: str, rows: int) -> None:
+        with self._lock:
+            self._stage(stage).rows += rows
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        summary: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            stages = list(self._stages.items())
+        for name, stage in stages:
+            entry: Dict[str, Any] = {
+                "wall_seconds": round(stage.wall_seconds, 4),
+                "rows": stage.rows,
+                "calls": stage.calls,
+            }
+            if stage.cpu_measured:
+                entry["cpu_seconds"] = round(stage.cpu_seconds, 4)
+            if stage.rows and stage.wall_seconds > 0:
+                entry["rows_per_second"] = round(stage.rows / stage.wall_seconds, 1)
+            summary[name] = entry
+        return summary
+
+    def export(self, status: str) -> None:
+        """Add this upload's stage totals to the process-wide metrics."""
+        with self._lock:
+            stages = list(self._stages.items())
+        for name, stage in stages:
+            telemetry.stage_wall_seconds.observe(stage.wall_seconds, stage=name)
+            if stage.cpu_measured:
+                telemetry.stage_cpu_seconds.observe(stage.cpu_seconds, stage=name)
+            if stage.rows:
+                telemetry.stage_rows.inc(stage.rows, stage=name)
+        telemetry.uploads_processed.inc(status=status)
+
+
+def _format_stage_timings(stage_timings: Dict[str, Dict[str, Any]]) -> str:
+    return ",".join(f"{name}:{stage['wall_seconds']:.2f}s" for name, stage in stage_timings.items()) or "n/a"
+
+
 def _format_upload_summary(
     upload: Dict[str, Any],
     upload_id: str,
@@ -45,6 +199,7 @@ def _format_upload_summary(
     emissions_count: int,
     skipped_count: int,
     duration: float,
+    stage_timings: Dict[str, Dict[str, Any]] | None = None,
 ) -> str:
     file_name = upload.get("file_name") or upload.get("storage_path") or "unknown_file"
     return (
@@ -56,7 +211,8 @@ def _format_upload_summary(
         f"errors={error_count} "
         f"emissions={emissions_count} "
         f"skipped={skipped_count} "
-        f"duration_s={duration:.2f}"
+        f"duration_s={duration:.2f} "
+        f"stages={_format_stage_timings(stage_timings or {})}"
     )
 
 
@@ -179,6 +335,17 @@ def _fill_missing_required_from_unmapped(
     return mapped_row
 
 
+@lru_cache(maxsize=4096)
+def _matches_date_format(s: str) -> bool:
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.strptime(s, fmt)
+            return True
+        except Exception:
+            continue
+    return False
+
+
 def _is_date_like(value: Any) -> bool:
     if not isinstance(value, str):
         return False
@@ -187,23 +354,11 @@ def _is_date_like(value: Any) -> bool:
     if not s:
         return False
 
-    for fmt in (
-        "%Y-%m-%d",
-        "%Y/%m/%d",
-        "%d-%m-%Y",
-        "%m-%d-%Y",
-        "%m/%d/%Y",
-        "%d/%m/%Y",
-        "%m.%d.%Y",
-        "%d.%m.%Y",
-    ):
-        try:
-            datetime.strptime(s, fmt)
-            return True
-        except Exception:
-            continue
+    # Every accepted format has digits; most recovery candidates are plain words.
+    if not any(ch.isdigit() for ch in s):
+        return False
 
-    return bool(re.fullmatch(r"\d{4}", s))
+    return _matches_date_format(s) or bool(re.fullmatch(r"\d{4}", s))
 
 
 def _normalize_unit_token(value: Any) -> str | None:
@@ -333,6 +488,36 @@ def _infer_missing_required_from_values(
     return mapped_row
 
 
+_CARRY_ELIGIBLE_FIELDS = frozenset({
+    "date",
+    "facility_id",
+    "unit",
+    "gas_type",
+    "fuel_type",
+    "travel_mode",
+    "transport_mode",
+    "commute_mode",
+    "waste_type",
+    "category",
+    "currency",
+    "region",
+    "year",
+})
+
+
+@lru_cache(maxsize=64)
+def _carry_forward_fields(resolved_activity_type: str) -> Tuple[str, ...]:
+    """Required fields of the activity type that can be carried down from earlier rows."""
+    fields = SCHEMAS.get(resolved_activity_type, {}).get("fields", {})
+    return tuple(
+        field_name
+        for field_name, field_def in fields.items()
+        if field_name in _CARRY_ELIGIBLE_FIELDS
+        and isinstance(field_def, dict)
+        and field_def.get("required")
+    )
+
+
 def _apply_carry_forward_fallbacks(
     mapped_row: Dict[str, Any],
     resolved_activity_type: str,
@@ -341,33 +526,7 @@ def _apply_carry_forward_fallbacks(
     """
     Fill sparse rows where spreadsheet exports leave repeated dimensions blank.
     """
-    schema = SCHEMAS.get(resolved_activity_type, {})
-    fields = schema.get("fields", {})
-
-    carry_eligible = {
-        "date",
-        "facility_id",
-        "unit",
-        "gas_type",
-        "fuel_type",
-        "travel_mode",
-        "transport_mode",
-        "commute_mode",
-        "waste_type",
-        "category",
-        "currency",
-        "region",
-        "year",
-    }
-
-    for field_name, field_def in fields.items():
-        if field_name not in carry_eligible:
-            continue
-        if not isinstance(field_def, dict):
-            continue
-        if not field_def.get("required"):
-            continue
-
+    for field_name in _carry_forward_fields(resolved_activity_type):
         current = mapped_row.get(field_name)
         if _is_empty_cell(current):
             previous = carry_state.get(field_name)
@@ -429,14 +588,14 @@ def _apply_required_field_fallbacks(
 def _resolve_upload_activity_type(
     upload: Dict[str, Any],
     raw_rows: List[Dict[str, Any]],
-) -> str:
+) -> _PipelineSteps:
     upload_id = upload.get("id")
     raw_activity_type = upload.get("activity_type")
     if isinstance(raw_activity_type, str):
         candidate = raw_activity_type.strip()
         if candidate in SCHEMAS:
             # Guard against stale/manual type mismatches on messy real-world files.
-            inference_for_conflict = infer_activity_type(upload, raw_rows)
+            inference_for_conflict = yield _cpu("infer_activity_type", upload, raw_rows)
             if (
                 inference_for_conflict.activity_type
                 and inference_for_conflict.activity_type != candidate
@@ -446,7 +605,8 @@ def _resolve_upload_activity_type(
                 )
             ):
                 if isinstance(upload_id, str) and upload_id:
-                    save_upload_inference_audit(
+                    yield _io(
+                        "save_upload_inference_audit",
                         upload_id,
                         inferred_activity_type=inference_for_conflict.activity_type,
                         inference_confidence=inference_for_conflict.confidence,
@@ -461,16 +621,18 @@ def _resolve_upload_activity_type(
                 return inference_for_conflict.activity_type
 
             if isinstance(upload_id, str) and upload_id:
-                save_upload_inference_audit(
+                yield _io(
+                    "save_upload_inference_audit",
                     upload_id,
                     activity_type_review_status="manual_override",
                     activity_type_review_reason="Activity type supplied explicitly by user or reviewer.",
                 )
             return candidate
 
-    inference = infer_activity_type(upload, raw_rows)
+    inference = yield _cpu("infer_activity_type", upload, raw_rows)
     if isinstance(upload_id, str) and upload_id:
-        save_upload_inference_audit(
+        yield _io(
+            "save_upload_inference_audit",
             upload_id,
             inferred_activity_type=inference.activity_type,
             inference_confidence=inference.confidence,
@@ -489,7 +651,7 @@ def _resolve_upload_activity_type(
     if not inference.activity_type:
         reason = "Could not infer activity type from file. Manual review is required."
         if isinstance(upload_id, str) and upload_id:
-            mark_as_pending_review(upload_id, reason)
+            yield _io("mark_as_pending_review", upload_id, reason)
         raise ActivityTypeReviewRequired(reason)
 
     if inference.review_required:
@@ -498,12 +660,12 @@ def _resolve_upload_activity_type(
             "Manual confirmation is required before parsing continues."
         )
         if isinstance(upload_id, str) and upload_id:
-            mark_as_pending_review(upload_id, reason)
+            yield _io("mark_as_pending_review", upload_id, reason)
         raise ActivityTypeReviewRequired(reason)
 
     if isinstance(upload_id, str) and upload_id:
         try:
-            set_upload_activity_type(upload_id, inference.activity_type)
+            yield _io("set_upload_activity_type", upload_id, inference.activity_type)
         except Exception:
             logger.warning("Failed to persist inferred activity type for upload %s", upload_id)
 
@@ -519,22 +681,564 @@ def _resolve_upload_activity_type(
     return inference.activity_type
 
 
-def run_parsing_pipeline(upload: Dict[str, Any]) -> Dict[str, Any]:
+def _next_chunk(row_chunks: Iterator[List[Dict[str, Any]]]) -> List[Dict[str, Any]] | None:
+    return next(row_chunks, None)
 
-    start_time = time.time()
+
+def _iter_list_chunks(rows: List[Dict[str, Any]], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+# Bump when the checkpoint layout changes; checkpoints of another version are ignored.
+_CHECKPOINT_VERSION = 1
+
+
+def _checkpoint_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        return value.item()
+    return value
+
+
+def _load_checkpoint(upload: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    The upload's parsing_checkpoint, if it is usable: same layout version,
+    same file, and at least one chunk finished.
+    """
+    checkpoint = upload.get("parsing_checkpoint")
+    if not isinstance(checkpoint, dict) or checkpoint.get("version") != _CHECKPOINT_VERSION:
+        return None
+    if checkpoint.get("storage_path") != upload.get("storage_path"):
+        return None
+    next_row_index = checkpoint.get("next_row_index")
+    if not isinstance(next_row_index, int) or next_row_index <= 0:
+        return None
+    return checkpoint
+
+
+def _profile_date_columns(
+    raw_rows: List[Dict[str, Any]],
+    resolved_activity_type: str,
+    company_mappings: Dict[str, str],
+) -> Dict[str, DateFormatProfile]:
+    """
+    Rank date formats for each date field from a bounded sample of the
+    upload's first rows, so the rest of the file parses with the winner first.
+    """
+    fields = SCHEMAS.get(resolved_activity_type, {}).get("fields", {})
+    date_fields = [
+        field_name
+        for field_name, field_def in fields.items()
+        if isinstance(field_def, dict) and field_def.get("type") == "date"
+    ]
+    if not date_fields:
+        return {}
+
+    sample = [
+        normalize_columns(_preclean_row(raw_row), resolved_activity_type, company_mappings)[0]
+        for raw_row in raw_rows[:DATE_PROFILE_SAMPLE_SIZE]
+    ]
+
+    profiles: Dict[str, DateFormatProfile] = {}
+    for field_name in date_fields:
+        profile = DateFormatProfile.from_sample(row.get(field_name) for row in sample)
+        if profile.winner:
+            logger.info(f"[Pipeline] Date format for {field_name}: {profile.winner}")
+        profiles[field_name] = profile
+
+    return profiles
+
+
+def _map_rows(
+    raw_rows: List[Dict[str, Any]],
+    start_index: int,
+    upload: Dict[str, Any],
+    resolved_activity_type: str,
+    company_mappings: Dict[str, str],
+    carry_state: Dict[str, Any],
+    carry_written_at: Dict[str, int] | None = None,
+) -> Tuple[List[Dict[str, Any]], List[int], int, int]:
+    """
+    Map and recover one run of raw rows, updating `carry_state` in place.
+
+    Also reports how many leading raw rows read a carry-forward field before
+    any row in this run supplied its own value for it: only those rows can
+    change with a different incoming `carry_state`. When `carry_written_at`
+    is given, it records the offset of the row that last set each key.
+
+    Returns (mapped_rows, row_indexes, empty_rows_skipped, boundary_rows).
+    """
+    mapped_rows: List[Dict[str, Any]] = []
+    row_indexes: List[int] = []
+    empty_rows_skipped = 0
+    boundary_rows = 0
+    unanchored = set(_carry_forward_fields(resolved_activity_type))
+    plan: MappingPlan | None = None
+
+    for offset, raw_row in enumerate(raw_rows):
+        idx = start_index + offset
+
+        raw_row = _preclean_row(raw_row)
+
+        if _is_effectively_empty_row(raw_row):
+            logger.info(f"[Pipeline] Skipping empty row {idx}")
+            empty_rows_skipped += 1
+            continue
+
+        headers = tuple(raw_row)
+        if plan is None or plan.headers != headers:
+            plan = compile_mapping_plan(resolved_activity_type, headers, company_mappings)
+
+        mapped_row, unmapped = plan.apply(raw_row)
+
+        mapped_row = _fill_missing_required_from_unmapped(
+            mapped_row,
+            unmapped,
+            resolved_activity_type,
+        )
+
+        mapped_row = _apply_required_field_fallbacks(
+            mapped_row,
+            upload,
+            resolved_activity_type,
+        )
+
+        if unanchored:
+            missing = {field_name for field_name in unanchored if _is_empty_cell(mapped_row.get(field_name))}
+            if missing:
+                boundary_rows = offset + 1
+            unanchored = missing
+
+        mapped_row = _apply_carry_forward_fallbacks(
+            mapped_row,
+            resolved_activity_type,
+            carry_state,
+        )
+
+        mapped_row = _infer_missing_required_from_values(
+            mapped_row,
+            raw_row,
+            resolved_activity_type,
+        )
+
+        # Keep known dimension values even when another field on the row fails
+        # validation. Carried values are raw; validation normalizes them again
+        # on the row that receives them.
+        for k, v in mapped_row.items():
+            if _is_empty_cell(v):
+                continue
+            carry_state[k] = v
+            if carry_written_at is not None:
+                carry_written_at[k] = offset
+
+        mapped_rows.append(mapped_row)
+        row_indexes.append(idx)
+
+    return mapped_rows, row_indexes, empty_rows_skipped, boundary_rows
+
+
+def _validate_mapped_rows(
+    mapped_rows: List[Dict[str, Any]],
+    row_indexes: List[int],
+    upload: Dict[str, Any],
+    resolved_activity_type: str,
+    date_profiles: Dict[str, DateFormatProfile] | None = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    errors: List[Dict[str, Any]] = []
+    if not mapped_rows:
+        return [], errors
+
+    # Validate the whole chunk column by column instead of row by row.
+    fields = SCHEMAS.get(resolved_activity_type, {}).get("fields", {})
+    # object dtype keeps values as mapped: an int column with a None would turn float.
+    frame = pd.DataFrame(mapped_rows, columns=list(fields), dtype=object)
+    validated, failed = validate_frame(
+        frame,
+        resolved_activity_type,
+        allow_extra=False,
+        date_profiles=date_profiles,
+    )
+
+    for pos, ve in failed:
+        errors.append({
+            "row_index": row_indexes[pos],
+            "error": str(ve),
+        })
+
+    validated_rows: List[Dict[str, Any]] = []
+    upload_id = upload["id"]
+    organization_id = upload.get("organization_id")
+    company_location_id = upload.get("company_location_id") or upload.get("file_site_id")
+
+    for pos, validated_row in validated:
+        extras = {
+            k: v for k, v in mapped_rows[pos].items()
+            if k not in fields
+        }
+        if extras:
+            validated_row["_audit_extra"] = extras
+
+        # Keep activity type on each row so emissions lookup can match factors.
+        validated_row["activity_type"] = resolved_activity_type
+        validated_row["upload_id"] = upload_id
+        validated_row["row_index"] = row_indexes[pos]
+        validated_row["organization_id"] = organization_id
+        validated_row["company_location_id"] = company_location_id
+
+        validated_rows.append(validated_row)
+
+    return validated_rows, errors
+
+
+def _process_rows(
+    raw_rows: List[Dict[str, Any]],
+    start_index: int,
+    upload: Dict[str, Any],
+    resolved_activity_type: str,
+    company_mappings: Dict[str, str],
+    carry_state: Dict[str, Any],
+    date_profiles: Dict[str, DateFormatProfile] | None = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    Map, recover and validate one chunk of raw rows.
+
+    Row indexes are absolute (`start_index` + position in the chunk) and
+    `carry_state` is updated in place so carry-forward keeps working across
+    chunk boundaries. `date_profiles` are built once per upload and shared by
+    every chunk.
+
+    Returns (validated_rows, errors, empty_rows_skipped).
+    """
+    mapped_rows, row_indexes, empty_rows_skipped, _ = _map_rows(
+        raw_rows,
+        start_index,
+        upload,
+        resolved_activity_type,
+        company_mappings,
+        carry_state,
+    )
+    validated_rows, errors = _validate_mapped_rows(
+        mapped_rows,
+        row_indexes,
+        upload,
+        resolved_activity_type,
+        date_profiles,
+    )
+    return validated_rows, errors, empty_rows_skipped
+
+
+@dataclass
+class _ShardResult:
+    # Leading rows whose result depends on the carry state from earlier
+    # shards; the parent processes them again with the real state.
+    boundary_rows: int
+    validated_rows: List[Dict[str, Any]]
+    errors: List[Dict[str, Any]]
+    empty_rows_skipped: int
+    # Carry state written by rows after the boundary.
+    carry_updates: Dict[str, Any]
+
+
+def _process_shard(
+    raw_rows: List[Dict[str, Any]],
+    start_index: int,
+    upload: Dict[str, Any],
+    resolved_activity_type: str,
+    company_mappings: Dict[str, str],
+    date_profiles: Dict[str, DateFormatProfile] | None = None,
+) -> _ShardResult:
+    """
+    Process one shard of a chunk in a pool worker, starting from an empty
+    carry state. Only the rows past the carry boundary are kept.
+    """
+    carry_state: Dict[str, Any] = {}
+    carry_written_at: Dict[str, int] = {}
+    mapped_rows, row_indexes, _, boundary_rows = _map_rows(
+        raw_rows,
+        start_index,
+        upload,
+        resolved_activity_type,
+        company_mappings,
+        carry_state,
+        carry_written_at,
+    )
+
+    first_index = start_index + boundary_rows
+    keep = [pos for pos, idx in enumerate(row_indexes) if idx >= first_index]
+    validated_rows, errors = _validate_mapped_rows(
+        [mapped_rows[pos] for pos in keep],
+        [row_indexes[pos] for pos in keep],
+        upload,
+        resolved_activity_type,
+        date_profiles,
+    )
+
+    return _ShardResult(
+        boundary_rows=boundary_rows,
+        validated_rows=validated_rows,
+        errors=errors,
+        empty_rows_skipped=len(raw_rows) - boundary_rows - len(keep),
+        carry_updates={
+            k: v for k, v in carry_state.items()
+            if carry_written_at[k] >= boundary_rows
+        },
+    )
+
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor | None:
+    global _process_pool
+
+    if settings.INGEST_PROCESS_POOL_SIZE < 2:
+        return None
+
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # Spawned workers don't inherit the event loop, HTTP pools or
+                # locks held by other threads at fork time.
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=settings.INGEST_PROCESS_POOL_SIZE,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _shard_bounds(row_count: int, shard_count: int) -> List[Tuple[int, int]]:
+    size = math.ceil(row_count / shard_count)
+    return [(lo, min(lo + size, row_count)) for lo in range(0, row_count, size)]
+
+
+def _process_chunk(
+    raw_rows: List[Dict[str, Any]],
+    start_index: int,
+    upload: Dict[str, Any],
+    resolved_activity_type: str,
+    company_mappings: Dict[str, str],
+    carry_state: Dict[str, Any],
+    date_profiles: Dict[str, DateFormatProfile] | None = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    `_process_rows`, sharded across the process pool for large chunks.
+
+    The first shard runs here with the real carry state while the pool works
+    on the rest. Each later shard's boundary rows are then redone here in
+    order, so results, errors and `carry_state` match a serial run.
+    """
+    pool = _get_process_pool()
+    shard_count = 0
+    if pool is not None:
+        shard_count = min(
+            settings.INGEST_PROCESS_POOL_SIZE,
+            len(raw_rows) // max(1, settings.INGEST_SHARD_MIN_ROWS),
+        )
+    if pool is None or shard_count < 2:
+        return _process_rows(
+            raw_rows,
+            start_index,
+            upload,
+            resolved_activity_type,
+            company_mappings,
+            carry_state,
+            date_profiles,
+        )
+
+    bounds = _shard_bounds(len(raw_rows), shard_count)
+    futures = [
+        pool.submit(
+            _process_shard,
+            raw_rows[lo:hi],
+            start_index + lo,
+            upload,
+            resolved_activity_type,
+            company_mappings,
+            date_profiles,
+        )
+        for lo, hi in bounds[1:]
+    ]
+
+    first_hi = bounds[0][1]
+    validated_rows, errors, empty_rows_skipped = _process_rows(
+        raw_rows[:first_hi],
+        start_index,
+        upload,
+        resolved_activity_type,
+        company_mappings,
+        carry_state,
+        date_profiles,
+    )
+
+    for (lo, _), future in zip(bounds[1:], futures):
+        shard = future.result()
+        if shard.boundary_rows:
+            head_validated, head_errors, head_empty = _process_rows(
+                raw_rows[lo:lo + shard.boundary_rows],
+                start_index + lo,
+                upload,
+                resolved_activity_type,
+                company_mappings,
+                carry_state,
+                date_profiles,
+            )
+            validated_rows.extend(head_validated)
+            errors.extend(head_errors)
+            empty_rows_skipped += head_empty
+
+        validated_rows.extend(shard.validated_rows)
+        errors.extend(shard.errors)
+        empty_rows_skipped += shard.empty_rows_skipped
+        carry_state.update(shard.carry_updates)
+
+    return validated_rows, errors, empty_rows_skipped
+
+
+# Strict mode fails an upload when fewer than this share of validated rows produce emissions.
+STRICT_MIN_COVERAGE: float = 0.5
+
+
+def _check_strict_coverage(emissions_count: int, validated_count: int, skip_reasons: Dict[str, int]) -> None:
+    """Refuse to mark an upload as completed when emissions coverage is too low."""
+    if not validated_count:
+        return
+    coverage = emissions_count / validated_count
+    if coverage < STRICT_MIN_COVERAGE:
+        raise ValidationError(
+            f"Strict mode: emissions coverage {coverage:.0%} is below threshold "
+            f"{STRICT_MIN_COVERAGE:.0%}. Skip reasons: {skip_reasons}"
+        )
+
+
+# A workbook's sheets share the upload's row_index space: each sheet's rows
+# start at its position times Excel's row limit, so they never collide.
+# company_activities.row_index is bigint for this
+# (scripts/sql/company_activities_row_index_migration.sql).
+_SHEET_ROW_STRIDE = 1_048_576
+
+
+@dataclass
+class _Sheet:
+    name: str
+    position: int
+    # Used instead of inferring one; see `_workbook_steps`.
+    activity_type: str | None = None
+
+    @property
+    def row_offset(self) -> int:
+        return self.position * _SHEET_ROW_STRIDE
+
+
+@dataclass
+class _RowsOutcome:
+    activity_type: str
+    validated_count: int
+    error_count: int
+    emissions_count: int
+    skipped_emissions_count: int
+    stage_counters: Dict[str, Any]
+    # Strict mode on a sheet: emissions held for the workbook-wide coverage check.
+    deferred_emissions_rows: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _infer_sheet_activity_type(
+    upload: Dict[str, Any],
+    sheet: _Sheet,
+    raw_rows: List[Dict[str, Any]],
+) -> _PipelineSteps:
+    """
+    The activity type of one sheet of a workbook. The sheet name stands in
+    for the file name as a hint. When inference is unsure the sheet needs
+    review: summary and lookup tabs must not be ingested as data.
+    """
+    if sheet.activity_type:
+        logger.info(
+            "Using activity_type=%s given for upload=%s for its first data sheet %r",
+            sheet.activity_type,
+            upload.get("id"),
+            sheet.name,
+        )
+        return sheet.activity_type
+
+    sheet_upload = {**upload, "file_name": sheet.name, "storage_path": None}
+    inference = yield _cpu("infer_activity_type", sheet_upload, raw_rows)
+    if inference.activity_type and not inference.review_required:
+        logger.info(
+            "Inferred activity_type=%s confidence=%.2f for sheet %r of upload=%s",
+            inference.activity_type,
+            inference.confidence,
+            sheet.name,
+            upload.get("id"),
+        )
+        return inference.activity_type
+
+    if not inference.activity_type:
+        raise ActivityTypeReviewRequired(f"Could not infer activity type of sheet {sheet.name!r}.")
+    raise ActivityTypeReviewRequired(
+        f"Suggested {inference.activity_type} for sheet {sheet.name!r} at confidence {inference.confidence:.2f}."
+    )
+
+
+def _rows_steps(
+    upload: Dict[str, Any],
+    working_upload: Dict[str, Any],
+    event_log: ParsingEventLogger | AsyncParsingEventLogger,
+    timings: StageTimings,
+    sheet: _Sheet | None = None,
+) -> _PipelineSteps:
+    """
+    Extract, validate and persist the rows of an upload, or of one `sheet`
+    of a workbook upload, returning a `_RowsOutcome`. An empty sheet returns
+    None. Sheets are sub-units of their upload: they never write the
+    upload's own status, audit fields or checkpoint.
+    """
 
     upload_id = upload["id"]
     activity_type = upload.get("activity_type")
     # strict_mode: when True, fail the upload if emissions coverage is below threshold.
     # Set upload.strict_mode=true from the API or DB to opt in.
     strict_mode: bool = bool(upload.get("strict_mode", False))
-    STRICT_MIN_COVERAGE: float = 0.5  # fail if < 50% of validated rows produce emissions
+    # The low-quality gate below can only trip while fewer than this many rows
+    # validated, so inserts are held back until the count is reached.
+    QUALITY_GATE_MIN_VALID_ROWS: int = 25
+    chunk_size = max(1, settings.INGEST_CHUNK_SIZE)
+    row_offset = sheet.row_offset if sheet else 0
+
+    validated_count = 0
+    error_count = 0
+    carry_state: Dict[str, Any] = {}
 
-    temp_file_path: str | None = None
+    # Validated rows waiting to be persisted; flushed chunk by chunk once the
+    # quality gate can no longer fail.
+    pending_rows: List[Dict[str, Any]] = []
+    # Strict mode has to see the final coverage before anything is written.
+    deferred_emissions_rows: List[Dict[str, Any]] = []
+    supabase = None
 
-    validated_rows: List[Dict[str, Any]] = []
-    errors: List[Dict[str, Any]] = []
-    carry_state: Dict[str, Any] = {}
+    # Progress from an earlier attempt at this upload. Strict mode holds every
+    # emissions insert until the end, so there is never a finished chunk to resume from.
+    # Sheets run side by side and have no single position to resume from.
+    checkpoint = None if strict_mode or sheet else _load_checkpoint(upload)
+    resume_from_row = 0
+
+    emissions_count = 0
+    skipped_emissions_count = 0
+    skipped_emissions_samples: List[Dict[str, Any]] = []
+    skip_reasons: Dict[str, int] = {}
 
     # Stage counters — persisted to DB at end
     stage_counters: Dict[str, Any] = {
@@ -547,324 +1251,638 @@ def run_parsing_pipeline(upload: Dict[str, Any]) -> Dict[str, Any]:
         "emissions_skipped_by_reason": {},
     }
 
-    try:
-        logger.info(f"[Pipeline] Starting for upload {upload_id}, activity_type={activity_type}, strict_mode={strict_mode}")
+    # A sheet that fails the quality gate is skipped, so like inserts its
+    # events are held back until the gate can no longer fail.
+    held_events: List[Tuple[str, str, int | None]] | None = [] if sheet else None
+
+    def _log_event(severity: str, message: str, row_index: int | None = None) -> None:
+        # Sheet events name their sheet and number rows within it.
+        if sheet:
+            message = f"Sheet {sheet.name!r}: {message}"
+            if row_index is not None:
+                row_index -= row_offset
+        if held_events is not None:
+            held_events.append((severity, message, row_index))
+        else:
+            event_log.log(severity, message, row_number=row_index)
 
-        local_file_path, temp_file_path = resolve_upload_file_path(upload)
-        logger.info(f"[Pipeline] Resolved file path: {local_file_path}")
-        working_upload = {**upload, "file_path": local_file_path}
+    def _release_events() -> None:
+        nonlocal held_events
+
+        for severity, message, row_number in held_events or ():
+            event_log.log(severity, message, row_number=row_number)
+        held_events = None
+
+    def _persist_rows(rows: List[Dict[str, Any]]) -> _PipelineSteps:
+        nonlocal supabase
+        nonlocal emissions_count, skipped_emissions_count
+
+        if not rows:
+            return
 
         # -----------------------------------------
-        # 1️⃣ Extract rows
+        # 5️⃣ Insert activities
         # -----------------------------------------
 
-        if local_file_path.lower().endswith(".pdf"):
-            if not isinstance(activity_type, str) or activity_type not in SCHEMAS:
-                raise ValidationError(
-                    "PDF uploads currently require a manual or pre-inferred activity type"
-                )
-            logger.info(f"[Pipeline] Extracting from PDF with activity_type={activity_type}")
-            raw_rows = extract_pdf_with_ai(local_file_path, activity_type)
-        else:
-            logger.info("[Pipeline] Extracting rows from file")
-            raw_rows = extract_rows(working_upload)
-        
-        logger.info(f"[Pipeline] Extracted {len(raw_rows)} raw rows")
-        stage_counters["extracted_rows"] = len(raw_rows)
+        # Upserted on (source_upload_id, row_index): activities an earlier
+        # attempt already wrote come back as they are instead of duplicating.
+        logger.info(f"[Pipeline] Upserting {len(rows)} activities")
+        inserted_activities = yield _io("upsert_activities", rows)
+        timings.add_rows("activity_insert", len(rows))
+        activity_list = list(inserted_activities.values()) if isinstance(inserted_activities, dict) else inserted_activities
+        logger.info(
+            "[Pipeline] Upserted %s activities, activity_ids=%s",
+            len(activity_list),
+            _preview_activity_ids(activity_list),
+        )
 
-        resolved_activity_type = _resolve_upload_activity_type(upload, raw_rows)
-        logger.info(f"[Pipeline] Resolved activity_type={resolved_activity_type}")
+        stage_counters["activities_inserted"] += len(activity_list)
 
-        # -----------------------------------------
-        # 2️⃣ Load company mappings
         # -----------------------------------------
 
-        logger.info("[Pipeline] Loading company mappings")
-        mapping_upload = {**upload, "activity_type": resolved_activity_type}
-        mapping_record_raw = get_upload_mapping(mapping_upload)
-        
-        company_mappings: Dict[str, str] = {}
+        if supabase is None:
+            supabase = get_supabase_client()
+            logger.info(f"[Pipeline] First validated row sample: {rows[0]}")
+            logger.info(f"[Pipeline] First activity sample: {activity_list[0] if activity_list else 'N/A'}")
 
-        if isinstance(mapping_record_raw, dict):
-            mappings_field = mapping_record_raw.get("mappings")
+        # 6️⃣ Emissions based on inserted activity IDs
+        logger.info(f"[Pipeline] Calculating emissions for {len(rows)} rows...")
 
-            if isinstance(mappings_field, dict):
-            # Ensure keys + values are strings
-                company_mappings = {
-                    str(k): str(v)
-                    for k, v in mappings_field.items()
-                }
-        
-        logger.info(f"[Pipeline] Loaded {len(company_mappings)} column mappings")
+        emissions_result = yield _cpu(
+            "calculate_emissions_for_batch",
+            supabase=supabase,
+            rows=rows,
+            inserted_activities=inserted_activities,
+        )
+        timings.add_rows("emissions_lookup", len(rows))
+        emissions_rows = cast(List[Dict[str, Any]], emissions_result.get("rows", []))
+        skipped_emissions = cast(List[Dict[str, Any]], emissions_result.get("skipped_rows", []))
+        emissions_summary = cast(Dict[str, Any], emissions_result.get("summary", {}))
+        logger.info(f"[Pipeline] Emissions calculation returned {len(emissions_rows)} rows")
 
+        emissions_count += emissions_summary.get("calculated_count", len(emissions_rows))
+        skipped_emissions_count += emissions_summary.get("skipped_count", len(skipped_emissions))
+        for reason, count in emissions_summary.get("skip_reasons", {}).items():
+            skip_reasons[reason] = skip_reasons.get(reason, 0) + count
+        # Only a bounded sample of skipped rows is kept for diagnostics and logs.
+        remaining_samples = 25 - len(skipped_emissions_samples)
+        if remaining_samples > 0:
+            skipped_emissions_samples.extend(skipped_emissions[:remaining_samples])
+
+        if not emissions_rows:
+            return
+
+        if strict_mode:
+            deferred_emissions_rows.extend(emissions_rows)
+            return
+
+        logger.info(f"[Pipeline] Inserting {len(emissions_rows)} emissions rows")
+        yield _io("insert_emissions", emissions_rows)
+        timings.add_rows("emissions_insert", len(emissions_rows))
+        logger.info(f"[Pipeline] Emissions inserted successfully")
+
+    def _save_checkpoint(next_row_index: int) -> _PipelineSteps:
+        """Record that every row before `next_row_index` is fully persisted."""
+        payload = {
+            "version": _CHECKPOINT_VERSION,
+            "storage_path": upload.get("storage_path"),
+            "activity_type": resolved_activity_type,
+            "next_row_index": next_row_index,
+            "validated_rows": validated_count,
+            "error_rows": error_count,
+            "activities_inserted": stage_counters["activities_inserted"],
+            "emissions_inserted": emissions_count,
+            "emissions_skipped": skipped_emissions_count,
+            "emissions_skipped_by_reason": dict(skip_reasons),
+            "stage_counters": {
+                key: stage_counters[key]
+                for key in ("extracted_rows", "empty_rows_skipped", "validation_failed_rows")
+            },
+            "carry_state": {key: _checkpoint_value(value) for key, value in carry_state.items()},
+        }
+        try:
+            yield _io("update_upload_fields", upload_id, {"parsing_checkpoint": payload})
+        except Exception as exc:
+            # Losing a checkpoint only costs redoing the chunk on a retry.
+            logger.warning("[Pipeline] Could not save checkpoint for upload %s: %s", upload_id, exc)
+
+    def _restore_checkpoint(saved: Dict[str, Any]) -> int:
+        nonlocal validated_count, error_count, emissions_count, skipped_emissions_count
+
+        validated_count = int(saved.get("validated_rows") or 0)
+        error_count = int(saved.get("error_rows") or 0)
+        emissions_count = int(saved.get("emissions_inserted") or 0)
+        skipped_emissions_count = int(saved.get("emissions_skipped") or 0)
+        skip_reasons.update(saved.get("emissions_skipped_by_reason") or {})
+        stage_counters.update(saved.get("stage_counters") or {})
+        stage_counters["activities_inserted"] = int(saved.get("activities_inserted") or 0)
+        carry_state.update(saved.get("carry_state") or {})
+        return int(saved["next_row_index"])
+
+    local_file_path = working_upload["file_path"]
+
+    # -----------------------------------------
+    # 1️⃣ Extract rows (chunked)
+    # -----------------------------------------
+
+    row_chunks: Iterator[List[Dict[str, Any]]]
+    if local_file_path.lower().endswith(".pdf"):
+        if not isinstance(activity_type, str) or activity_type not in SCHEMAS:
+            raise ValidationError(
+                "PDF uploads currently require a manual or pre-inferred activity type"
+            )
+        logger.info(f"[Pipeline] Extracting from PDF with activity_type={activity_type}")
+        pdf_rows = yield _cpu("extract_pdf_with_ai", local_file_path, activity_type)
+        row_chunks = _iter_list_chunks(pdf_rows, chunk_size)
+    elif sheet:
+        logger.info(f"[Pipeline] Extracting rows from sheet {sheet.name!r} in chunks of {chunk_size}")
+        row_chunks = iter_row_chunks(working_upload, chunk_size, sheet_name=sheet.name)
+    elif local_file_path.lower().endswith(".csv"):
+        # Sniffed once from the head of the file, however large it is.
+        dialect = yield _cpu("sniff_csv", local_file_path)
+        logger.info(f"[Pipeline] Extracting rows from CSV ({dialect}) in chunks of {chunk_size}")
+        row_chunks = iter_row_chunks(working_upload, chunk_size, dialect=dialect)
+    else:
+        logger.info(f"[Pipeline] Extracting rows from file in chunks of {chunk_size}")
+        row_chunks = iter_row_chunks(working_upload, chunk_size)
+
+    # Activity type inference only looks at the head of the file.
+    first_chunk = (yield _cpu("_next_chunk", row_chunks)) or []
+
+    if sheet:
+        if not first_chunk:
+            logger.info(f"[Pipeline] Sheet {sheet.name!r} has no rows, skipping it")
+            return None
+        resolved_activity_type = yield from _infer_sheet_activity_type(upload, sheet, first_chunk)
+    else:
+        resolved_activity_type = yield from _resolve_upload_activity_type(upload, first_chunk)
+    timings.add_rows("activity_type_inference", len(first_chunk))
+    logger.info(f"[Pipeline] Resolved activity_type={resolved_activity_type}")
+
+    if checkpoint and checkpoint.get("activity_type") == resolved_activity_type:
+        resume_from_row = _restore_checkpoint(checkpoint)
+        logger.info(f"[Pipeline] Resuming upload {upload_id} from checkpoint at row {resume_from_row}")
+        event_log.log("INFO", f"Resuming from checkpoint at row {resume_from_row}")
+
+    # -----------------------------------------
+    # 2️⃣ Load company mappings
+    # -----------------------------------------
+
+    logger.info("[Pipeline] Loading company mappings")
+    mapping_upload = {**upload, "activity_type": resolved_activity_type}
+    mapping_record_raw = yield _io("get_upload_mapping", mapping_upload)
+
+    company_mappings: Dict[str, str] = {}
+
+    if isinstance(mapping_record_raw, dict):
+        mappings_field = mapping_record_raw.get("mappings")
+
+        if isinstance(mappings_field, dict):
+        # Ensure keys + values are strings
+            company_mappings = {
+                str(k): str(v)
+                for k, v in mappings_field.items()
+            }
+
+    logger.info(f"[Pipeline] Loaded {len(company_mappings)} column mappings")
+
+    date_profiles = yield _cpu(
+        "_profile_date_columns",
+        first_chunk,
+        resolved_activity_type,
+        company_mappings,
+    )
 
-        # -----------------------------------------
-        # 3️⃣ Process each row
-        # -----------------------------------------
+    # -----------------------------------------
+    # 3️⃣ Process, insert and calculate chunk by chunk
+    # -----------------------------------------
 
-        logger.info(f"[Pipeline] Processing {len(raw_rows)} rows")
-        for idx, raw_row in enumerate(raw_rows):
+    next_row_index = row_offset
+    raw_chunk: List[Dict[str, Any]] | None = first_chunk
+    while raw_chunk is not None:
+        if not raw_chunk:
+            raw_chunk = yield _cpu("_next_chunk", row_chunks)
+            continue
 
-            raw_row = _preclean_row(raw_row)
+        if next_row_index < resume_from_row:
+            # Finished by an earlier attempt; its rows are already counted and persisted.
+            skipped = min(len(raw_chunk), resume_from_row - next_row_index)
+            timings.add_rows("extract", skipped)
+            next_row_index += skipped
+            raw_chunk = raw_chunk[skipped:]
+            if not raw_chunk:
+                raw_chunk = yield _cpu("_next_chunk", row_chunks)
+            continue
 
-            if _is_effectively_empty_row(raw_row):
-                logger.info(f"[Pipeline] Skipping empty row {idx}")
-                stage_counters["empty_rows_skipped"] += 1
-                continue
+        stage_counters["extracted_rows"] += len(raw_chunk)
+        timings.add_rows("extract", len(raw_chunk))
+        timings.add_rows("row_processing", len(raw_chunk))
+        logger.info(f"[Pipeline] Processing rows {next_row_index}-{next_row_index + len(raw_chunk) - 1}")
+
+        validated_chunk, chunk_errors, empty_skipped = yield _cpu(
+            "_process_chunk",
+            raw_chunk,
+            next_row_index,
+            upload,
+            resolved_activity_type,
+            company_mappings,
+            carry_state,
+            date_profiles,
+        )
+        next_row_index += len(raw_chunk)
 
-            try:
-                mapped_row, unmapped = normalize_columns(
-                    raw_row,
-                    resolved_activity_type,
-                    company_mappings
-                )
+        stage_counters["empty_rows_skipped"] += empty_skipped
+        stage_counters["validation_failed_rows"] += len(chunk_errors)
+        for error in chunk_errors:
+            logger.warning(f"[Pipeline] Validation error at row {error['row_index']}: {error['error']}")
+            _log_event("ERROR", error["error"], error["row_index"])
 
-                mapped_row = _fill_missing_required_from_unmapped(
-                    mapped_row,
-                    unmapped,
-                    resolved_activity_type,
-                )
+        validated_count += len(validated_chunk)
+        error_count += len(chunk_errors)
+        pending_rows.extend(validated_chunk)
 
-                mapped_row = _apply_required_field_fallbacks(
-                    mapped_row,
-                    upload,
-                    resolved_activity_type,
-                )
+        if validated_count >= QUALITY_GATE_MIN_VALID_ROWS:
+            _release_events()
+            yield from _persist_rows(pending_rows)
+            pending_rows = []
+            if not strict_mode and not sheet:
+                yield from _save_checkpoint(next_row_index)
 
-                mapped_row = _apply_carry_forward_fallbacks(
-                    mapped_row,
-                    resolved_activity_type,
-                    carry_state,
-                )
+        raw_chunk = yield _cpu("_next_chunk", row_chunks)
 
-                mapped_row = _infer_missing_required_from_values(
-                    mapped_row,
-                    raw_row,
-                    resolved_activity_type,
-                )
+    logger.info(f"[Pipeline] Extracted {stage_counters['extracted_rows']} raw rows")
 
-                # Keep known dimension values even when another field on the row fails validation.
-                for k, v in mapped_row.items():
-                    if _is_empty_cell(v):
-                        continue
-                    carry_state[k] = v
+    # -----------------------------------------
+    # 4️⃣ Fail if too many errors
+    # -----------------------------------------
 
-                validated_row = validate_row(
-                    mapped_row,
-                    resolved_activity_type
-                )
+    total = validated_count + error_count
+    logger.info(f"[Pipeline] Validation complete: {validated_count} valid, {error_count} errors out of {total} total")
 
-                # Keep activity type on each row so emissions lookup can match factors.
-                validated_row["activity_type"] = resolved_activity_type
-                validated_row["upload_id"] = upload_id
-                validated_row["row_index"] = idx
-                validated_row["organization_id"] = upload.get("organization_id")
-                validated_row["company_location_id"] = upload.get("company_location_id") or upload.get("file_site_id")
-
-                validated_rows.append(validated_row)
-
-                for k, v in validated_row.items():
-                    if _is_empty_cell(v):
-                        continue
-                    carry_state[k] = v
-
-            except ValidationError as ve:
-                errors.append({
-                    "row_index": idx,
-                    "error": str(ve),
-                })
-                stage_counters["validation_failed_rows"] += 1
-                logger.warning(f"[Pipeline] Validation error at row {idx}: {str(ve)}")
-                log_parsing_event(upload_id, "ERROR", str(ve), row_number=idx)
+    quality = _compute_quality_summary(validated_count, error_count)
+    failure_ratio = (error_count / total) if total else 0.0
 
-        # -----------------------------------------
-        # 4️⃣ Fail if too many errors
-        # -----------------------------------------
+    if validated_count == 0:
+        raise ValidationError("No valid rows found after normalization and validation")
 
-        total = len(validated_rows) + len(errors)
-        logger.info(f"[Pipeline] Validation complete: {len(validated_rows)} valid, {len(errors)} errors out of {total} total")
+    # Enterprise gate: fail only when quality is critically low and sample size is too small.
+    if failure_ratio > 0.8 and validated_count < QUALITY_GATE_MIN_VALID_ROWS:
+        raise ValidationError(
+            f"Data quality too low for ingestion: {quality['quality_score']}% valid rows"
+        )
 
-        quality = _compute_quality_summary(len(validated_rows), len(errors))
-        failure_ratio = (len(errors) / total) if total else 0.0
+    if failure_ratio > 0.5:
+        logger.warning(
+            "[Pipeline] Proceeding with degraded quality: %.2f%% valid rows (%s/%s)",
+            quality["quality_score"],
+            quality["validated_rows"],
+            quality["total_rows"],
+        )
 
-        if len(validated_rows) == 0:
-            raise ValidationError("No valid rows found after normalization and validation")
+    _release_events()
+    yield from _persist_rows(pending_rows)
+    pending_rows = []
+
+    # Populate stage counters from the accumulated emissions results.
+    stage_counters["emissions_calculated"] = emissions_count
+    stage_counters["emissions_skipped"] = skipped_emissions_count
+    stage_counters["emissions_skipped_by_reason"] = dict(skip_reasons)
+
+    # Log factor match diagnostics prominently when everything was skipped.
+    if not emissions_count and skipped_emissions_count:
+        first_samples = [
+            f"row={s.get('row_index')} activity_type={s.get('activity_type')} unit={s.get('unit')} region={s.get('region')} year={s.get('year')}: {s.get('reason', '')}"
+            for s in skipped_emissions_samples[:5]
+        ]
+        logger.warning(
+            "[Pipeline] ⚠️ ALL emissions were skipped for upload %s. "
+            "Skip buckets: %s. First samples: %s",
+            upload_id,
+            skip_reasons,
+            first_samples,
+        )
 
-        # Enterprise gate: fail only when quality is critically low and sample size is too small.
-        if failure_ratio > 0.8 and len(validated_rows) < 25:
-            raise ValidationError(
-                f"Data quality too low for ingestion: {quality['quality_score']}% valid rows"
-            )
+    # A workbook's coverage is judged over all of its ingested sheets instead.
+    if strict_mode and not sheet:
+        _check_strict_coverage(emissions_count, validated_count, skip_reasons)
 
-        if failure_ratio > 0.5:
-            logger.warning(
-                "[Pipeline] Proceeding with degraded quality: %.2f%% valid rows (%s/%s)",
-                quality["quality_score"],
-                quality["validated_rows"],
-                quality["total_rows"],
-            )
+    if deferred_emissions_rows and not sheet:
+        logger.info(f"[Pipeline] Inserting {len(deferred_emissions_rows)} emissions rows")
+        yield _io("insert_emissions", deferred_emissions_rows)
+        timings.add_rows("emissions_insert", len(deferred_emissions_rows))
+        logger.info(f"[Pipeline] Emissions inserted successfully")
 
-        # -----------------------------------------
-        # 5️⃣ Insert activities
-        # -----------------------------------------
+    if not emissions_count:
+        logger.warning("[Pipeline] No trusted emissions rows were calculated for this upload")
+        _log_event("WARN", "No trusted emissions rows were calculated")
 
-        existing_activities = get_activities_for_upload(upload_id)
-        if existing_activities:
-            inserted_activities = existing_activities
-            logger.warning(
-                "[Pipeline] Reusing %s existing activities for upload %s to avoid duplicate inserts",
-                len(inserted_activities),
-                upload_id,
-            )
-        else:
-            logger.info(f"[Pipeline] Inserting {len(validated_rows)} activities")
-            inserted_activities = insert_activities(validated_rows)
-            logger.info(
-                "[Pipeline] Inserted %s activities, activity_ids=%s",
-                len(inserted_activities),
-                _preview_activity_ids(inserted_activities),
-            )
+    if skipped_emissions_count:
+        logger.info(
+            "[Pipeline] Emissions skipped for %s/%s validated rows",
+            skipped_emissions_count,
+            validated_count,
+        )
+        for skipped in skipped_emissions_samples:
+            row_number = skipped.get("row_index")
+            reason = skipped.get("reason") or "Emissions skipped"
+            if isinstance(row_number, int):
+                _log_event("WARN", f"Emissions skipped: {reason}", row_number)
+            else:
+                _log_event("WARN", f"Emissions skipped: {reason}")
+
+    return _RowsOutcome(
+        activity_type=resolved_activity_type,
+        validated_count=validated_count,
+        error_count=error_count,
+        emissions_count=emissions_count,
+        skipped_emissions_count=skipped_emissions_count,
+        stage_counters=stage_counters,
+        deferred_emissions_rows=deferred_emissions_rows if sheet else [],
+    )
 
-        stage_counters["activities_inserted"] = len(inserted_activities)
 
-        # -----------------------------------------
-        
-        # Build supabase client using settings/env fallbacks so worker processes
-        # do not crash when shell env vars are not explicitly exported.
-        supabase_key = (
-            os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-            or os.getenv("SUPABASE_SECRET_KEY")
-            or settings.SUPABASE_SECRET_KEY
+def _roll_up_sheets(
+    sheets: List[_Sheet],
+    outcomes: List[_RowsOutcome | None],
+    reasons: Dict[str, str],
+) -> _RowsOutcome:
+    """One outcome for the whole workbook, with a per-sheet breakdown in its stage counters."""
+    stage_counters: Dict[str, Any] = {
+        "extracted_rows": 0,
+        "empty_rows_skipped": 0,
+        "validation_failed_rows": 0,
+        "activities_inserted": 0,
+        "emissions_calculated": 0,
+        "emissions_skipped": 0,
+        "emissions_skipped_by_reason": {},
+        "sheets": [],
+    }
+    activity_types: List[str] = []
+    for sheet, outcome in zip(sheets, outcomes):
+        entry: Dict[str, Any] = {"sheet": sheet.name}
+        if outcome is None:
+            entry["status"] = "skipped" if sheet.name in reasons else "empty"
+            if sheet.name in reasons:
+                entry["reason"] = reasons[sheet.name]
+            stage_counters["sheets"].append(entry)
+            continue
+
+        if outcome.activity_type not in activity_types:
+            activity_types.append(outcome.activity_type)
+        for key, value in outcome.stage_counters.items():
+            if key == "emissions_skipped_by_reason":
+                by_reason = stage_counters[key]
+                for reason, count in value.items():
+                    by_reason[reason] = by_reason.get(reason, 0) + count
+            else:
+                stage_counters[key] += value
+        entry.update(
+            status="completed",
+            activity_type=outcome.activity_type,
+            validated_rows=outcome.validated_count,
+            error_rows=outcome.error_count,
+            stage_counters=outcome.stage_counters,
         )
-        if not supabase_key:
-            raise RuntimeError("Supabase credentials not configured")
+        stage_counters["sheets"].append(entry)
+
+    return _RowsOutcome(
+        activity_type=",".join(activity_types),
+        validated_count=sum(outcome.validated_count for outcome in outcomes if outcome),
+        error_count=sum(outcome.error_count for outcome in outcomes if outcome),
+        emissions_count=sum(outcome.emissions_count for outcome in outcomes if outcome),
+        skipped_emissions_count=sum(outcome.skipped_emissions_count for outcome in outcomes if outcome),
+        stage_counters=stage_counters,
+    )
 
-        supabase = create_client(
-            os.getenv("SUPABASE_URL") or settings.SUPABASE_URL,
-            supabase_key,
+
+def _workbook_steps(
+    upload: Dict[str, Any],
+    working_upload: Dict[str, Any],
+    sheet_names: List[str],
+    event_log: ParsingEventLogger | AsyncParsingEventLogger,
+    timings: StageTimings,
+) -> _PipelineSteps:
+    """
+    Ingest every sheet of a workbook as a sub-unit of its upload, each with
+    its own activity type, running them side by side. A sheet that cannot be
+    ingested is skipped and reported; the upload fails only when none can.
+    Strict mode checks emissions coverage over the ingested sheets together.
+    """
+    upload_id = upload["id"]
+    strict_mode = bool(upload.get("strict_mode", False))
+    sheets = [_Sheet(name, position) for position, name in enumerate(sheet_names)]
+    logger.info(f"[Pipeline] Upload {upload_id} is a workbook with {len(sheets)} sheets")
+
+    results = yield _Fork([
+        _rows_steps(upload, working_upload, event_log, timings, sheet)
+        for sheet in sheets
+    ])
+
+    # An activity type given for the whole upload only stands in for
+    # inference on the first sheet with rows; other unsure sheets are
+    # likely totals or lookups and stay skipped.
+    explicit = upload.get("activity_type")
+    first_data = next((index for index, result in enumerate(results) if result is not None), None)
+    if (
+        first_data is not None
+        and isinstance(results[first_data], ActivityTypeReviewRequired)
+        and isinstance(explicit, str)
+        and explicit.strip() in SCHEMAS
+    ):
+        sheets[first_data] = replace(sheets[first_data], activity_type=explicit.strip())
+        (results[first_data],) = yield _Fork([
+            _rows_steps(upload, working_upload, event_log, timings, sheets[first_data])
+        ])
+
+    outcomes: List[_RowsOutcome | None] = []
+    reasons: Dict[str, str] = {}
+    review_required = False
+    for sheet, result in zip(sheets, results):
+        if isinstance(result, (ActivityTypeReviewRequired, ValidationError)):
+            logger.warning(f"[Pipeline] Skipping sheet {sheet.name!r} of upload {upload_id}: {result}")
+            event_log.log("WARN", f"Sheet {sheet.name!r} skipped: {result}")
+            reasons[sheet.name] = str(result)
+            review_required = review_required or isinstance(result, ActivityTypeReviewRequired)
+            outcomes.append(None)
+        elif isinstance(result, BaseException):
+            # Anything else fails the upload.
+            raise result
+        else:
+            outcomes.append(result)
+
+    if not any(outcomes):
+        if not reasons:
+            raise ValidationError("No valid rows found after normalization and validation")
+        summary = "; ".join(f"{name}: {reason}" for name, reason in reasons.items())
+        if review_required:
+            reason = f"No sheet could be ingested without manual review. {summary}"
+            yield _io("mark_as_pending_review", upload_id, reason)
+            raise ActivityTypeReviewRequired(reason)
+        raise ValidationError(f"No sheet could be ingested. {summary}")
+
+    outcome = _roll_up_sheets(sheets, outcomes, reasons)
+    if strict_mode:
+        _check_strict_coverage(
+            outcome.emissions_count,
+            outcome.validated_count,
+            outcome.stage_counters["emissions_skipped_by_reason"],
         )
 
-        # 6️⃣ Emissions based on inserted activity IDs
-        logger.info(f"[Pipeline] Calculating emissions for {len(validated_rows)} rows...")
-        logger.info(f"[Pipeline] First validated row sample: {validated_rows[0] if validated_rows else 'N/A'}")
-        logger.info(f"[Pipeline] First activity sample: {inserted_activities[0] if inserted_activities else 'N/A'}")
-        
-        emissions_result = calculate_emissions_for_batch(
-            supabase=supabase,
-            rows=validated_rows,
-            inserted_activities=inserted_activities,
+    deferred_emissions_rows = [
+        row for sheet_outcome in outcomes if sheet_outcome for row in sheet_outcome.deferred_emissions_rows
+    ]
+    if deferred_emissions_rows:
+        logger.info(f"[Pipeline] Inserting {len(deferred_emissions_rows)} emissions rows")
+        yield _io("insert_emissions", deferred_emissions_rows)
+        timings.add_rows("emissions_insert", len(deferred_emissions_rows))
+
+    yield from _record_workbook_activity_type(upload, sheets, outcomes)
+    return outcome
+
+
+def _record_workbook_activity_type(
+    upload: Dict[str, Any],
+    sheets: List[_Sheet],
+    outcomes: List[_RowsOutcome | None],
+) -> _PipelineSteps:
+    """
+    Give a workbook upload the activity type of its primary sheet, the one
+    with the most valid rows, and audit how its sheets' types were chosen.
+    Every sheet's type is also in the stage summary.
+    """
+    upload_id = upload.get("id")
+    if not (isinstance(upload_id, str) and upload_id):
+        return
+
+    ingested = [(sheet, outcome) for sheet, outcome in zip(sheets, outcomes) if outcome]
+    _, primary = max(ingested, key=lambda item: (item[1].validated_count, -item[0].position))
+    sheet_types = ", ".join(f"{sheet.name}={outcome.activity_type}" for sheet, outcome in ingested)
+
+    explicit = upload.get("activity_type")
+    explicit = explicit.strip() if isinstance(explicit, str) and explicit.strip() in SCHEMAS else None
+    corrected = [sheet.name for sheet, outcome in ingested if explicit and outcome.activity_type != explicit]
+    if corrected:
+        status = "auto_corrected"
+        reason = (
+            f"Provided activity type {explicit} conflicted with the structure of sheets "
+            f"{', '.join(corrected)}; sheet types: {sheet_types}."
         )
-        emissions_rows = cast(List[Dict[str, Any]], emissions_result.get("rows", []))
-        skipped_emissions = cast(List[Dict[str, Any]], emissions_result.get("skipped_rows", []))
-        emissions_summary = cast(Dict[str, Any], emissions_result.get("summary", {}))
-        logger.info(f"[Pipeline] Emissions calculation returned {len(emissions_rows)} rows")
+    elif explicit:
+        status = "manual_override"
+        reason = "Activity type supplied explicitly by user or reviewer."
+    else:
+        status = "auto_accepted"
+        reason = f"Auto-accepted by inference engine per sheet: {sheet_types}."
+
+    yield _io(
+        "save_upload_inference_audit",
+        upload_id,
+        inferred_activity_type=primary.activity_type,
+        activity_type_review_status=status,
+        activity_type_review_reason=reason,
+    )
 
-        # Populate stage counters from emissions result.
-        stage_counters["emissions_calculated"] = len(emissions_rows)
-        stage_counters["emissions_skipped"] = len(skipped_emissions)
-        stage_counters["emissions_skipped_by_reason"] = emissions_summary.get("skip_reasons", {})
-
-        # Log factor match diagnostics prominently when everything was skipped.
-        if not emissions_rows and skipped_emissions:
-            skip_reasons = emissions_summary.get("skip_reasons", {})
-            first_samples = [
-                f"row={s.get('row_index')} activity_type={s.get('activity_type')} unit={s.get('unit')} region={s.get('region')} year={s.get('year')}: {s.get('reason', '')}"
-                for s in skipped_emissions[:5]
-            ]
-            logger.warning(
-                "[Pipeline] ⚠️ ALL emissions were skipped for upload %s. "
-                "Skip buckets: %s. First samples: %s",
-                upload_id,
-                skip_reasons,
-                first_samples,
-            )
+    if primary.activity_type != explicit:
+        try:
+            yield _io("set_upload_activity_type", upload_id, primary.activity_type)
+        except Exception:
+            logger.warning("Failed to persist inferred activity type for upload %s", upload_id)
 
-        # Strict mode: refuse to mark as completed when emissions coverage is too low.
-        if strict_mode and validated_rows:
-            coverage = len(emissions_rows) / len(validated_rows)
-            if coverage < STRICT_MIN_COVERAGE:
-                skip_reasons = emissions_summary.get("skip_reasons", {})
-                raise ValidationError(
-                    f"Strict mode: emissions coverage {coverage:.0%} is below threshold "
-                    f"{STRICT_MIN_COVERAGE:.0%}. Skip reasons: {skip_reasons}"
-                )
 
-        if emissions_rows:
-            logger.info(f"[Pipeline] Inserting {len(emissions_rows)} emissions rows")
-            insert_emissions(emissions_rows)
-            logger.info(f"[Pipeline] Emissions inserted successfully")
+def _pipeline_steps(
+    upload: Dict[str, Any],
+    event_log: ParsingEventLogger | AsyncParsingEventLogger,
+    timings: StageTimings,
+) -> _PipelineSteps:
+    """
+    The ingestion pipeline for one upload, written once for both drivers.
+    Every DB/storage call and every CPU-heavy stage is yielded as a `_Step`.
+    """
+
+    start_time = time.time()
+
+    upload_id = upload["id"]
+    activity_type = upload.get("activity_type")
+    strict_mode: bool = bool(upload.get("strict_mode", False))
+
+    temp_file_path: str | None = None
+
+    try:
+        logger.info(f"[Pipeline] Starting for upload {upload_id}, activity_type={activity_type}, strict_mode={strict_mode}")
+
+        local_file_path, temp_file_path = yield _io("resolve_upload_file_path", upload)
+        logger.info(f"[Pipeline] Resolved file path: {local_file_path}")
+        working_upload = {**upload, "file_path": local_file_path}
+
+        sheet_names = yield _cpu("list_sheet_names", working_upload)
+        outcome: _RowsOutcome
+        if len(sheet_names) > 1:
+            outcome = yield from _workbook_steps(upload, working_upload, sheet_names, event_log, timings)
         else:
-            logger.warning("[Pipeline] No trusted emissions rows were calculated for this upload")
-            log_parsing_event(upload_id, "WARN", "No trusted emissions rows were calculated")
-
-        if skipped_emissions:
-            logger.info(
-                "[Pipeline] Emissions skipped for %s/%s validated rows",
-                emissions_summary.get("skipped_count", len(skipped_emissions)),
-                emissions_summary.get("total_count", len(validated_rows)),
-            )
-            for skipped in skipped_emissions[:25]:
-                row_number = skipped.get("row_index")
-                reason = skipped.get("reason") or "Emissions skipped"
-                if isinstance(row_number, int):
-                    log_parsing_event(upload_id, "WARN", f"Emissions skipped: {reason}", row_number=row_number)
-                else:
-                    log_parsing_event(upload_id, "WARN", f"Emissions skipped: {reason}")
-            
-        # -----------------------------------------
-        # Skipped for now unless emissions.py confirmed working
+            outcome = yield from _rows_steps(upload, working_upload, event_log, timings)
+
+        validated_count = outcome.validated_count
+        error_count = outcome.error_count
+        emissions_count = outcome.emissions_count
+        skipped_emissions_count = outcome.skipped_emissions_count
+        quality = _compute_quality_summary(validated_count, error_count)
 
-        mark_as_completed(upload_id)
+        written_events = yield _io("flush_event_log", event_log)
+        timings.add_rows("log_flush", written_events or 0)
 
-        update_upload_fields(
+        # Status and final metrics go out in one update.
+        yield _io(
+            "complete_upload",
             upload_id,
             {
                 "quality_score": quality["quality_score"],
                 "validated_rows": quality["validated_rows"],
                 "error_rows": quality["error_rows"],
                 "total_rows": quality["total_rows"],
-                "emissions_calculated_rows": emissions_summary.get("calculated_count", len(emissions_rows)),
-                "emissions_skipped_rows": emissions_summary.get("skipped_count", len(skipped_emissions)),
-                "parsing_stage_summary": stage_counters,
+                "emissions_calculated_rows": emissions_count,
+                "emissions_skipped_rows": skipped_emissions_count,
+                "parsing_stage_summary": {**outcome.stage_counters, "stage_timings": timings.summary()},
+                "parsing_checkpoint": None,
             },
         )
 
         duration = time.time() - start_time
         logger.info(
-            f"[Pipeline] ✅ Completed upload {upload_id} in {duration:.2f}s. Valid: {len(validated_rows)}, Errors: {len(errors)}, Emissions: {len(emissions_rows) if emissions_rows else 0}"
+            f"[Pipeline] ✅ Completed upload {upload_id} in {duration:.2f}s. Valid: {validated_count}, Errors: {error_count}, Emissions: {emissions_count}"
         )
         logger.info(
             _format_upload_summary(
                 upload=upload,
                 upload_id=upload_id,
-                resolved_activity_type=resolved_activity_type,
-                validated_count=len(validated_rows),
-                error_count=len(errors),
-                emissions_count=emissions_summary.get("calculated_count", len(emissions_rows)),
-                skipped_count=emissions_summary.get("skipped_count", len(skipped_emissions)),
+                resolved_activity_type=outcome.activity_type,
+                validated_count=validated_count,
+                error_count=error_count,
+                emissions_count=emissions_count,
+                skipped_count=skipped_emissions_count,
                 duration=duration,
+                stage_timings=timings.summary(),
             )
         )
 
-        log_parsing_event(
-            upload_id,
+        event_log.log(
             "INFO",
-            f"Completed. Valid: {len(validated_rows)}, Errors: {len(errors)}, Emissions: {len(emissions_rows) if emissions_rows else 0}, Duration: {duration:.2f}s"
+            f"Completed. Valid: {validated_count}, Errors: {error_count}, Emissions: {emissions_count}, Duration: {duration:.2f}s"
         )
 
         return {
-            "validated_count": len(validated_rows),
-            "error_count": len(errors),
+            "validated_count": validated_count,
+            "error_count": error_count,
             "quality_score": quality["quality_score"],
             "total_count": quality["total_rows"],
-            "emissions_calculated_count": emissions_summary.get("calculated_count", len(emissions_rows)),
-            "emissions_skipped_count": emissions_summary.get("skipped_count", len(skipped_emissions)),
-            "stage_counters": stage_counters,
+            "emissions_calculated_count": emissions_count,
+            "emissions_skipped_count": skipped_emissions_count,
+            "stage_counters": outcome.stage_counters,
+            "stage_timings": timings.summary(),
         }
 
     except ActivityTypeReviewRequired as e:
         logger.info(f"[Pipeline] ⚠️ Activity type review required for {upload_id}: {str(e)}")
-        log_parsing_event(upload_id, "WARN", str(e))
+        event_log.log("WARN", str(e))
 
         return {
             "validated_count": 0,
@@ -874,12 +1892,146 @@ def run_parsing_pipeline(upload: Dict[str, Any]) -> Dict[str, Any]:
 
     except Exception as e:
         logger.exception(f"[Pipeline] ❌ Pipeline failed for upload {upload_id}")
-        mark_as_failed(upload_id, str(e))
-        log_parsing_event(upload_id, "ERROR", str(e))
+        yield _io("mark_as_failed", upload_id, str(e))
+        event_log.log("ERROR", str(e))
         raise
     finally:
         if temp_file_path and Path(temp_file_path).exists():
             try:
                 Path(temp_file_path).unlink()
             except Exception:
-                pass
\ No newline at end of file
+                pass
+
+def flush_event_log(event_log: ParsingEventLogger) -> int:
+    return event_log.flush()
+
+
+async def flush_event_log_async(event_log: AsyncParsingEventLogger) -> int:
+    return await event_log.aflush()
+
+
+def _call_timed(function: Any, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[Any, float]:
+    """Call `function`, returning its result and the CPU time this thread spent on it."""
+    cpu_started = time.thread_time()
+    result = function(*args, **kwargs)
+    return result, time.thread_time() - cpu_started
+
+
+def _outcome(result: Any) -> str:
+    if isinstance(result, dict):
+        return str(result.get("status") or "completed")
+    return "completed"
+
+
+def _run_branches(branches: List[_PipelineSteps], timings: StageTimings) -> List[Any]:
+    def run(branch: _PipelineSteps) -> Any:
+        try:
+            return _run_steps(branch, timings)
+        except Exception as exc:
+            return exc
+
+    workers = max(1, min(settings.INGEST_SHEET_CONCURRENCY, len(branches)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-sheet") as pool:
+        return list(pool.map(run, branches))
+
+
+def _run_steps(steps: _PipelineSteps, timings: StageTimings) -> Any:
+    namespace = globals()
+    result: Any = None
+    error: Exception | None = None
+
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        if isinstance(step, _Fork):
+            # Each branch times its own steps.
+            result, error = _run_branches(step.branches, timings), None
+            continue
+
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            result, error = namespace[step.name](*step.args, **step.kwargs), None
+        except Exception as exc:
+            result, error = None, exc
+        timings.record(step.name, time.perf_counter() - started, time.thread_time() - cpu_started)
+
+
+async def _run_branches_async(branches: List[_PipelineSteps], timings: StageTimings) -> List[Any]:
+    semaphore = asyncio.Semaphore(max(1, settings.INGEST_SHEET_CONCURRENCY))
+
+    async def run(branch: _PipelineSteps) -> Any:
+        async with semaphore:
+            return await _run_steps_async(branch, timings)
+
+    return await asyncio.gather(*(run(branch) for branch in branches), return_exceptions=True)
+
+
+async def _run_steps_async(steps: _PipelineSteps, timings: StageTimings) -> Any:
+    namespace = globals()
+    result: Any = None
+    error: Exception | None = None
+
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        if isinstance(step, _Fork):
+            result, error = await _run_branches_async(step.branches, timings), None
+            continue
+
+        started = time.perf_counter()
+        cpu_seconds: float | None = None
+        try:
+            if step.cpu:
+                result, cpu_seconds = await asyncio.to_thread(
+                    _call_timed, namespace[step.name], step.args, step.kwargs
+                )
+            else:
+                result = await namespace[f"{step.name}_async"](*step.args, **step.kwargs)
+            error = None
+        except Exception as exc:
+            result, error = None, exc
+        timings.record(step.name, time.perf_counter() - started, cpu_seconds)
+
+
+def run_parsing_pipeline(upload: Dict[str, Any]) -> Dict[str, Any]:
+    # Parsing events are buffered and written in bulk; flushed once the upload is done.
+    event_log = ParsingEventLogger(upload["id"], sink=insert_parsing_events)
+    timings = StageTimings()
+    steps = _pipeline_steps(upload, event_log, timings)
+    status = "failed"
+    try:
+        result = _run_steps(steps, timings)
+        status = _outcome(result)
+        return result
+    finally:
+        steps.close()
+        event_log.flush()
+        timings.export(status)
+
+
+async def run_parsing_pipeline_async(upload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Event-loop variant of `run_parsing_pipeline`.
+
+    Runs the same steps, awaiting the async db/storage helpers and moving
+    CPU-heavy steps to threads, so one loop can drive many uploads with their
+    database and storage waits overlapping.
+    """
+    event_log = AsyncParsingEventLogger(upload["id"], sink=insert_parsing_events_async)
+    timings = StageTimings()
+    steps = _pipeline_steps(upload, event_log, timings)
+    status = "failed"
+    try:
+        result = await _run_steps_async(steps, timings)
+        status = _outcome(result)
+        return result
+    finally:
+        steps.close()
+        await event_log.aflush()
+        timings.export(status)
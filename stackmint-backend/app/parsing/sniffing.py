@@ -0,0 +1,232 @@
+# parsing/sniffing.py
+
+import codecs
+import csv
+import io
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from charset_normalizer import from_bytes  # pyright: ignore[reportMissingImports]
+
+
+logger = logging.getLogger(__name__)
+
+# Only this much of a file is ever inspected, whatever its size.
+SNIFF_BYTES = 64 * 1024
+
+_DELIMITERS = (",", ";", "\t", "|")
+_QUOTECHARS = ('"', "'")
+
+_SEPARATORS = re.escape("".join(_DELIMITERS))
+
+# A whole field wrapped in the quote character.
+_QUOTED_FIELDS = {
+    quotechar: re.compile(
+        rf"(?:^|[{_SEPARATORS}]){quotechar}[^{quotechar}\n]*{quotechar}(?=$|[{_SEPARATORS}])",
+        re.MULTILINE,
+    )
+    for quotechar in _QUOTECHARS
+}
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Numbers as European and Anglo exports write them: 1.234,5 / 12,5 and 1,234.5 / 12.5.
+_COMMA_DECIMAL = re.compile(r"^[-+]?\d+,\d+$")
+_DOT_DECIMAL = re.compile(r"^[-+]?\d+\.\d+$")
+_DOT_THOUSANDS_COMMA_DECIMAL = re.compile(r"^[-+]?\d{1,3}(\.\d{3})+(,\d+)?$")
+_COMMA_THOUSANDS_DOT_DECIMAL = re.compile(r"^[-+]?\d{1,3}(,\d{3})+(\.\d+)?$")
+
+
+@dataclass(frozen=True)
+class CsvDialect:
+    """
+    How a delimited text file is written. `header_row` is the number of
+    lines before the header, e.g. report titles some exporters put on top.
+    """
+
+    encoding: str = "utf-8"
+    delimiter: str = ","
+    decimal: str = "."
+    thousands: Optional[str] = None
+    quotechar: str = '"'
+    header_row: int = 0
+
+    def read_csv_kwargs(self) -> Dict[str, Any]:
+        """Arguments for `pd.read_csv` that read a file written this way."""
+        return {
+            "encoding": self.encoding,
+            # The encoding was judged from the head only; a stray byte further
+            # down becomes U+FFFD instead of failing the whole file.
+            "encoding_errors": "replace",
+            "sep": self.delimiter,
+            "decimal": self.decimal,
+            "thousands": self.thousands,
+            "quotechar": self.quotechar,
+            "skiprows": self.header_row,
+            # Rows ending in a delimiter have one more field than the header;
+            # keep them aligned instead of reading the first column as an index.
+            "index_col": False,
+        }
+
+
+def _detect_encoding(sample: bytes, truncated: bool) -> str:
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as exc:
+        # The sample may end halfway through a multi-byte character.
+        if truncated and exc.start >= len(sample) - 3 and exc.reason == "unexpected end of data":
+            return "utf-8"
+
+    best = from_bytes(sample).best()
+    if best is None:
+        # latin-1 decodes any byte.
+        return "latin-1"
+    return best.encoding
+
+
+def _sample_text(sample: bytes, encoding: str, truncated: bool) -> str:
+    text = sample.decode(encoding, errors="replace")
+    if truncated:
+        # Drop the partial last line.
+        text = text[: max(text.rfind("\n"), 0)]
+    return text
+
+
+def _parse(text: str, delimiter: str, quotechar: str) -> List[Tuple[int, List[str]]]:
+    """Rows of `text` with the number of lines before each."""
+    reader = csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quotechar)
+    rows: List[Tuple[int, List[str]]] = []
+    lines_before = 0
+    try:
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                rows.append((lines_before, row))
+            lines_before = reader.line_num
+    except csv.Error:
+        pass
+    return rows
+
+
+def _modal_width(rows: List[Tuple[int, List[str]]]) -> Tuple[int, float]:
+    """The most common field count, and the share of rows that have it."""
+    if not rows:
+        return 0, 0.0
+    width, count = Counter(len(row) for _, row in rows).most_common(1)[0]
+    return width, count / len(rows)
+
+
+def _detect_quotechar(text: str) -> str:
+    counts = {quotechar: len(pattern.findall(text)) for quotechar, pattern in _QUOTED_FIELDS.items()}
+    # Ties, including no quoted fields at all, keep the double quote.
+    return max(_QUOTECHARS, key=lambda quotechar: counts[quotechar])
+
+
+def _detect_delimiter(text: str, quotechar: str) -> str:
+    best, best_score = ",", (0.0, 0)
+    for delimiter in _DELIMITERS:
+        width, share = _modal_width(_parse(text, delimiter, quotechar))
+        if width < 2:
+            continue
+        score = (share, width)
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def _filled(row: List[str]) -> int:
+    return sum(1 for cell in row if cell.strip())
+
+
+def _header_row(rows: List[Tuple[int, List[str]]]) -> int:
+    """
+    Lines before the first row that isn't preamble. A title or note above
+    the table fills one cell, or far fewer than a typical row does; empty
+    trailing fields, as some exporters write, don't count either way.
+    """
+    if not rows:
+        return 0
+    typical = Counter(_filled(row) for _, row in rows).most_common(1)[0][0]
+    for lines_before, row in rows:
+        filled = _filled(row)
+        if filled * 2 >= typical and (filled > 1 or typical <= 1):
+            return lines_before
+    return 0
+
+
+def _detect_number_format(rows: List[Tuple[int, List[str]]], delimiter: str) -> Tuple[str, Optional[str]]:
+    counts: Counter[str] = Counter()
+    for _, row in rows[1:]:
+        for cell in row:
+            value = cell.strip()
+            if _DOT_THOUSANDS_COMMA_DECIMAL.match(value) and "," in value:
+                counts["comma_decimal_dot_thousands"] += 1
+            elif _COMMA_THOUSANDS_DOT_DECIMAL.match(value) and "." in value:
+                counts["dot_decimal_comma_thousands"] += 1
+            elif _COMMA_DECIMAL.match(value):
+                counts["comma_decimal"] += 1
+            elif _DOT_DECIMAL.match(value):
+                counts["dot_decimal"] += 1
+
+    comma_votes = counts["comma_decimal"] + counts["comma_decimal_dot_thousands"]
+    dot_votes = counts["dot_decimal"] + counts["dot_decimal_comma_thousands"]
+    # A comma can only be the decimal mark when it isn't the delimiter.
+    if delimiter != "," and comma_votes > dot_votes:
+        return ",", "." if counts["comma_decimal_dot_thousands"] else None
+    if delimiter != "," and counts["dot_decimal_comma_thousands"]:
+        return ".", ","
+    return ".", None
+
+
+def sniff_bytes(data: bytes, sample_bytes: int = SNIFF_BYTES) -> CsvDialect:
+    """
+    Detect the encoding, delimiter, number format, quoting and header offset
+    of delimited text from its first `sample_bytes` bytes only.
+    """
+    sample = data[:sample_bytes]
+    truncated = len(data) > sample_bytes
+    if not sample.strip():
+        return CsvDialect()
+
+    encoding = _detect_encoding(sample, truncated)
+    text = _sample_text(sample, encoding, truncated)
+
+    quotechar = _detect_quotechar(text)
+    delimiter = _detect_delimiter(text, quotechar)
+    rows = _parse(text, delimiter, quotechar)
+    header_row = _header_row(rows)
+    decimal, thousands = _detect_number_format(
+        [(lines_before, row) for lines_before, row in rows if lines_before >= header_row],
+        delimiter,
+    )
+
+    return CsvDialect(
+        encoding=encoding,
+        delimiter=delimiter,
+        decimal=decimal,
+        thousands=thousands,
+        quotechar=quotechar,
+        header_row=header_row,
+    )
+
+
+def sniff_csv(file_path: str | Path, sample_bytes: int = SNIFF_BYTES) -> CsvDialect:
+    """`sniff_bytes` over the head of a file; the rest of it is never read."""
+    with open(file_path, "rb") as handle:
+        # One byte more tells a file of exactly `sample_bytes` from a longer one.
+        data = handle.read(sample_bytes + 1)
+    dialect = sniff_bytes(data, sample_bytes)
+    logger.info("Sniffed %s: %s", Path(file_path).name, dialect)
+    return dialect
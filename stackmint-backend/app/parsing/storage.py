@@ -1,38 +1,211 @@
+import logging
 import os
 import tempfile
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
 
-from app.db.client import supabase
+import httpx
 
+from app.db.client import get_async_storage_http_client, get_async_supabase_client, get_storage_http_client
+from app.parsing.upload_cache import UploadCache, get_upload_cache
 
-def resolve_upload_file_path(upload: Dict[str, Any]) -> Tuple[str, Optional[str]]:
-    """
-    Resolve a local file path for parsing.
 
-    Returns:
-    - local path to parse
-    - temp file path to clean up later (or None)
-    """
+logger = logging.getLogger(__name__)
+
+# Downloads are written to disk as they arrive, this much at a time.
+_DOWNLOAD_CHUNK_BYTES = 1024 * 1024
 
+
+def _existing_file_path(upload: Dict[str, Any]) -> Optional[str]:
     file_path_raw = upload.get("file_path")
     if isinstance(file_path_raw, str) and file_path_raw.strip():
         file_path = file_path_raw.strip()
         if Path(file_path).exists():
-            return file_path, None
+            return file_path
+    return None
+
 
+def _storage_location(upload: Dict[str, Any]) -> Optional[Tuple[str, str]]:
     storage_path_raw = upload.get("storage_path")
     if isinstance(storage_path_raw, str) and storage_path_raw.strip():
-        storage_path = storage_path_raw.strip()
         bucket = upload.get("storage_bucket") or os.getenv("SUPABASE_UPLOAD_BUCKET", "esg-data-2")
+        return str(bucket), storage_path_raw.strip()
+    return None
+
+
+def _object_url(bucket: str, storage_path: str) -> str:
+    return f"object/{quote(bucket)}/{quote(storage_path)}"
+
+
+def _object_version(response: httpx.Response) -> Optional[str]:
+    """What identifies this version of the object: its ETag, else its size and modification time."""
+    if response.is_error:
+        return None
+    etag = response.headers.get("etag")
+    if etag:
+        return etag
+    length = response.headers.get("content-length")
+    modified = response.headers.get("last-modified")
+    if length and modified:
+        return f"{length}:{modified}"
+    return None
+
+
+def _cache_key(cache: Optional[UploadCache], bucket: str, storage_path: str, head: Optional[httpx.Response]) -> Optional[str]:
+    version = _object_version(head) if head is not None else None
+    if cache is None or version is None:
+        return None
+    return cache.key(bucket, storage_path, version)
+
+
+def _write_temp_file(chunks: Iterable[bytes], suffix: str) -> str:
+    fd, tmp_path = tempfile.mkstemp(prefix="stackmint_upload_", suffix=suffix)
+    with os.fdopen(fd, "wb") as tmp_file:
+        for chunk in chunks:
+            tmp_file.write(chunk)
+
+    return tmp_path
+
+
+async def _write_temp_file_async(chunks: AsyncIterator[bytes], suffix: str) -> str:
+    fd, tmp_path = tempfile.mkstemp(prefix="stackmint_upload_", suffix=suffix)
+    with os.fdopen(fd, "wb") as tmp_file:
+        async for chunk in chunks:
+            tmp_file.write(chunk)
+
+    return tmp_path
+
+
+def _download(bucket: str, storage_path: str) -> str:
+    client = get_storage_http_client()
+    cache = get_upload_cache()
+    url = _object_url(bucket, storage_path)
+    suffix = Path(storage_path).suffix
+
+    head = None
+    if cache is not None:
+        try:
+            head = client.head(url)
+        except httpx.HTTPError as exc:
+            logger.warning("Could not look up %s/%s, downloading without the cache: %s", bucket, storage_path, exc)
+
+    key = _cache_key(cache, bucket, storage_path, head)
+    if cache is not None and key is not None:
+        cached = cache.checkout(key, suffix)
+        if cached:
+            logger.info("Upload cache hit for %s/%s", bucket, storage_path)
+            return cached
+
+    with client.stream("GET", url) as response:
+        response.raise_for_status()
+        chunks = response.iter_bytes(_DOWNLOAD_CHUNK_BYTES)
+        if cache is not None and key is not None:
+            return cache.store(key, suffix, chunks)
+        return _write_temp_file(chunks, suffix)
+
+
+async def _download_async(bucket: str, storage_path: str) -> str:
+    client = await get_async_storage_http_client()
+    cache = get_upload_cache()
+    url = _object_url(bucket, storage_path)
+    suffix = Path(storage_path).suffix
+
+    head = None
+    if cache is not None:
+        try:
+            head = await client.head(url)
+        except httpx.HTTPError as exc:
+            logger.warning("Could not look up %s/%s, downloading without the cache: %s", bucket, storage_path, exc)
 
-        data = supabase.storage.from_(str(bucket)).download(storage_path)
-        suffix = Path(storage_path).suffix
+    key = _cache_key(cache, bucket, storage_path, head)
+    if cache is not None and key is not None:
+        cached = cache.checkout(key, suffix)
+        if cached:
+            logger.info("Upload cache hit for %s/%s", bucket, storage_path)
+            return cached
 
-        fd, tmp_path = tempfile.mkstemp(prefix="stackmint_upload_", suffix=suffix)
-        with os.fdopen(fd, "wb") as tmp_file:
-            tmp_file.write(data)
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        chunks = response.aiter_bytes(_DOWNLOAD_CHUNK_BYTES)
+        if cache is not None and key is not None:
+            return await cache.store_async(key, suffix, chunks)
+        return await _write_temp_file_async(chunks, suffix)
 
+
+def resolve_upload_file_path(upload: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """
+    Resolve a local file path for parsing.
+
+    Storage objects are streamed to disk through the upload cache, so a
+    file already fetched by preflight or an earlier attempt isn't
+    downloaded again. The path handed out is the caller's own copy.
+
+    Returns:
+    - local path to parse
+    - temp file path to clean up later (or None)
+    """
+
+    file_path = _existing_file_path(upload)
+    if file_path:
+        return file_path, None
+
+    location = _storage_location(upload)
+    if location:
+        tmp_path = _download(*location)
         return tmp_path, tmp_path
 
-    raise FileNotFoundError("Upload is missing a usable local file_path or storage_path")
\ No newline at end of file
+    raise FileNotFoundError("Upload is missing a usable local file_path or storage_path")
+
+
+async def resolve_upload_file_path_async(upload: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """
+    Async variant of `resolve_upload_file_path`; the storage download is
+    awaited instead of blocking a thread.
+    """
+
+    file_path = _existing_file_path(upload)
+    if file_path:
+        return file_path, None
+
+    location = _storage_location(upload)
+    if location:
+        tmp_path = await _download_async(*location)
+        return tmp_path, tmp_path
+
+    raise FileNotFoundError("Upload is missing a usable local file_path or storage_path")
+
+
+def _stored_object_size(entries: Any, storage_path: str) -> Optional[int]:
+    name = Path(storage_path).name
+    for entry in entries or []:
+        if not isinstance(entry, dict) or entry.get("name") != name:
+            continue
+        size = (entry.get("metadata") or {}).get("size")
+        if isinstance(size, (int, float)):
+            return int(size)
+    return None
+
+
+async def get_upload_file_size_async(upload: Dict[str, Any]) -> Optional[int]:
+    """
+    Size of the upload's file in bytes without downloading it: the local file
+    if there is one, else the storage object's metadata. None when unknown.
+    """
+
+    file_path = _existing_file_path(upload)
+    if file_path:
+        return os.path.getsize(file_path)
+
+    location = _storage_location(upload)
+    if location:
+        bucket, storage_path = location
+        folder = str(Path(storage_path).parent)
+        client = await get_async_supabase_client()
+        entries = await client.storage.from_(bucket).list(
+            "" if folder == "." else folder,
+            {"search": Path(storage_path).name, "limit": 10},
+        )
+        return _stored_object_size(entries, storage_path)
+
+    return None
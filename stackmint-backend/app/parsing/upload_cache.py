@@ -0,0 +1,155 @@
+# parsing/upload_cache.py
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Checked-out copies left behind by a crashed process are swept after this long.
+_STALE_CHECKOUT_SECONDS = 24 * 60 * 60
+
+
+class UploadCache:
+    """
+    Downloaded upload files on local disk, keyed by the storage object's
+    bucket, path and version, and evicted least recently used first once
+    they add up to more than `max_bytes`.
+
+    Readers never open a cache entry directly: `checkout` and `store` hand
+    out a hard link to it (a copy where links aren't supported) that the
+    caller deletes when done, so eviction never removes a file in use.
+    Several processes can share one directory.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._objects = self.directory / "objects"
+        self._checkouts = self.directory / "checkouts"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._checkouts.mkdir(parents=True, exist_ok=True)
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def key(bucket: str, storage_path: str, version: str) -> str:
+        return hashlib.sha256(f"{bucket}\0{storage_path}\0{version}".encode()).hexdigest()
+
+    def _entry(self, key: str, suffix: str) -> Path:
+        return self._objects / f"{key}{suffix}"
+
+    def _checkout(self, entry: Path) -> str:
+        # Named by creation time, so abandoned checkouts can be swept by age.
+        checkout = self._checkouts / f"{int(time.time())}-{uuid.uuid4().hex}{entry.suffix}"
+        try:
+            os.link(entry, checkout)
+        except OSError:
+            shutil.copyfile(entry, checkout)
+        return str(checkout)
+
+    def checkout(self, key: str, suffix: str) -> Optional[str]:
+        """A private copy of the cached file, or None when it isn't cached."""
+        entry = self._entry(key, suffix)
+        try:
+            # Marks the entry as recently used.
+            os.utime(entry)
+            return self._checkout(entry)
+        except FileNotFoundError:
+            return None
+
+    def _part_file(self, key: str, suffix: str) -> Tuple[int, Path]:
+        fd, part = tempfile.mkstemp(prefix=f".{key}.", suffix=f"{suffix}.part", dir=self._objects)
+        return fd, Path(part)
+
+    def _publish(self, part: Path, key: str, suffix: str) -> str:
+        entry = self._entry(key, suffix)
+        os.replace(part, entry)
+        checkout = self._checkout(entry)
+        self.evict()
+        return checkout
+
+    def store(self, key: str, suffix: str, chunks: Iterable[bytes]) -> str:
+        """Write `chunks` to the cache as they arrive and return a checkout of the result."""
+        fd, part = self._part_file(key, suffix)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+            return self._publish(part, key, suffix)
+        finally:
+            part.unlink(missing_ok=True)
+
+    async def store_async(self, key: str, suffix: str, chunks: AsyncIterator[bytes]) -> str:
+        """Async variant of `store`."""
+        fd, part = self._part_file(key, suffix)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                async for chunk in chunks:
+                    handle.write(chunk)
+            return self._publish(part, key, suffix)
+        finally:
+            part.unlink(missing_ok=True)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries: List[Tuple[float, int, Path]] = []
+        for path in self._objects.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _sweep_checkouts(self) -> None:
+        cutoff = time.time() - _STALE_CHECKOUT_SECONDS
+        for path in self._checkouts.iterdir():
+            created, _, _ = path.name.partition("-")
+            if created.isdigit() and int(created) < cutoff:
+                path.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in `max_bytes`."""
+        with self._evict_lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                logger.info("Evicted %s (%s bytes) from the upload cache", path.name, size)
+            self._sweep_checkouts()
+
+
+_cache: Optional[UploadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_upload_cache() -> Optional[UploadCache]:
+    """
+    The process-wide upload cache, or None when UPLOAD_CACHE_MAX_MB is 0.
+    Lives in UPLOAD_CACHE_DIR, or a directory under the system temp dir.
+    """
+    global _cache
+
+    if settings.UPLOAD_CACHE_MAX_MB <= 0:
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                directory = settings.UPLOAD_CACHE_DIR or os.path.join(tempfile.gettempdir(), "stackmint-upload-cache")
+                _cache = UploadCache(directory, settings.UPLOAD_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
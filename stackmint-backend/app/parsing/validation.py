@@ -1,8 +1,11 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 from datetime import datetime, date
 import re
 import math
 
+import numpy as np
+import pandas as pd
+
 from app.parsing.schemas import SCHEMAS
 
 
@@ -183,7 +186,19 @@ def _parse_int(value: Any) -> Optional[int]:
     return int(num)
 
 
-def _parse_date(value: Any) -> date:
+DATE_FORMATS: Tuple[str, ...] = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%d-%m-%Y",
+    "%m-%d-%Y",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m.%d.%Y",
+    "%d.%m.%Y",
+)
+
+
+def _parse_date(value: Any, formats: Sequence[str] = DATE_FORMATS) -> date:
     if isinstance(value, date) and not isinstance(value, datetime):
         return value
 
@@ -215,16 +230,7 @@ def _parse_date(value: Any) -> date:
         if 1 <= month <= 12 and 1900 <= year <= 2100:
             return date(year, month, 1)
 
-    for fmt in (
-        "%Y-%m-%d",
-        "%Y/%m/%d",
-        "%d-%m-%Y",
-        "%m-%d-%Y",
-        "%m/%d/%Y",
-        "%d/%m/%Y",
-        "%m.%d.%Y",
-        "%d.%m.%Y",
-    ):
+    for fmt in formats:
         try:
             return datetime.strptime(s, fmt).date()
         except Exception:
@@ -233,6 +239,75 @@ def _parse_date(value: Any) -> date:
     raise ValidationError("Unrecognized date format")
 
 
+DATE_PROFILE_SAMPLE_SIZE = 200
+_DATE_CACHE_LIMIT = 10_000
+_UNPARSEABLE = object()
+
+
+class DateFormatProfile:
+    """
+    Date formats for one column, ranked by how many sampled values each one
+    parses, plus a memo of already-parsed values.
+
+    Ties keep the `DATE_FORMATS` order, so a column of only ambiguous values
+    like 05/06/2024 still reads month-first while a column that also holds
+    25/06/2024 reads day-first. Values the winning format rejects fall back to
+    the remaining formats, the same as `_parse_date`.
+    """
+
+    def __init__(
+        self,
+        formats: Sequence[str] = DATE_FORMATS,
+        winner: Optional[str] = None,
+    ):
+        self.formats: Tuple[str, ...] = tuple(formats)
+        self.winner = winner
+        self._cache: Dict[str, Any] = {}
+
+    @classmethod
+    def from_sample(
+        cls,
+        values: Iterable[Any],
+        sample_size: int = DATE_PROFILE_SAMPLE_SIZE,
+    ) -> "DateFormatProfile":
+        sample: List[str] = []
+        for value in values:
+            if len(sample) >= sample_size:
+                break
+            if isinstance(value, str) and not _is_effectively_empty(value):
+                sample.append(value.strip())
+
+        hits = {fmt: 0 for fmt in DATE_FORMATS}
+        for s in sample:
+            for fmt in DATE_FORMATS:
+                try:
+                    datetime.strptime(s, fmt)
+                except ValueError:
+                    continue
+                hits[fmt] += 1
+
+        ranked = sorted(DATE_FORMATS, key=lambda fmt: -hits[fmt])
+        return cls(ranked, winner=ranked[0] if hits[ranked[0]] else None)
+
+    def parse(self, value: Any) -> date:
+        if not isinstance(value, str):
+            return _parse_date(value, self.formats)
+
+        key = value.strip()
+        cached = self._cache.get(key)
+        if cached is None:
+            try:
+                cached = _parse_date(key, self.formats)
+            except ValidationError:
+                cached = _UNPARSEABLE
+            if len(self._cache) < _DATE_CACHE_LIMIT:
+                self._cache[key] = cached
+
+        if cached is _UNPARSEABLE:
+            raise ValidationError("Unrecognized date format")
+        return cached
+
+
 def _check_enum(value: Any, enum_values: List[Any]) -> bool:
     if value is None:
         return True
@@ -251,6 +326,7 @@ def _validate_field(
     field_name: str,
     value: Any,
     schema_def: Dict[str, Any],
+    date_profile: Optional[DateFormatProfile] = None,
 ) -> Any:
 
     field_type = schema_def.get("type")
@@ -312,6 +388,8 @@ def _validate_field(
             raise ValidationError("Invalid boolean", field_name)
 
         elif field_type == "date":
+            if date_profile is not None:
+                return date_profile.parse(value)
             return _parse_date(value)
 
         else:
@@ -334,7 +412,8 @@ def _validate_field(
 def validate_row(
     row: Dict[str, Any],
     activity_type: str,
-    allow_extra: bool = True
+    allow_extra: bool = True,
+    date_profiles: Optional[Dict[str, DateFormatProfile]] = None,
 ) -> Dict[str, Any]:
 
     schema = SCHEMAS.get(activity_type)
@@ -347,6 +426,7 @@ def validate_row(
     validated: Dict[str, Any] = {}
     fields = schema.get("fields", {})
     parsed_date: Optional[date] = None
+    date_profiles = date_profiles or {}
 
     for field_name, field_def in fields.items():
         raw_value = row.get(field_name)
@@ -369,6 +449,7 @@ def validate_row(
             field_name,
             raw_value,
             field_def,
+            date_profiles.get(field_name),
         )
 
         if field_name == "date" and isinstance(validated[field_name], date):
@@ -385,4 +466,312 @@ def validate_row(
         if extras:
             validated["_audit_extra"] = extras
 
-    return validated
\ No newline at end of file
+    return validated
+
+
+# -----------------------------
+# Columnar Validation
+# -----------------------------
+#
+# Each column is coerced with pandas in one pass. Any cell the fast path
+# cannot accept with certainty is handed to `_validate_field`, so values and
+# error messages always match `validate_row`.
+
+_NUMBER_KINDS = {"floating", "integer", "mixed-integer-float", "boolean"}
+_MAX_EXACT_INT = float(2 ** 62)
+
+
+class _Column:
+    """
+    One frame column plus the per-cell facts every coercion needs.
+    """
+
+    def __init__(self, series: pd.Series):
+        self.raw: List[Any] = series.tolist()
+        self.size = len(self.raw)
+
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        missing = np.array(series.isna(), dtype=bool)
+
+        if kind == "string":
+            self.is_str = ~missing
+            self.is_number = np.zeros(self.size, dtype=bool)
+        elif kind in _NUMBER_KINDS:
+            self.is_str = np.zeros(self.size, dtype=bool)
+            self.is_number = ~missing
+        else:
+            self.is_str = self._isinstance_mask(str)
+            self.is_number = self._isinstance_mask((int, float))
+
+        if kind in _NUMBER_KINDS or kind in ("string", "empty"):
+            self.empty = missing
+        else:
+            # Only None and float NaN count as missing, matching _is_effectively_empty.
+            self.empty = missing & self._isinstance_mask((float, type(None)))
+
+        self.str_positions = np.flatnonzero(self.is_str)
+        self.stripped = pd.Series(
+            [self.raw[pos] for pos in self.str_positions],
+            index=self.str_positions,
+            dtype=object,
+        ).str.strip()
+
+        if len(self.stripped):
+            lengths = self.stripped.str.len()
+            short = self.stripped[lengths <= max(len(t) for t in EMPTY_VALUE_TOKENS)]
+            tokens = short.str.lower().isin(EMPTY_VALUE_TOKENS)
+            self.empty[short.index[tokens.to_numpy(dtype=bool)]] = True
+            self.stripped_lengths = lengths
+        else:
+            self.stripped_lengths = pd.Series([], dtype=int)
+
+    def _isinstance_mask(self, types: Any) -> np.ndarray:
+        return np.fromiter(
+            (isinstance(v, types) for v in self.raw),
+            dtype=bool,
+            count=self.size,
+        )
+
+
+def _coerce_number_column(column: _Column) -> np.ndarray:
+    """
+    Vectorized `_parse_number`. Unparseable cells are NaN.
+    """
+    values = np.full(column.size, np.nan)
+
+    if column.is_number.any():
+        positions = np.flatnonzero(column.is_number)
+        values[positions] = np.array([column.raw[pos] for pos in positions], dtype=object).astype(float)
+
+    if len(column.str_positions):
+        cleaned = (
+            pd.Series(
+                [column.raw[pos] for pos in column.str_positions],
+                dtype=object,
+            )
+            .str.replace(r"[^\d\-\.,\(\)]", "", regex=True)
+            .str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+            .str.replace(",", "", regex=False)
+            .astype(object)
+        )
+        # to_numeric decides validity; astype(float) keeps float()'s exact rounding.
+        valid = pd.to_numeric(cleaned, errors="coerce").notna().to_numpy(dtype=bool)
+        values[column.str_positions[valid]] = cleaned[valid].astype(float).to_numpy()
+
+    return values
+
+
+def _coerce_date_column(
+    column: _Column,
+    formats: Sequence[str] = DATE_FORMATS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `_parse_date` for string cells, trying the same patterns and
+    formats in the same order. Returns (date values, parsed mask).
+    """
+    values = np.empty(column.size, dtype=object)
+    parsed = np.zeros(column.size, dtype=bool)
+
+    remaining = column.stripped[~column.empty[column.str_positions]]
+    lengths = column.stripped_lengths[remaining.index]
+
+    def _accept(dates: pd.Series) -> None:
+        nonlocal remaining
+        hits = dates.notna().to_numpy(dtype=bool)
+        if not hits.any():
+            return
+        positions = dates.index[hits]
+        values[positions] = dates[hits].dt.date.to_numpy()
+        parsed[positions] = True
+        remaining = remaining.drop(positions)
+
+    # Year-only exports are common in enterprise reporting files.
+    years = remaining[lengths[remaining.index] == 4]
+    years = years[years.str.fullmatch(r"\d{4}")]
+    years = years[years.astype(int) >= 1]
+    if len(years):
+        _accept(pd.to_datetime(years, format="%Y", errors="coerce"))
+
+    # Month/year variants like 03/2024 or 2024-03.
+    for pattern, month_first in (
+        (r"^(\d{1,2})[/-](\d{4})$", True),
+        (r"^(\d{4})[/-](\d{1,2})$", False),
+    ):
+        candidates = remaining[lengths[remaining.index].between(6, 7)]
+        if not len(candidates):
+            break
+        parts = candidates.str.extract(pattern).dropna()
+        if not len(parts):
+            continue
+        first = parts[0].astype(int)
+        second = parts[1].astype(int)
+        month = first if month_first else second
+        year = second if month_first else first
+        in_range = month.between(1, 12) & year.between(1900, 2100)
+        if in_range.any():
+            _accept(pd.to_datetime(
+                pd.DataFrame({"year": year[in_range], "month": month[in_range], "day": 1}),
+                errors="coerce",
+            ))
+
+    for fmt in formats:
+        if not len(remaining):
+            break
+        _accept(pd.to_datetime(remaining, format=fmt, errors="coerce"))
+
+    return values, parsed
+
+
+def _validate_column(
+    field_name: str,
+    series: pd.Series,
+    schema_def: Dict[str, Any],
+    date_profile: Optional[DateFormatProfile] = None,
+) -> Tuple[np.ndarray, Dict[int, ValidationError]]:
+    field_type = schema_def.get("type")
+    required = schema_def.get("required", False)
+
+    column = _Column(series)
+    values = np.empty(column.size, dtype=object)
+    resolved = np.zeros(column.size, dtype=bool)
+
+    if not required:
+        resolved |= column.empty
+
+    if field_type in ("float", "integer"):
+        numbers = _coerce_number_column(column)
+        ok = ~column.empty & np.isfinite(numbers)
+        if field_type == "float":
+            values[ok] = numbers[ok].tolist()
+        else:
+            numbers = np.trunc(numbers)
+            ok &= np.abs(np.nan_to_num(numbers)) < _MAX_EXACT_INT
+            if field_name == "year":
+                ok &= (numbers >= 1900) & (numbers <= 2100)
+            values[ok] = numbers[ok].astype(np.int64).tolist()
+        resolved |= ok
+
+    elif field_type == "date":
+        dates, parsed = _coerce_date_column(
+            column,
+            date_profile.formats if date_profile is not None else DATE_FORMATS,
+        )
+        ok = parsed & ~column.empty
+        values[ok] = dates[ok]
+        resolved |= ok
+
+    elif field_type in ("string", "boolean"):
+        # Enum and boolean resolution only depend on the cell value, so each
+        # distinct value is validated once and the result mapped back.
+        candidates = ~column.empty & (column.is_str | column.is_number)
+        positions = np.flatnonzero(candidates)
+        if len(positions):
+            keys = pd.Series(
+                [(type(column.raw[pos]), column.raw[pos]) for pos in positions],
+                dtype=object,
+            )
+            codes, uniques = pd.factorize(keys)
+            lookup = np.empty(len(uniques), dtype=object)
+            known = np.zeros(len(uniques), dtype=bool)
+            for code, (_, value) in enumerate(uniques):
+                try:
+                    lookup[code] = _validate_field(field_name, value, schema_def)
+                    known[code] = True
+                except ValidationError:
+                    continue
+            hits = known[codes]
+            values[positions[hits]] = lookup[codes[hits]]
+            resolved[positions[hits]] = True
+
+    errors: Dict[int, ValidationError] = {}
+    for pos in np.flatnonzero(~resolved):
+        try:
+            values[pos] = _validate_field(field_name, column.raw[pos], schema_def, date_profile)
+        except ValidationError as exc:
+            values[pos] = None
+            errors[int(pos)] = exc
+
+    return values, errors
+
+
+def validate_frame(
+    df: pd.DataFrame,
+    activity_type: str,
+    allow_extra: bool = True,
+    date_profiles: Optional[Dict[str, DateFormatProfile]] = None,
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Tuple[int, ValidationError]]]:
+    """
+    Columnar equivalent of `validate_row` for every row of `df`.
+
+    Returns (validated, errors) as lists of (row position, result) pairs in
+    row order. Each row yields exactly what `validate_row` would return or
+    raise for `df.to_dict("records")[position]` with the same `date_profiles`.
+    """
+
+    schema = SCHEMAS.get(activity_type)
+
+    if not schema:
+        raise ValidationError(
+            f"Unknown activity type: {activity_type}"
+        )
+
+    fields = schema.get("fields", {})
+    row_count = len(df)
+    columns: Dict[str, np.ndarray] = {}
+    row_errors: Dict[int, ValidationError] = {}
+    parsed_years: Optional[np.ndarray] = None
+
+    for field_name, field_def in fields.items():
+        if field_name in df.columns:
+            series = df[field_name].reset_index(drop=True)
+        else:
+            series = pd.Series([None] * row_count, dtype=object)
+
+        field_values, field_errors = _validate_column(
+            field_name,
+            series,
+            field_def,
+            (date_profiles or {}).get(field_name),
+        )
+
+        if field_name == "year" and parsed_years is not None:
+            for pos in list(field_errors):
+                if parsed_years[pos] is not None:
+                    field_values[pos] = parsed_years[pos]
+                    del field_errors[pos]
+
+        for pos, exc in field_errors.items():
+            # validate_row stops at the first failing field.
+            row_errors.setdefault(pos, exc)
+
+        columns[field_name] = field_values
+
+        if field_name == "date":
+            parsed_years = np.array(
+                [v.year if isinstance(v, date) else None for v in field_values],
+                dtype=object,
+            )
+
+    if "year" in columns and parsed_years is not None:
+        year_values = columns["year"]
+        fill = np.equal(year_values, None) & np.not_equal(parsed_years, None)
+        year_values[fill] = parsed_years[fill]
+
+    field_names = list(columns)
+    records = [
+        dict(zip(field_names, row_values))
+        for row_values in zip(*(columns[name].tolist() for name in field_names))
+    ] if field_names else [{} for _ in range(row_count)]
+
+    extra_columns = [c for c in df.columns if c not in fields] if allow_extra else []
+    if extra_columns:
+        for record, extras in zip(records, df[extra_columns].to_dict(orient="records")):
+            record["_audit_extra"] = extras
+
+    validated = [
+        (pos, record)
+        for pos, record in enumerate(records)
+        if pos not in row_errors
+    ]
+    errors = sorted(row_errors.items())
+    return validated, errors
@@ -1,16 +1,19 @@
-from supabase import create_client
 from typing import Any
 import pandas as pd
 import math
 import os
 
+# Same pooled client as the API and workers, built from the Supabase
+# credentials alone: the app's other settings aren't needed here.
+from app.db.pooled import create_pooled_client
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SECRET_KEY")
 
 if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY environment variables must be set")
+    raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_SECRET_KEY) environment variables must be set")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = create_pooled_client(SUPABASE_URL, SUPABASE_KEY)
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
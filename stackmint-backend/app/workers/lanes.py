@@ -0,0 +1,134 @@
+# workers/lanes.py
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.parsing.extractors import _HAS_CALAMINE
+from app.parsing.storage import _existing_file_path, get_upload_file_size_async
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "fast"
+BULK_LANE = "bulk"
+
+_SNIFF_BYTES = 64 * 1024
+
+# Rough in-memory size of parsed rows relative to the file on disk. .xlsx is
+# streamed like CSV unless the calamine engine is there to read whole sheets.
+_MEMORY_FACTORS = {".xlsx": 10, ".xls": 10} if _HAS_CALAMINE else {".xls": 10}
+_DEFAULT_MEMORY_FACTOR = 4
+
+
+@dataclass
+class UploadSize:
+    lane: str
+    size_bytes: Optional[int]
+    estimated_rows: Optional[int]
+    memory_bytes: int
+
+
+def _upload_suffix(upload: Dict[str, Any]) -> str:
+    for key in ("file_path", "storage_path", "file_name"):
+        value = upload.get(key)
+        if isinstance(value, str) and value.strip():
+            return Path(value.strip()).suffix.lower()
+    return ""
+
+
+def _estimate_csv_rows(file_path: str, size_bytes: int) -> Optional[int]:
+    """Extrapolate a row count from the line lengths in the first few KB."""
+    with open(file_path, "rb") as handle:
+        head = handle.read(_SNIFF_BYTES)
+
+    lines = head.count(b"\n")
+    if lines == 0:
+        return 1 if head else 0
+    if len(head) >= size_bytes:
+        return lines
+    return int(size_bytes / (len(head) / lines))
+
+
+def classify_upload_size(upload: Dict[str, Any], size_bytes: Optional[int]) -> UploadSize:
+    """
+    Pick the lane for an upload of `size_bytes`. Unknown sizes are bulk so a
+    large file can't slip into the fast lane.
+    """
+    suffix = _upload_suffix(upload)
+
+    estimated_rows = None
+    file_path = _existing_file_path(upload)
+    if size_bytes is not None and file_path and suffix == ".csv":
+        try:
+            estimated_rows = _estimate_csv_rows(file_path, size_bytes)
+        except OSError:
+            estimated_rows = None
+
+    fast = (
+        size_bytes is not None
+        and size_bytes <= settings.INGEST_FAST_LANE_MAX_BYTES
+        and (estimated_rows is None or estimated_rows <= settings.INGEST_FAST_LANE_MAX_ROWS)
+    )
+    memory_bytes = (size_bytes or 0) * _MEMORY_FACTORS.get(suffix, _DEFAULT_MEMORY_FACTOR)
+    return UploadSize(
+        lane=FAST_LANE if fast else BULK_LANE,
+        size_bytes=size_bytes,
+        estimated_rows=estimated_rows,
+        memory_bytes=memory_bytes,
+    )
+
+
+async def classify_upload_async(upload: Dict[str, Any]) -> UploadSize:
+    """
+    Classify a claimed upload from its recorded size, the local file, or the
+    storage object's metadata, without downloading it.
+    """
+    size_bytes = upload.get("file_size_bytes")
+    if not isinstance(size_bytes, (int, float)):
+        try:
+            size_bytes = await get_upload_file_size_async(upload)
+        except Exception as exc:
+            logger.warning("[Lanes] Could not size upload %s: %s", upload.get("id"), exc)
+            size_bytes = None
+    return classify_upload_size(upload, int(size_bytes) if size_bytes is not None else None)
+
+
+class BulkLane:
+    """
+    Admission control for large uploads: at most `concurrency` at a time, and
+    only while their estimated memory fits in `memory_budget_bytes`. An upload
+    bigger than the whole budget still runs, on its own.
+    """
+
+    def __init__(self, concurrency: int, memory_budget_bytes: int):
+        self.concurrency = max(1, concurrency)
+        self.memory_budget_bytes = max(0, memory_budget_bytes)
+        self.running = 0
+        self.memory_in_use = 0
+        self._changed = asyncio.Condition()
+
+    def _fits(self, memory_bytes: int) -> bool:
+        if self.running >= self.concurrency:
+            return False
+        if self.running == 0 or not self.memory_budget_bytes:
+            return True
+        return self.memory_in_use + memory_bytes <= self.memory_budget_bytes
+
+    @asynccontextmanager
+    async def slot(self, memory_bytes: int) -> AsyncIterator[None]:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._fits(memory_bytes))
+            self.running += 1
+            self.memory_in_use += memory_bytes
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.running -= 1
+                self.memory_in_use -= memory_bytes
+                self._changed.notify_all()
@@ -0,0 +1,88 @@
+# workers/notifications.py
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from realtime import RealtimePostgresChangesListenEvent, RealtimeSubscribeStates
+
+from app.db.client import get_async_supabase_client
+from app.db.uploads import _detect_status_column_async
+
+
+logger = logging.getLogger(__name__)
+
+
+class UploadNotifier:
+    """
+    Wakes idle ingest workers when an upload may have become claimable.
+
+    `notify()` bumps a sequence number. A worker reads `sequence` before it
+    tries to claim and passes it to `wait()`, so a notification that lands
+    between the empty claim and the wait is not missed. `connected` tells
+    workers whether a push source is live or they must keep polling.
+    """
+
+    def __init__(self):
+        self.sequence = 0
+        self.connected = False
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        self.sequence += 1
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, seen: int, timeout: float) -> int:
+        """
+        Wait until the sequence moves past `seen` or `timeout` seconds pass.
+        Returns the sequence to pass on the next call.
+        """
+        if self.sequence == seen:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.sequence
+
+
+async def subscribe_to_upload_changes(notifier: UploadNotifier) -> Optional[Any]:
+    """
+    Notify on every company_raw_uploads row inserted as, or moved back to,
+    pending, via a Supabase realtime channel. Needs the table in the
+    supabase_realtime publication (scripts/sql/company_raw_uploads_realtime_migration.sql).
+    Filters on whichever status column the deployment has, as claims do.
+
+    Returns the channel, or None when realtime is unavailable.
+    """
+
+    def _on_change(payload: Any) -> None:
+        notifier.notify()
+
+    def _on_state(state: RealtimeSubscribeStates, error: Optional[Exception]) -> None:
+        if state == RealtimeSubscribeStates.SUBSCRIBED:
+            notifier.connected = True
+            # Anything queued while we were not listening is picked up now.
+            notifier.notify()
+            logger.info("[Notify] Listening for pending uploads")
+        else:
+            notifier.connected = False
+            logger.warning("[Notify] Upload channel %s: %s. Falling back to polling", state, error)
+
+    try:
+        status_column = await _detect_status_column_async()
+        client = await get_async_supabase_client()
+        channel = client.channel("ingest-pending-uploads")
+        for event in (RealtimePostgresChangesListenEvent.Insert, RealtimePostgresChangesListenEvent.Update):
+            channel.on_postgres_changes(
+                event,
+                _on_change,
+                table="company_raw_uploads",
+                schema="public",
+                filter=f"{status_column}=eq.pending",
+            )
+        await channel.subscribe(_on_state)
+        return channel
+    except Exception as exc:
+        logger.warning("[Notify] Realtime unavailable, workers will poll: %s", exc)
+        return None
@@ -1,26 +1,47 @@
+import math
+import os
+import socket
 import time
 import asyncio
 import logging
 import httpx
 from app.db.uploads import (
+    count_pending_uploads_async,
     get_pending_upload,
+    get_pending_upload_async,
+    renew_upload_lease_async,
+    upload_finished_under_lease_async,
 )
-from app.parsing.pipeline import run_parsing_pipeline
+from app.parsing.pipeline import run_parsing_pipeline, run_parsing_pipeline_async
+from app.workers.lanes import FAST_LANE, BulkLane, classify_upload_async
+from app.workers.notifications import UploadNotifier, subscribe_to_upload_changes
+from app.workers.queue_waits import queue_wait_stats
+from app.core.config import settings
+from app.core import telemetry
 
 
 logger = logging.getLogger(__name__)
 
 
+def _idle_backoff_seconds(interval_seconds: float, idle_polls: int) -> float:
+    """Exponential backoff for consecutive empty claims, capped by INGEST_IDLE_BACKOFF_MAX_SECONDS."""
+    ceiling = max(interval_seconds, settings.INGEST_IDLE_BACKOFF_MAX_SECONDS)
+    return min(interval_seconds * (2 ** min(idle_polls, 16)), ceiling)
+
+
 def start_polling(interval_seconds=5):
 
+    idle_polls = 0
     while True:
         try:
             upload = get_pending_upload()
 
             if not upload:
-                time.sleep(interval_seconds)
+                time.sleep(_idle_backoff_seconds(interval_seconds, idle_polls))
+                idle_polls += 1
                 continue
 
+            idle_polls = 0
             upload_id = upload["id"]
             logger.info(
                 "[Polling] Starting upload id=%s file=%s storage_path=%s activity_type=%s",
@@ -31,6 +52,7 @@ def start_polling(interval_seconds=5):
             )
             result = run_parsing_pipeline(upload)
             logger.info("[Polling] Processed upload %s: %s", upload_id, result)
+            continue
 
         except Exception as e:
             logger.exception("[Polling] Worker iteration failed: %s", str(e))
@@ -45,26 +67,245 @@ async def polling_worker(interval_seconds: int = 5):
     await start_worker_pool(concurrency=1, interval_seconds=interval_seconds)
 
 
-async def _worker_loop(worker_id: int, interval_seconds: float) -> None:
+class WorkerPoolController:
+    """
+    Decides how many of the pool's workers are active.
+
+    Sized from the pending queue depth and a moving average of upload
+    latency: enough workers to drain the queue within `target_drain_seconds`,
+    between `min_workers` and `max_workers`. Growth is immediate so bursts
+    drain fast; shrinking is one worker per sample so a lull doesn't thrash.
+    Workers above the active count park until they are needed again.
+    """
+
+    LATENCY_SMOOTHING = 0.3
+
+    def __init__(self, min_workers: int, max_workers: int, initial_workers: int, target_drain_seconds: float):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.target_drain_seconds = max(1.0, target_drain_seconds)
+        self.active = self._clamp(initial_workers)
+        self.busy = 0
+        self.latency_seconds: float | None = None
+        self._resized = asyncio.Event()
+
+    def _clamp(self, workers: int) -> int:
+        return max(self.min_workers, min(self.max_workers, workers))
+
+    def is_active(self, worker_id: int) -> bool:
+        return worker_id <= self.active
+
+    async def wait_until_active(self, worker_id: int) -> None:
+        while not self.is_active(worker_id):
+            await self._resized.wait()
+
+    def record_latency(self, seconds: float) -> None:
+        if self.latency_seconds is None:
+            self.latency_seconds = seconds
+        else:
+            self.latency_seconds += self.LATENCY_SMOOTHING * (seconds - self.latency_seconds)
+
+    def desired_workers(self, queue_depth: int) -> int:
+        if queue_depth <= 0:
+            return self._clamp(self.busy)
+
+        if self.latency_seconds is None:
+            # No timings yet: one worker per queued upload.
+            extra = queue_depth
+        else:
+            extra = math.ceil(queue_depth * self.latency_seconds / self.target_drain_seconds)
+        return self._clamp(self.busy + extra)
+
+    def resize(self, queue_depth: int) -> int:
+        desired = self.desired_workers(queue_depth)
+        if desired > self.active:
+            active = desired
+        elif desired < self.active:
+            active = self.active - 1
+        else:
+            return self.active
+
+        logger.info(
+            "[Polling] Active workers %s -> %s (queue_depth=%s busy=%s latency=%s)",
+            self.active,
+            active,
+            queue_depth,
+            self.busy,
+            f"{self.latency_seconds:.1f}s" if self.latency_seconds is not None else "n/a",
+        )
+        self.active = active
+        resized, self._resized = self._resized, asyncio.Event()
+        resized.set()
+        return active
+
+
+async def _controller_loop(controller: WorkerPoolController, sample_seconds: float) -> None:
     while True:
         try:
-            upload = await asyncio.to_thread(get_pending_upload)
+            depth = await count_pending_uploads_async()
+            telemetry.queue_depth.set(depth)
+            telemetry.active_workers.set(controller.resize(depth))
+        except Exception as e:
+            logger.warning("[Polling] Queue depth sample failed: %s", str(e))
+        await asyncio.sleep(sample_seconds)
+
+
+async def _run_upload(worker_id: int | str, upload: dict, bulk_lane: BulkLane | None) -> dict:
+    """
+    Run one claimed upload. Large ones wait for room in the bulk lane first;
+    without a bulk lane the upload runs straight away.
+    """
+    if bulk_lane is None:
+        return await run_parsing_pipeline_async(upload)
+
+    size = await classify_upload_async(upload)
+    if size.lane == FAST_LANE:
+        return await run_parsing_pipeline_async(upload)
+
+    logger.info(
+        "[Polling/%s] Upload %s is bulk (bytes=%s rows~%s), waiting for the bulk lane",
+        worker_id,
+        upload.get("id"),
+        size.size_bytes,
+        size.estimated_rows,
+    )
+    async with bulk_lane.slot(size.memory_bytes):
+        return await run_parsing_pipeline_async(upload)
+
+
+class LeaseLostError(Exception):
+    """The worker's lease on an upload ran out and it may now belong to another worker."""
+
+
+def _lease_worker_id(worker_id: int | str) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{worker_id}"
+
+
+async def _heartbeat(upload_id: str, lease_id: str, run: asyncio.Task) -> bool:
+    """
+    Renew the lease on `upload_id` every third of INGEST_LEASE_SECONDS until
+    cancelled. If the lease is gone, cancel `run` and return False. An upload
+    that finished while still held by `lease_id` only stops the heartbeat:
+    `run` may still be writing its last events.
+    """
+    interval = max(1, settings.INGEST_LEASE_SECONDS) / 3
+    while True:
+        await asyncio.sleep(interval)
+        if run.done():
+            return True
+        try:
+            renewed = await renew_upload_lease_async(upload_id, lease_id)
+        except Exception as e:
+            # Keep trying; two more misses still leave the lease intact.
+            logger.warning("[Polling] Lease renewal for upload %s failed: %s", upload_id, str(e))
+            continue
+        if renewed or run.done():
+            continue
+        try:
+            if await upload_finished_under_lease_async(upload_id, lease_id):
+                return True
+        except Exception as e:
+            logger.warning("[Polling] Lease check for upload %s failed: %s", upload_id, str(e))
+            continue
+        if not run.done():
+            run.cancel()
+            return False
+
+
+async def _run_leased_upload(
+    worker_id: int | str,
+    upload: dict,
+    bulk_lane: BulkLane | None,
+    lease_id: str,
+) -> dict:
+    """
+    Run a claimed upload while a heartbeat keeps its lease alive. Uploads
+    claimed without a lease just run.
+    """
+    if upload.get("worker_id") != lease_id:
+        return await _run_upload(worker_id, upload, bulk_lane)
+
+    run = asyncio.create_task(_run_upload(worker_id, upload, bulk_lane))
+    heartbeat = asyncio.create_task(_heartbeat(upload["id"], lease_id, run))
+    try:
+        return await run
+    except asyncio.CancelledError:
+        if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result() is False:
+            raise LeaseLostError(f"lease on upload {upload['id']} expired") from None
+        raise
+    finally:
+        heartbeat.cancel()
+
+
+async def _worker_loop(
+    worker_id: int | str,
+    interval_seconds: float,
+    notifier: UploadNotifier,
+    controller: WorkerPoolController | None = None,
+    bulk_lane: BulkLane | None = None,
+    max_file_size_bytes: int | None = None,
+) -> None:
+    """
+    Claim and run uploads until cancelled. Fast-lane workers pass
+    `max_file_size_bytes` and only ever claim uploads up to that size.
+    """
+    idle_polls = 0
+    lease_id = _lease_worker_id(worker_id)
+    while True:
+        try:
+            if controller is not None:
+                await controller.wait_until_active(worker_id)
+
+            # Read before claiming so a notification during the claim still wakes us.
+            seen = notifier.sequence
+            claim_started = time.monotonic()
+            upload = await get_pending_upload_async(max_file_size_bytes, lease_id)
+            telemetry.claim_seconds.observe(
+                time.monotonic() - claim_started,
+                result="claimed" if upload else "empty",
+            )
 
             if not upload:
-                await asyncio.sleep(interval_seconds)
+                # With a live push source, polling is only a slow safety net.
+                if notifier.connected:
+                    idle_seconds = settings.INGEST_SAFETY_POLL_SECONDS
+                else:
+                    idle_seconds = _idle_backoff_seconds(interval_seconds, idle_polls)
+                idle_polls += 1
+                if await notifier.wait(seen, idle_seconds) != seen:
+                    idle_polls = 0
                 continue
 
+            idle_polls = 0
             upload_id = upload["id"]
+            queue_wait = queue_wait_stats.record(upload)
+            if queue_wait is not None:
+                telemetry.queue_wait_seconds.observe(queue_wait)
             logger.info(
-                "[Polling/%s] Starting upload id=%s file=%s storage_path=%s activity_type=%s",
+                "[Polling/%s] Starting upload id=%s org=%s file=%s storage_path=%s activity_type=%s queue_wait=%s",
                 worker_id,
                 upload_id,
+                upload.get("organization_id"),
                 upload.get("file_name"),
                 upload.get("storage_path"),
                 upload.get("activity_type"),
+                f"{queue_wait:.1f}s" if queue_wait is not None else "n/a",
             )
-            result = await asyncio.to_thread(run_parsing_pipeline, upload)
+            started = time.monotonic()
+            if controller is not None:
+                controller.busy += 1
+            try:
+                result = await _run_leased_upload(worker_id, upload, bulk_lane, lease_id)
+            finally:
+                if controller is not None:
+                    controller.busy -= 1
+                    controller.record_latency(time.monotonic() - started)
             logger.info("[Polling/%s] Processed upload %s: %s", worker_id, upload_id, result)
+            # Go straight back for the next upload while the queue has work.
+            continue
+        except LeaseLostError as e:
+            logger.warning("[Polling/%s] Stopped upload: %s", worker_id, str(e))
+            continue
         except httpx.RemoteProtocolError as e:
             logger.warning(
                 "[Polling/%s] Transient transport disconnect while polling: %s. Retrying...",
@@ -83,18 +324,92 @@ async def _worker_loop(worker_id: int, interval_seconds: float) -> None:
         await asyncio.sleep(interval_seconds)
 
 
-async def start_worker_pool(concurrency: int = 2, interval_seconds: float = 2.0):
+async def start_worker_pool(
+    concurrency: int = 2,
+    interval_seconds: float = 2.0,
+    notifier: UploadNotifier | None = None,
+    min_workers: int | None = None,
+    max_workers: int | None = None,
+):
+    """
+    Run up to `max_workers` ingest workers, starting with `concurrency`
+    active. A `WorkerPoolController` resizes the active set from the queue
+    depth every INGEST_SCALE_SAMPLE_SECONDS. Large uploads go through a
+    `BulkLane`; INGEST_FAST_LANE_WORKERS extra workers only take small ones.
+
+    Idle workers sleep until `notifier` reports a new pending upload; without
+    a live push source they poll from `interval_seconds` with exponential
+    backoff. When no notifier is given, one is subscribed to realtime changes
+    if INGEST_PUSH_NOTIFICATIONS is enabled.
+    """
     if concurrency < 1:
         raise ValueError("concurrency must be >= 1")
 
+    if min_workers is None:
+        min_workers = settings.INGEST_MIN_WORKERS
+    if max_workers is None:
+        max_workers = settings.INGEST_MAX_WORKERS
+    max_workers = max(concurrency, max_workers)
+
+    controller = WorkerPoolController(
+        min_workers=min(min_workers, max_workers),
+        max_workers=max_workers,
+        initial_workers=concurrency,
+        target_drain_seconds=settings.INGEST_TARGET_DRAIN_SECONDS,
+    )
+
     logger.info(
-        "[Polling] Starting worker pool with concurrency=%s interval_seconds=%s",
-        concurrency,
+        "[Polling] Starting worker pool with concurrency=%s (min=%s max=%s) fast_lane=%s interval_seconds=%s",
+        controller.active,
+        controller.min_workers,
+        controller.max_workers,
+        settings.INGEST_FAST_LANE_WORKERS,
         interval_seconds,
     )
 
+    # Subscribing can take a while (the realtime socket retries with backoff),
+    # so workers start polling right away and switch over once it is live.
+    subscription: asyncio.Task | None = None
+    if notifier is None:
+        notifier = UploadNotifier()
+        if settings.INGEST_PUSH_NOTIFICATIONS:
+            subscription = asyncio.create_task(subscribe_to_upload_changes(notifier))
+
+    bulk_lane = BulkLane(
+        concurrency=settings.INGEST_BULK_CONCURRENCY,
+        memory_budget_bytes=settings.INGEST_BULK_MEMORY_BUDGET_MB * 1024 * 1024,
+    )
     tasks = [
-        asyncio.create_task(_worker_loop(worker_id=i + 1, interval_seconds=interval_seconds))
-        for i in range(concurrency)
+        asyncio.create_task(
+            _worker_loop(
+                worker_id=i + 1,
+                interval_seconds=interval_seconds,
+                notifier=notifier,
+                controller=controller,
+                bulk_lane=bulk_lane,
+            )
+        )
+        for i in range(controller.max_workers)
     ]
-    await asyncio.gather(*tasks)
\ No newline at end of file
+    # Reserved for small uploads and outside the autoscaler, so interactive
+    # uploads get a worker even while every pool worker is busy on a backfill.
+    tasks.extend(
+        asyncio.create_task(
+            _worker_loop(
+                worker_id=f"fast-{i + 1}",
+                interval_seconds=interval_seconds,
+                notifier=notifier,
+                max_file_size_bytes=settings.INGEST_FAST_LANE_MAX_BYTES,
+            )
+        )
+        for i in range(max(0, settings.INGEST_FAST_LANE_WORKERS))
+    )
+    tasks.append(asyncio.create_task(_controller_loop(controller, settings.INGEST_SCALE_SAMPLE_SECONDS)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if subscription is not None:
+            if not subscription.done():
+                subscription.cancel()
+            elif subscription.result() is not None:
+                await subscription.result().unsubscribe()
@@ -0,0 +1,53 @@
+# workers/queue_waits.py
+
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional
+
+from app.db.uploads import _queue_wait_seconds
+
+
+class QueueWaitStats:
+    """
+    How long claimed uploads sat in the queue, per organization.
+
+    Keeps the last `window` waits for each organization so a small tenant's
+    numbers aren't drowned out by a big one's backlog.
+    """
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._waits: Dict[Any, Deque[float]] = {}
+        self._claimed: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, upload: Dict[str, Any], now: Optional[datetime] = None) -> Optional[float]:
+        """Record the wait of a just-claimed upload. Returns it in seconds, or None without created_at."""
+        wait = _queue_wait_seconds(upload, now or datetime.now(timezone.utc))
+        if wait is None:
+            return None
+
+        org_id = upload.get("organization_id")
+        with self._lock:
+            self._waits.setdefault(org_id, deque(maxlen=self.window)).append(wait)
+            self._claimed[org_id] = self._claimed.get(org_id, 0) + 1
+        return wait
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            waits = {org_id: sorted(values) for org_id, values in self._waits.items()}
+            claimed = dict(self._claimed)
+
+        summary: Dict[str, Dict[str, Any]] = {}
+        for org_id, values in waits.items():
+            summary[str(org_id)] = {
+                "claimed": claimed[org_id],
+                "mean_wait_seconds": round(sum(values) / len(values), 3),
+                "p95_wait_seconds": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+                "max_wait_seconds": round(values[-1], 3),
+            }
+        return summary
+
+
+queue_wait_stats = QueueWaitStats()
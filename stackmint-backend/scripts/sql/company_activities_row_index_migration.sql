@@ -0,0 +1,28 @@
+-- company_activities row_index migration
+-- Ties each activity to the source row it came from, unique per upload, so
+-- the pipeline can upsert activities on (source_upload_id, row_index): a
+-- retried or reclaimed upload rewrites the same activities instead of
+-- inserting duplicates, and emissions are matched to activities by row_index
+-- rather than by list position.
+-- Activities written before this migration keep a NULL row_index and never conflict.
+-- bigint because each sheet of a workbook starts its rows a whole Excel sheet
+-- (1,048,576 rows) after the one before it; integer runs out at 2048 sheets.
+-- Safe to run multiple times.
+
+BEGIN;
+
+ALTER TABLE public.company_activities
+  ADD COLUMN IF NOT EXISTS row_index bigint;
+
+-- Widens the column where an earlier run of this migration created it as integer.
+ALTER TABLE public.company_activities
+  ALTER COLUMN row_index TYPE bigint;
+
+-- Must be a plain (non-partial) unique index for ON CONFLICT (source_upload_id, row_index).
+CREATE UNIQUE INDEX IF NOT EXISTS uq_company_activities_upload_row
+  ON public.company_activities (source_upload_id, row_index);
+
+COMMIT;
+
+-- Expose the new column through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
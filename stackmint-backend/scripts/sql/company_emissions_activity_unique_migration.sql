@@ -0,0 +1,25 @@
+-- company_emissions activity_id uniqueness migration
+-- Each activity has one emissions row. A unique key on activity_id lets the
+-- pipeline upsert emissions on it, so a retried chunk or reclaimed upload
+-- rewrites the same rows instead of inserting duplicates.
+--
+-- Duplicates left by earlier retries are removed first, keeping the most
+-- recently written row per activity.
+-- Safe to run multiple times. Run after company_activities_row_index_migration.sql.
+
+BEGIN;
+
+DELETE FROM public.company_emissions AS older
+USING public.company_emissions AS newer
+WHERE older.activity_id = newer.activity_id
+  AND (COALESCE(older.calculated_at, '-infinity'), older.ctid)
+    < (COALESCE(newer.calculated_at, '-infinity'), newer.ctid);
+
+-- Must be a plain (non-partial) unique index for ON CONFLICT (activity_id).
+CREATE UNIQUE INDEX IF NOT EXISTS uq_company_emissions_activity
+  ON public.company_emissions (activity_id);
+
+COMMIT;
+
+-- Expose the new key through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,16 @@
+-- company_raw_uploads checkpoint migration
+-- Adds parsing_checkpoint, where the pipeline records progress after every
+-- fully persisted chunk (rows validated, activities and emissions inserted,
+-- carry-forward state). A retried or reclaimed upload resumes after the last
+-- finished chunk instead of starting over. Cleared when the upload completes.
+-- Safe to run multiple times.
+
+BEGIN;
+
+ALTER TABLE public.company_raw_uploads
+  ADD COLUMN IF NOT EXISTS parsing_checkpoint jsonb;
+
+COMMIT;
+
+-- Expose the new column through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,54 @@
+-- company_raw_uploads job claiming migration
+-- Adds claim_pending_uploads(), which hands the next upload(s) to a worker in
+-- one round trip. Candidate rows are locked with FOR UPDATE SKIP LOCKED, so
+-- concurrent workers never wait on or collide over the same row.
+-- Safe to run multiple times. Run after company_raw_uploads_metrics_migration.sql
+-- (relies on created_at/updated_at and the updated_at trigger).
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.claim_pending_uploads(
+  batch_size integer DEFAULT 1,
+  stale_after_seconds integer DEFAULT 300
+)
+RETURNS SETOF public.company_raw_uploads
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH candidates AS (
+    SELECT id
+    FROM public.company_raw_uploads
+    WHERE parsing_status = 'pending'
+       -- Recovery path: reclaim processing uploads whose worker went quiet.
+       OR (
+         parsing_status = 'processing'
+         AND COALESCE(updated_at, created_at)
+             <= now() - make_interval(secs => stale_after_seconds)
+       )
+    ORDER BY
+      (parsing_status = 'processing'),
+      created_at NULLS LAST,
+      id
+    LIMIT GREATEST(batch_size, 1)
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE public.company_raw_uploads AS uploads
+  SET parsing_status = 'processing'
+  FROM candidates
+  WHERE uploads.id = candidates.id
+  RETURNING uploads.*;
+$$;
+
+-- Only the backend (service role) claims work.
+REVOKE EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer) TO service_role;
+
+-- Keeps the pending scan an index range read however large the table grows.
+CREATE INDEX IF NOT EXISTS idx_company_raw_uploads_pending_created_at
+  ON public.company_raw_uploads (created_at)
+  WHERE parsing_status = 'pending';
+
+COMMIT;
+
+-- Expose the function through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
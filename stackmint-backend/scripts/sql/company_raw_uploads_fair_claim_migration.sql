@@ -0,0 +1,92 @@
+-- company_raw_uploads fair claiming migration
+-- Replaces claim_pending_uploads() (company_raw_uploads_claim_migration.sql)
+-- with a per-organization fair-share order, so one tenant's bulk drop can't
+-- starve everyone else's uploads.
+--
+-- Pending uploads are claimed by, in order:
+--   1. priority tier (company_raw_uploads.priority, higher first; default 0)
+--   2. the organization's turn: its Nth oldest pending upload gets turn N,
+--      pushed back by the number of uploads it already has processing
+--   3. age
+-- so organizations take turns instead of queueing behind the biggest batch.
+-- Stale processing uploads are reclaimed after all pending ones, as before.
+-- Safe to run multiple times. Run after company_raw_uploads_claim_migration.sql.
+
+BEGIN;
+
+ALTER TABLE public.company_raw_uploads
+  ADD COLUMN IF NOT EXISTS priority smallint NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION public.claim_pending_uploads(
+  batch_size integer DEFAULT 1,
+  stale_after_seconds integer DEFAULT 300
+)
+RETURNS SETOF public.company_raw_uploads
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH in_flight AS (
+    SELECT organization_id, count(*) AS running
+    FROM public.company_raw_uploads
+    WHERE parsing_status = 'processing'
+    GROUP BY organization_id
+  ),
+  queue AS (
+    SELECT
+      pending.id,
+      0 AS lane,
+      pending.priority,
+      row_number() OVER (
+        PARTITION BY pending.organization_id
+        ORDER BY pending.priority DESC, pending.created_at NULLS LAST, pending.id
+      ) + COALESCE(in_flight.running, 0) AS turn,
+      pending.created_at
+    FROM public.company_raw_uploads AS pending
+    LEFT JOIN in_flight
+      ON in_flight.organization_id IS NOT DISTINCT FROM pending.organization_id
+    WHERE pending.parsing_status = 'pending'
+
+    UNION ALL
+
+    -- Recovery path: reclaim processing uploads whose worker went quiet.
+    SELECT id, 1, priority, 0, created_at
+    FROM public.company_raw_uploads
+    WHERE parsing_status = 'processing'
+      AND COALESCE(updated_at, created_at) <= now() - make_interval(secs => stale_after_seconds)
+  ),
+  candidates AS (
+    SELECT uploads.id
+    FROM public.company_raw_uploads AS uploads
+    JOIN queue ON queue.id = uploads.id
+    -- Re-checked against the latest row version once the lock is taken.
+    WHERE (queue.lane = 0 AND uploads.parsing_status = 'pending')
+       OR (
+         queue.lane = 1
+         AND uploads.parsing_status = 'processing'
+         AND COALESCE(uploads.updated_at, uploads.created_at)
+             <= now() - make_interval(secs => stale_after_seconds)
+       )
+    ORDER BY queue.lane, queue.priority DESC, queue.turn, queue.created_at NULLS LAST, uploads.id
+    LIMIT GREATEST(batch_size, 1)
+    FOR UPDATE OF uploads SKIP LOCKED
+  )
+  UPDATE public.company_raw_uploads AS uploads
+  SET parsing_status = 'processing'
+  FROM candidates
+  WHERE uploads.id = candidates.id
+  RETURNING uploads.*;
+$$;
+
+-- Only the backend (service role) claims work.
+REVOKE EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer) TO service_role;
+
+-- Serves the per-organization turn ranking over pending uploads.
+CREATE INDEX IF NOT EXISTS idx_company_raw_uploads_pending_org
+  ON public.company_raw_uploads (organization_id, priority DESC, created_at)
+  WHERE parsing_status = 'pending';
+
+COMMIT;
+
+-- Expose the new definition through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
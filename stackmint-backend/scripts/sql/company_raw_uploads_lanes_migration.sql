@@ -0,0 +1,123 @@
+-- company_raw_uploads fast/bulk lane migration
+-- Records each upload's file size and lets claim_pending_uploads() claim only
+-- uploads up to a given size, so the backend's fast-lane workers never pick
+-- up a large file. Everything else is unchanged from
+-- company_raw_uploads_fair_claim_migration.sql.
+--
+-- The size is copied from the storage object's metadata when the row is
+-- inserted (the frontend uploads the file before inserting the row), so
+-- clients don't have to send it. Rows with an unknown size are bulk.
+-- Safe to run multiple times. Run after company_raw_uploads_fair_claim_migration.sql.
+
+BEGIN;
+
+ALTER TABLE public.company_raw_uploads
+  ADD COLUMN IF NOT EXISTS file_size_bytes bigint;
+
+CREATE OR REPLACE FUNCTION public.set_company_raw_uploads_file_size()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, storage
+AS $$
+BEGIN
+  IF NEW.file_size_bytes IS NULL AND NEW.storage_path IS NOT NULL THEN
+    SELECT (objects.metadata->>'size')::bigint
+    INTO NEW.file_size_bytes
+    FROM storage.objects AS objects
+    WHERE objects.name = NEW.storage_path
+    LIMIT 1;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_company_raw_uploads_file_size ON public.company_raw_uploads;
+CREATE TRIGGER trg_company_raw_uploads_file_size
+BEFORE INSERT OR UPDATE OF storage_path ON public.company_raw_uploads
+FOR EACH ROW
+EXECUTE FUNCTION public.set_company_raw_uploads_file_size();
+
+-- Backfill uploads that are still waiting.
+UPDATE public.company_raw_uploads AS uploads
+SET file_size_bytes = (objects.metadata->>'size')::bigint
+FROM storage.objects AS objects
+WHERE uploads.file_size_bytes IS NULL
+  AND uploads.parsing_status IN ('pending', 'processing')
+  AND objects.name = uploads.storage_path;
+
+-- The signature changes, so drop the old one rather than leave an ambiguous overload.
+DROP FUNCTION IF EXISTS public.claim_pending_uploads(integer, integer);
+
+CREATE OR REPLACE FUNCTION public.claim_pending_uploads(
+  batch_size integer DEFAULT 1,
+  stale_after_seconds integer DEFAULT 300,
+  max_file_size_bytes bigint DEFAULT NULL
+)
+RETURNS SETOF public.company_raw_uploads
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH in_flight AS (
+    SELECT organization_id, count(*) AS running
+    FROM public.company_raw_uploads
+    WHERE parsing_status = 'processing'
+    GROUP BY organization_id
+  ),
+  queue AS (
+    SELECT
+      pending.id,
+      0 AS lane,
+      pending.priority,
+      row_number() OVER (
+        PARTITION BY pending.organization_id
+        ORDER BY pending.priority DESC, pending.created_at NULLS LAST, pending.id
+      ) + COALESCE(in_flight.running, 0) AS turn,
+      pending.created_at
+    FROM public.company_raw_uploads AS pending
+    LEFT JOIN in_flight
+      ON in_flight.organization_id IS NOT DISTINCT FROM pending.organization_id
+    WHERE pending.parsing_status = 'pending'
+      AND (max_file_size_bytes IS NULL OR pending.file_size_bytes <= max_file_size_bytes)
+
+    UNION ALL
+
+    -- Recovery path: reclaim processing uploads whose worker went quiet.
+    -- Left to unrestricted (bulk) claims.
+    SELECT id, 1, priority, 0, created_at
+    FROM public.company_raw_uploads
+    WHERE max_file_size_bytes IS NULL
+      AND parsing_status = 'processing'
+      AND COALESCE(updated_at, created_at) <= now() - make_interval(secs => stale_after_seconds)
+  ),
+  candidates AS (
+    SELECT uploads.id
+    FROM public.company_raw_uploads AS uploads
+    JOIN queue ON queue.id = uploads.id
+    -- Re-checked against the latest row version once the lock is taken.
+    WHERE (queue.lane = 0 AND uploads.parsing_status = 'pending')
+       OR (
+         queue.lane = 1
+         AND uploads.parsing_status = 'processing'
+         AND COALESCE(uploads.updated_at, uploads.created_at)
+             <= now() - make_interval(secs => stale_after_seconds)
+       )
+    ORDER BY queue.lane, queue.priority DESC, queue.turn, queue.created_at NULLS LAST, uploads.id
+    LIMIT GREATEST(batch_size, 1)
+    FOR UPDATE OF uploads SKIP LOCKED
+  )
+  UPDATE public.company_raw_uploads AS uploads
+  SET parsing_status = 'processing'
+  FROM candidates
+  WHERE uploads.id = candidates.id
+  RETURNING uploads.*;
+$$;
+
+-- Only the backend (service role) claims work.
+REVOKE EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer, bigint) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer, bigint) TO service_role;
+
+COMMIT;
+
+-- Expose the new definition through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
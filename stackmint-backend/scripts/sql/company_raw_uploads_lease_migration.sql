@@ -0,0 +1,118 @@
+-- company_raw_uploads lease migration
+-- Claimed uploads get an explicit lease: worker_id names the worker holding
+-- it and lease_expires_at says until when. Workers renew the lease with a
+-- heartbeat while the pipeline runs, so a long upload is never taken over
+-- mid-run, and a crashed worker's upload is reclaimed as soon as its short
+-- lease runs out instead of after a fixed five minutes.
+--
+-- Uploads claimed without a lease (older workers, or before this migration)
+-- still fall back to the updated_at staleness check.
+-- Safe to run multiple times. Run after company_raw_uploads_lanes_migration.sql.
+
+BEGIN;
+
+ALTER TABLE public.company_raw_uploads
+  ADD COLUMN IF NOT EXISTS worker_id text,
+  ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz;
+
+-- The signature changes, so drop the old one rather than leave an ambiguous overload.
+DROP FUNCTION IF EXISTS public.claim_pending_uploads(integer, integer, bigint);
+
+CREATE OR REPLACE FUNCTION public.claim_pending_uploads(
+  batch_size integer DEFAULT 1,
+  stale_after_seconds integer DEFAULT 300,
+  max_file_size_bytes bigint DEFAULT NULL,
+  worker_id text DEFAULT NULL,
+  lease_seconds integer DEFAULT 30
+)
+RETURNS SETOF public.company_raw_uploads
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH in_flight AS (
+    SELECT organization_id, count(*) AS running
+    FROM public.company_raw_uploads
+    WHERE parsing_status = 'processing'
+    GROUP BY organization_id
+  ),
+  queue AS (
+    SELECT
+      pending.id,
+      0 AS lane,
+      pending.priority,
+      row_number() OVER (
+        PARTITION BY pending.organization_id
+        ORDER BY pending.priority DESC, pending.created_at NULLS LAST, pending.id
+      ) + COALESCE(in_flight.running, 0) AS turn,
+      pending.created_at
+    FROM public.company_raw_uploads AS pending
+    LEFT JOIN in_flight
+      ON in_flight.organization_id IS NOT DISTINCT FROM pending.organization_id
+    WHERE pending.parsing_status = 'pending'
+      AND (max_file_size_bytes IS NULL OR pending.file_size_bytes <= max_file_size_bytes)
+
+    UNION ALL
+
+    -- Recovery path: reclaim processing uploads whose lease expired, or that
+    -- were claimed without one and went quiet. Left to unrestricted (bulk) claims.
+    SELECT id, 1, priority, 0, created_at
+    FROM public.company_raw_uploads
+    WHERE max_file_size_bytes IS NULL
+      AND parsing_status = 'processing'
+      AND (
+        lease_expires_at <= now()
+        OR (
+          lease_expires_at IS NULL
+          AND COALESCE(updated_at, created_at) <= now() - make_interval(secs => stale_after_seconds)
+        )
+      )
+  ),
+  candidates AS (
+    SELECT uploads.id
+    FROM public.company_raw_uploads AS uploads
+    JOIN queue ON queue.id = uploads.id
+    -- Re-checked against the latest row version once the lock is taken, so a
+    -- lease renewed in the meantime keeps its upload.
+    WHERE (queue.lane = 0 AND uploads.parsing_status = 'pending')
+       OR (
+         queue.lane = 1
+         AND uploads.parsing_status = 'processing'
+         AND (
+           uploads.lease_expires_at <= now()
+           OR (
+             uploads.lease_expires_at IS NULL
+             AND COALESCE(uploads.updated_at, uploads.created_at)
+                 <= now() - make_interval(secs => stale_after_seconds)
+           )
+         )
+       )
+    ORDER BY queue.lane, queue.priority DESC, queue.turn, queue.created_at NULLS LAST, uploads.id
+    LIMIT GREATEST(batch_size, 1)
+    FOR UPDATE OF uploads SKIP LOCKED
+  )
+  UPDATE public.company_raw_uploads AS uploads
+  SET
+    parsing_status = 'processing',
+    worker_id = claim_pending_uploads.worker_id,
+    lease_expires_at = CASE
+      WHEN claim_pending_uploads.worker_id IS NULL THEN NULL
+      ELSE now() + make_interval(secs => GREATEST(lease_seconds, 1))
+    END
+  FROM candidates
+  WHERE uploads.id = candidates.id
+  RETURNING uploads.*;
+$$;
+
+-- Only the backend (service role) claims work.
+REVOKE EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer, bigint, text, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_pending_uploads(integer, integer, bigint, text, integer) TO service_role;
+
+-- Keeps the expired-lease scan cheap.
+CREATE INDEX IF NOT EXISTS idx_company_raw_uploads_processing_lease
+  ON public.company_raw_uploads (lease_expires_at)
+  WHERE parsing_status = 'processing';
+
+COMMIT;
+
+-- Expose the new definition through PostgREST without waiting for a cache reload.
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,23 @@
+-- company_raw_uploads realtime migration
+-- Publishes company_raw_uploads changes to Supabase realtime so ingest
+-- workers are woken when an upload is inserted or returned to pending,
+-- instead of polling the table.
+-- Safe to run multiple times.
+
+BEGIN;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1
+    FROM pg_publication_tables
+    WHERE pubname = 'supabase_realtime'
+      AND schemaname = 'public'
+      AND tablename = 'company_raw_uploads'
+  ) THEN
+    ALTER PUBLICATION supabase_realtime ADD TABLE public.company_raw_uploads;
+  END IF;
+END;
+$$;
+
+COMMIT;
@@ -20,6 +20,14 @@ def pytest_configure(config):
     )
 
 
+@pytest.fixture(autouse=True)
+def unknown_schema(monkeypatch):
+    """Treat table columns as unknown so db helpers never introspect a live schema."""
+    from app.db import schema
+
+    monkeypatch.setattr(schema, "_capabilities", schema.SchemaCapabilities({}))
+
+
 @pytest.fixture(scope="session")
 def data_dir() -> pathlib.Path:
     return DATA_DIR
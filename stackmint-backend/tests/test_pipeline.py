@@ -9,16 +9,36 @@ Coverage:
   - Emissions calculation (unit, factor-lookup diagnostics)
   - Pipeline orchestration (stage counters, strict mode)
   - Factor match diagnostics (skip reason buckets)
+  - Parsing event logging (buffered bulk inserts)
+  - Async pipeline (event-loop driver over the same steps)
+  - Sharded row processing (process pool, carry-forward across shards)
+  - Upload claiming (claim_pending_uploads RPC, compare-and-swap fallback)
+  - Worker wake-up (push notifications with polling as a safety net)
+  - Worker autoscaling (queue-depth sizing, idle backoff)
+  - Fair scheduling (per-organization turns, priority tiers, queue waits)
+  - Upload lanes (size classification, fast-lane claims, bulk admission)
+  - Upload leases (lease-based reclaim, heartbeat renewal)
+  - Chunk checkpoints (resume after the last persisted chunk)
+  - Activity upserts (byte-bounded chunks, row_index keys, legacy fallback)
+  - Emissions bulk writes (activity_id upserts, learned column set and key)
+  - Schema capabilities (introspected once, writers shaped up front, one completion update)
+  - Stage timings and Prometheus metrics (per-stage wall/CPU/rows, exporter format)
+  - Excel streaming (read-only rows match pandas, sampling, same pipeline result as CSV)
+  - Workbook sheets (per-sheet activity types, concurrent sheets, rolled-up summary)
+  - CSV sniffing (encoding, delimiter, decimal mark, header offset, quoting from the head only)
+  - Upload file cache (streamed downloads, ETag-keyed entries, LRU size cap, private checkouts)
 
 All tests run without live Supabase by default.
 Supabase-dependent tests are @pytest.mark.integration.
 """
 
+import asyncio
 import pathlib
 import time
+from contextlib import ExitStack
 from decimal import Decimal
 from typing import Any, Dict, List, Optional
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -98,6 +118,20 @@ class TestExtraction:
         # Should handle 1200-row CSV in under 3 seconds
         assert elapsed < 3.0, f"Extraction too slow: {elapsed:.2f}s"
 
+    def test_chunked_extraction_matches_full_read(self):
+        from app.parsing.extractors import iter_row_chunks
+        upload = {"id": "test", "file_path": str(DATA_DIR / "stationary_combustion_large.csv")}
+        chunks = list(iter_row_chunks(upload, chunk_size=500))
+        assert [len(c) for c in chunks] == [500, 500, 200]
+        flattened = [row for chunk in chunks for row in chunk]
+        assert flattened == _load_csv("stationary_combustion_large.csv")
+
+    def test_chunk_size_must_be_positive(self):
+        from app.parsing.extractors import iter_row_chunks
+        upload = {"id": "test", "file_path": str(DATA_DIR / "stationary_combustion_happy.csv")}
+        with pytest.raises(ValueError):
+            next(iter_row_chunks(upload, chunk_size=0))
+
 
 # ---------------------------------------------------------------------------
 # 2. Column normalization
@@ -138,6 +172,31 @@ class TestNormalization:
         mapped, unmapped = normalize_columns(row, "stationary_combustion", {})
         assert "very_unknown_column_xyz" in unmapped
 
+    def test_mapping_plan_is_memoized_per_layout(self):
+        from app.parsing.mapping import compile_mapping_plan
+        headers = ["Date", "Site", "Fuel", "Usage Qty", "Unit"]
+        mappings = {"Usage Qty": "consumption"}
+
+        plan = compile_mapping_plan("stationary_combustion", headers, mappings)
+        assert compile_mapping_plan("stationary_combustion", tuple(headers), dict(mappings)) is plan
+        assert compile_mapping_plan("stationary_combustion", headers, {}) is not plan
+        assert plan.columns["Usage Qty"] == "consumption"
+
+    def test_mapping_plan_falls_through_empty_candidates(self):
+        """A None in the preferred column falls back to the next candidate, per row."""
+        from app.parsing.mapping import compile_mapping_plan, normalize_columns
+        rows = [
+            {"fuel": "diesel", "fuel_type": "petrol", "quantity": 5, "unit": "litres"},
+            {"fuel": None, "fuel_type": "petrol", "quantity": 6, "unit": "litres"},
+        ]
+        plan = compile_mapping_plan("stationary_combustion", rows[0].keys(), {})
+
+        assert [plan.apply(row) for row in rows] == [
+            normalize_columns(row, "stationary_combustion", {}) for row in rows
+        ]
+        assert plan.apply(rows[1])[0]["fuel_type"] == "petrol"
+        assert plan.apply(rows[1])[1]["fuel"] is None
+
 
 # ---------------------------------------------------------------------------
 # 3. Validation
@@ -218,6 +277,121 @@ class TestValidation:
         result = validate_row(row, "stationary_combustion")
         assert result is not None
 
+    def test_validate_frame_matches_validate_row(self):
+        """Columnar validation returns exactly what validate_row returns or raises."""
+        import pandas as pd
+        from app.parsing.validation import validate_frame, validate_row, ValidationError
+
+        rows = [
+            {"date": "2024-01-15", "facility_id": "FAC-001", "fuel_type": "natural_gas",
+             "consumption": "1,200.50", "unit": "m3", "year": None, "notes": "ok"},
+            {"date": "03/2024", "facility_id": " FAC-002 ", "fuel_type": "diesel",
+             "consumption": "(15)", "unit": "litres", "year": "2023", "notes": None},
+            {"date": "2024", "facility_id": "FAC-003", "fuel_type": "diesel",
+             "consumption": 7, "unit": "litres", "year": None, "notes": "year only"},
+            {"date": "not a date", "facility_id": "FAC-004", "fuel_type": "diesel",
+             "consumption": 10.0, "unit": "litres", "year": None, "notes": None},
+            {"date": "2024-02-01", "facility_id": "N/A", "fuel_type": "diesel",
+             "consumption": 10.0, "unit": "litres", "year": None, "notes": None},
+            {"date": "2024-02-01", "facility_id": "FAC-006", "fuel_type": "diesel",
+             "consumption": "abc", "unit": "litres", "year": "1850", "notes": None},
+            {"date": "15/01/2024", "facility_id": "FAC-007", "fuel_type": "natural_gas",
+             "consumption": float("nan"), "unit": "m3", "year": None, "notes": None},
+        ]
+        df = pd.DataFrame(rows, dtype=object)
+
+        validated, errors = validate_frame(df, "stationary_combustion")
+        frame_results = dict(validated)
+        frame_results.update({pos: str(exc) for pos, exc in errors})
+
+        for pos, row in enumerate(df.to_dict(orient="records")):
+            try:
+                expected: Any = validate_row(row, "stationary_combustion")
+            except ValidationError as exc:
+                expected = str(exc)
+            assert frame_results[pos] == expected, f"row {pos}"
+
+        assert [pos for pos, _ in errors] == [3, 4, 5, 6]
+
+    def test_mapped_chunk_validates_like_validate_row(self):
+        """Ints next to None, dates and numeric strings come out of a chunk as validate_row gives them."""
+        from datetime import date
+        from app.parsing.pipeline import _validate_mapped_rows
+        from app.parsing.validation import validate_row, ValidationError
+
+        mapped_rows = [
+            {"date": "2024-01-15", "vehicle_id": 101, "fuel_type": "diesel", "consumption": "1,200.5", "unit": "litres"},
+            {"date": date(2024, 2, 1), "vehicle_id": None, "fuel_type": "petrol", "consumption": 42, "unit": "litres"},
+            {"date": "03/2024", "vehicle_id": 7, "fuel_type": "diesel", "consumption": "abc", "unit": "litres"},
+            {"date": "2024-04-01", "fuel_type": "lpg", "consumption": "12.5", "unit": "litres"},
+        ]
+        upload = _make_upload("unused.csv")
+        validated, errors = _validate_mapped_rows(mapped_rows, [10, 11, 12, 13], upload, "mobile_combustion")
+
+        added = {"activity_type", "upload_id", "row_index", "organization_id", "company_location_id"}
+        chunk_results: Dict[int, Any] = {
+            row["row_index"] - 10: {k: v for k, v in row.items() if k not in added} for row in validated
+        }
+        chunk_results.update({error["row_index"] - 10: error["error"] for error in errors})
+
+        for pos, row in enumerate(mapped_rows):
+            try:
+                expected: Any = validate_row(row, "mobile_combustion")
+            except ValidationError as exc:
+                expected = str(exc)
+            assert chunk_results[pos] == expected, f"row {pos}"
+
+        assert chunk_results[0]["vehicle_id"] == "101"
+
+    def test_date_profile_picks_day_first_column(self):
+        from datetime import date
+        from app.parsing.validation import DateFormatProfile
+
+        profile = DateFormatProfile.from_sample(["05/06/2024", "25/06/2024", None, "n/a"])
+        assert profile.winner == "%d/%m/%Y"
+        assert profile.parse("05/06/2024") == date(2024, 6, 5)
+        # Values the winner rejects still go through the other formats.
+        assert profile.parse("2024-01-15") == date(2024, 1, 15)
+        assert profile.parse("2024") == date(2024, 1, 1)
+
+    def test_date_profile_keeps_month_first_for_ambiguous_column(self):
+        from datetime import date
+        from app.parsing.validation import DateFormatProfile, ValidationError
+
+        profile = DateFormatProfile.from_sample(["05/06/2024", "01/02/2024"])
+        assert profile.parse("05/06/2024") == date(2024, 5, 6)
+        with pytest.raises(ValidationError):
+            profile.parse("not a date")
+        # Failures are memoized too and keep raising.
+        with pytest.raises(ValidationError):
+            profile.parse("not a date")
+
+    def test_validate_frame_uses_date_profile(self):
+        import pandas as pd
+        from datetime import date
+        from app.parsing.validation import DateFormatProfile, validate_frame, validate_row
+
+        rows = [
+            {"date": d, "facility_id": "FAC-001", "fuel_type": "diesel",
+             "consumption": 1.0, "unit": "litres"}
+            for d in ("25/06/2024", "05/06/2024", "2024-03-01", "06/2024")
+        ]
+        profiles = {"date": DateFormatProfile.from_sample(r["date"] for r in rows)}
+
+        validated, errors = validate_frame(
+            pd.DataFrame(rows, dtype=object),
+            "stationary_combustion",
+            date_profiles=profiles,
+        )
+        assert errors == []
+        assert [r["date"] for _, r in validated] == [
+            date(2024, 6, 25), date(2024, 6, 5), date(2024, 3, 1), date(2024, 6, 1),
+        ]
+        assert [r for _, r in validated] == [
+            validate_row(row, "stationary_combustion", date_profiles=profiles)
+            for row in rows
+        ]
+
 
 # ---------------------------------------------------------------------------
 # 4. Activity type inference
@@ -383,6 +557,30 @@ class TestEmissionsBatch:
         assert len(result["skipped_rows"]) == 0
         assert result["summary"]["calculated_count"] == 2
 
+    def test_batch_resolves_each_lookup_key_once(self):
+        from app.parsing import emissions
+        fuels = ["diesel", "petrol", "natural_gas"]
+        rows = [
+            {"activity_type": "stationary_combustion", "consumption": 10.0, "unit": "litres",
+             "fuel_type": fuels[i % 3], "year": 2024}
+            for i in range(300)
+        ]
+        activities = [{"id": f"act-{i}"} for i in range(300)]
+        factor_values = {"diesel": "2.0", "petrol": "3.0", "natural_gas": "4.0"}
+        looked_up: List[Optional[str]] = []
+
+        def _fake_fetch(supabase, activity_type, unit, region, year, match_token=None):
+            looked_up.append(match_token)
+            return {"id": f"factor-{match_token}", "factor_value": factor_values[match_token]}, []
+
+        with patch.object(emissions, "_fetch_emission_factor", side_effect=_fake_fetch):
+            result = emissions.calculate_emissions_for_batch(MagicMock(), rows, activities)
+
+        assert sorted(looked_up) == sorted(fuels)
+        assert len(result["rows"]) == 300
+        assert [r["co2e"] for r in result["rows"][:3]] == [20.0, 30.0, 40.0]
+        assert result["rows"][4]["activity_id"] == "act-4"
+
     def test_batch_partial_skip(self):
         from app.parsing.emissions import calculate_emissions_for_batch
         mock_sb = _mock_supabase_no_factor()
@@ -451,17 +649,16 @@ class TestPipelineStageCounters:
         with (
             patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
             patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
-            patch("app.parsing.pipeline.insert_activities", return_value=[dummy_activity]),
-            patch("app.parsing.pipeline.get_activities_for_upload", return_value=[]),
+            patch("app.parsing.pipeline.upsert_activities", return_value=[dummy_activity]),
             patch("app.parsing.pipeline.insert_emissions", return_value=None),
-            patch("app.parsing.pipeline.mark_as_completed", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", return_value=None),
             patch("app.parsing.pipeline.mark_as_failed", return_value=None),
             patch("app.parsing.pipeline.mark_as_pending_review", return_value=None),
             patch("app.parsing.pipeline.save_upload_inference_audit", return_value=None),
             patch("app.parsing.pipeline.set_upload_activity_type", return_value=None),
             patch("app.parsing.pipeline.update_upload_fields", return_value=None),
-            patch("app.parsing.pipeline.log_parsing_event", return_value=None),
-            patch("app.parsing.pipeline.create_client", return_value=mock_sb),
+            patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=mock_sb),
         ):
             from app.parsing.pipeline import run_parsing_pipeline
             return run_parsing_pipeline(upload)
@@ -487,6 +684,25 @@ class TestPipelineStageCounters:
         assert result["stage_counters"]["extracted_rows"] == 1200
         assert result["validated_count"] > 0
 
+    def test_chunked_run_matches_single_chunk_run(self):
+        from app.core.config import settings
+
+        with patch.object(settings, "INGEST_CHUNK_SIZE", 100_000):
+            single = self._run_pipeline_offline("stationary_combustion_large.csv", "stationary_combustion")
+        with patch.object(settings, "INGEST_CHUNK_SIZE", 7):
+            chunked = self._run_pipeline_offline("stationary_combustion_large.csv", "stationary_combustion")
+
+        assert chunked["validated_count"] == single["validated_count"]
+        assert chunked["error_count"] == single["error_count"]
+        assert chunked["stage_counters"]["extracted_rows"] == 1200
+
+    def test_sparse_rows_carry_forward_across_chunks(self):
+        from app.core.config import settings
+
+        with patch.object(settings, "INGEST_CHUNK_SIZE", 1):
+            result = self._run_pipeline_offline("stationary_combustion_sparse.csv", "stationary_combustion")
+        assert result["validated_count"] == 3
+
     def test_sparse_rows_carry_forward(self):
         """Sparse CSV should not produce excessive validation failures due to carry-forward."""
         result = self._run_pipeline_offline("stationary_combustion_sparse.csv", "stationary_combustion")
@@ -508,17 +724,16 @@ class TestPipelineStageCounters:
         with (
             patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
             patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
-            patch("app.parsing.pipeline.insert_activities", return_value=[dummy_activity, dummy_activity]),
-            patch("app.parsing.pipeline.get_activities_for_upload", return_value=[]),
+            patch("app.parsing.pipeline.upsert_activities", return_value=[dummy_activity, dummy_activity]),
             patch("app.parsing.pipeline.insert_emissions", return_value=None),
-            patch("app.parsing.pipeline.mark_as_completed", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", return_value=None),
             patch("app.parsing.pipeline.mark_as_failed", return_value=None),
             patch("app.parsing.pipeline.mark_as_pending_review", return_value=None),
             patch("app.parsing.pipeline.save_upload_inference_audit", return_value=None),
             patch("app.parsing.pipeline.set_upload_activity_type", return_value=None),
             patch("app.parsing.pipeline.update_upload_fields", return_value=None),
-            patch("app.parsing.pipeline.log_parsing_event", return_value=None),
-            patch("app.parsing.pipeline.create_client", return_value=mock_sb),
+            patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=mock_sb),
         ):
             from app.parsing.pipeline import run_parsing_pipeline
             result = run_parsing_pipeline(upload)
@@ -547,17 +762,16 @@ class TestStrictMode:
         with (
             patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
             patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
-            patch("app.parsing.pipeline.insert_activities", return_value=[dummy_activity, dummy_activity]),
-            patch("app.parsing.pipeline.get_activities_for_upload", return_value=[]),
+            patch("app.parsing.pipeline.upsert_activities", return_value=[dummy_activity, dummy_activity]),
             patch("app.parsing.pipeline.insert_emissions", return_value=None),
-            patch("app.parsing.pipeline.mark_as_completed", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", return_value=None),
             patch("app.parsing.pipeline.mark_as_failed", return_value=None),
             patch("app.parsing.pipeline.mark_as_pending_review", return_value=None),
             patch("app.parsing.pipeline.save_upload_inference_audit", return_value=None),
             patch("app.parsing.pipeline.set_upload_activity_type", return_value=None),
             patch("app.parsing.pipeline.update_upload_fields", return_value=None),
-            patch("app.parsing.pipeline.log_parsing_event", return_value=None),
-            patch("app.parsing.pipeline.create_client", return_value=mock_sb),
+            patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=mock_sb),
         ):
             with pytest.raises(Exception) as exc_info:
                 run_parsing_pipeline(upload)
@@ -576,17 +790,16 @@ class TestStrictMode:
         with (
             patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
             patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
-            patch("app.parsing.pipeline.insert_activities", return_value=[dummy_activity, dummy_activity]),
-            patch("app.parsing.pipeline.get_activities_for_upload", return_value=[]),
+            patch("app.parsing.pipeline.upsert_activities", return_value=[dummy_activity, dummy_activity]),
             patch("app.parsing.pipeline.insert_emissions", return_value=None),
-            patch("app.parsing.pipeline.mark_as_completed", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", return_value=None),
             patch("app.parsing.pipeline.mark_as_failed", return_value=None),
             patch("app.parsing.pipeline.mark_as_pending_review", return_value=None),
             patch("app.parsing.pipeline.save_upload_inference_audit", return_value=None),
             patch("app.parsing.pipeline.set_upload_activity_type", return_value=None),
             patch("app.parsing.pipeline.update_upload_fields", return_value=None),
-            patch("app.parsing.pipeline.log_parsing_event", return_value=None),
-            patch("app.parsing.pipeline.create_client", return_value=mock_sb),
+            patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=mock_sb),
         ):
             result = run_parsing_pipeline(upload)
 
@@ -635,6 +848,80 @@ class TestFactorDiagnostics:
         assert len(attempts) <= 8
 
 
+_CATALOGUE_ROWS = [
+    {"id": "f-1", "activity_type": "fugitive_emissions", "unit": "kg", "region": "UK", "year": 2025,
+     "detail": "HFC-32", "name": None, "category": "Refrigerant", "factor_value": 675},
+    {"id": "f-2", "activity_type": "fugitive_emissions", "unit": "kg", "region": "UK", "year": 2025,
+     "detail": "HFC-134a", "name": None, "category": "Refrigerant", "factor_value": 1430},
+    {"id": "f-3", "activity_type": "stationary_combustion", "unit": "kWh", "region": "UK", "year": 2025,
+     "detail": "Natural gas", "name": "Gaseous fuels", "category": "Fuels", "factor_value": 0.18},
+    {"id": "f-4", "activity_type": "stationary_combustion", "unit": "litres", "region": "UK", "year": 2025,
+     "detail": "Diesel (average biofuel blend)", "name": "Liquid fuels", "category": "Fuels", "factor_value": None},
+]
+
+
+class TestFactorCatalogue:
+
+    def test_token_alias_selects_matching_row(self):
+        from app.parsing.emissions import FactorCatalogue
+        index = FactorCatalogue.from_rows(_CATALOGUE_ROWS).index(MagicMock())
+        factor, attempts = index.lookup("fugitive_emissions", "kg", "UK", 2025, "R134a")
+        assert factor["id"] == "f-2"
+        assert attempts == ["activity_type=fugitive_emissions unit=kg region=UK year=2025"]
+
+    def test_ilike_wildcards_match_like_postgrest(self):
+        from app.parsing.emissions import FactorCatalogue
+        index = FactorCatalogue.from_rows(_CATALOGUE_ROWS).index(MagicMock())
+        # '_' is a single-character wildcard in ilike, so natural_gas matches "Natural gas".
+        factor, _ = index.lookup("stationary_combustion", "kWh", None, None, "natural_gas")
+        assert factor["id"] == "f-3"
+        # Rows without a numeric factor are never selected.
+        factor, attempts = index.lookup("stationary_combustion", "litres", "UK", 2025, "diesel")
+        assert factor["id"] == "f-3"
+        assert len(attempts) == 5
+
+    def test_miss_reports_same_attempts_as_postgrest_path(self):
+        from app.parsing.emissions import FactorCatalogue, _fetch_emission_factor
+        index = FactorCatalogue.from_rows(_CATALOGUE_ROWS).index(MagicMock())
+        factor, attempts = index.lookup("purchased_electricity", "kwh", "MARS-GRID", 2024, None)
+        assert factor is None
+
+        _, postgrest_attempts = _fetch_emission_factor(
+            _mock_supabase_no_factor(), "purchased_electricity", "kwh", "MARS-GRID", 2024,
+        )
+        assert attempts == postgrest_attempts
+
+    def test_fetch_uses_catalogue_without_network(self):
+        from app.parsing import emissions
+        mock_sb = MagicMock()
+        with patch.object(emissions, "factor_catalogue", emissions.FactorCatalogue.from_rows(_CATALOGUE_ROWS)):
+            factor, _ = emissions._fetch_emission_factor(mock_sb, "fugitive_emissions", "kg", "UK", 2025, "HFC-32")
+        assert factor["id"] == "f-1"
+        mock_sb.table.assert_not_called()
+
+    def test_catalogue_reloads_when_version_changes(self):
+        from app.parsing.emissions import FactorCatalogue
+        mock_sb = MagicMock()
+        ordered = mock_sb.table.return_value.select.return_value.order.return_value
+        ordered.limit.return_value.execute.return_value = MagicMock(count=4, data=[{"id": "f-4", "created_at": "t1"}])
+        ordered.range.return_value.execute.return_value = MagicMock(data=_CATALOGUE_ROWS)
+
+        catalogue = FactorCatalogue(refresh_seconds=60, max_rows=100)
+        first = catalogue.index(mock_sb)
+        assert first is not None and len(first) == 4
+        assert catalogue.index(mock_sb) is first
+
+        # Same version after the refresh window: keep the loaded index.
+        catalogue._checked_at = None
+        assert catalogue.index(mock_sb) is first
+
+        ordered.limit.return_value.execute.return_value = MagicMock(count=3, data=[{"id": "f-3", "created_at": "t2"}])
+        ordered.range.return_value.execute.return_value = MagicMock(data=_CATALOGUE_ROWS[:3])
+        catalogue._checked_at = None
+        reloaded = catalogue.index(mock_sb)
+        assert reloaded is not first and len(reloaded) == 3
+
+
 # ---------------------------------------------------------------------------
 # 9. Schema integrity checks
 # ---------------------------------------------------------------------------
@@ -664,3 +951,1754 @@ class TestSchemaIntegrity:
         }
         for at in expected:
             assert at in SCHEMAS, f"Missing expected activity type: {at}"
+
+
+# ---------------------------------------------------------------------------
+# 10. Parsing event logging
+# ---------------------------------------------------------------------------
+
+class TestParsingEventLogging:
+
+    def test_logger_buffers_until_threshold_and_flush(self):
+        from app.db.logs import ParsingEventLogger
+        batches: List[List[Dict[str, Any]]] = []
+
+        def sink(events):
+            batches.append(events)
+            return len(events)
+
+        with ParsingEventLogger("upload-1", max_events=3, flush_interval_seconds=3600, sink=sink) as event_log:
+            for i in range(4):
+                event_log.log("ERROR", f"bad row {i}", row_number=i)
+            assert [len(b) for b in batches] == [3]
+
+        assert [len(b) for b in batches] == [3, 1]
+        assert batches[1][0]["row_number"] == 3
+        assert event_log.written == 4
+
+    def test_logger_flush_is_best_effort(self):
+        from app.db.logs import ParsingEventLogger
+
+        def sink(events):
+            raise RuntimeError("network down")
+
+        event_log = ParsingEventLogger("upload-1", sink=sink)
+        event_log.log("WARN", "something")
+        assert event_log.flush() == 0
+
+    def test_bulk_insert_learns_accepted_payload_shape(self):
+        from postgrest.exceptions import APIError
+        import app.db.logs as logs
+
+        attempts: List[Dict[str, Any]] = []
+        mock_sb = MagicMock()
+
+        def _insert(payload):
+            attempts.append(payload[0])
+            query = MagicMock()
+            if "raw_upload_id" in payload[0]:
+                query.execute.side_effect = APIError({"message": "column does not exist"})
+            return query
+
+        mock_sb.table.return_value.insert.side_effect = _insert
+        event = {"upload_id": "u", "severity": "ERROR", "message": "m", "row_number": 1, "created_at": "t"}
+
+        with patch.object(logs, "supabase", mock_sb), patch.object(logs, "_accepted_shape", None):
+            assert logs.insert_parsing_events([event, event]) == 2
+            assert len(attempts) == 3
+            assert logs.insert_parsing_events([event]) == 1
+            # The second batch goes straight to the shape that worked.
+            assert len(attempts) == 4
+            assert attempts[-1]["upload_id"] == "u"
+
+
+# ---------------------------------------------------------------------------
+# 11. Shared Supabase client
+# ---------------------------------------------------------------------------
+
+class TestSupabaseClient:
+
+    def test_client_is_shared_across_modules(self):
+        from app.db import client
+        from app.api import metrics
+        assert client.get_supabase_client() is client.get_supabase_client()
+        assert metrics.supabase is client.supabase
+
+    def test_pool_limits_scale_with_worker_concurrency(self):
+        from app.db import client
+        with (
+            patch.object(client.settings, "INGEST_WORKER_CONCURRENCY", 6),
+            patch.object(client.settings, "INGEST_FAST_LANE_WORKERS", 0),
+            patch.object(client.settings, "SUPABASE_HTTP_CONNECTIONS_PER_WORKER", 4),
+            patch.object(client.settings, "SUPABASE_HTTP_EXTRA_CONNECTIONS", 10),
+        ):
+            limits = client._http_limits()
+        assert limits.max_keepalive_connections == 24
+        assert limits.max_connections == 34
+
+    def test_pooled_client_needs_only_supabase_credentials(self):
+        import os
+        import subprocess
+        import sys
+
+        # Scripts such as the factor import run without the API's other settings.
+        script = (
+            "import sys\n"
+            "from app.db.pooled import create_pooled_client\n"
+            "client = create_pooled_client('http://localhost:54321', 'key')\n"
+            "assert client.postgrest.session.base_url.host == 'localhost'\n"
+            "assert 'app.core.config' not in sys.modules\n"
+        )
+        env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": str(pathlib.Path(__file__).resolve().parents[1])}
+        result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+# ---------------------------------------------------------------------------
+# 12. Async pipeline
+# ---------------------------------------------------------------------------
+
+class TestAsyncPipeline:
+
+    def _async_patches(self, file_path: str, mock_sb: MagicMock, activities: List[Dict[str, Any]]):
+        return [
+            patch("app.parsing.pipeline.resolve_upload_file_path_async", AsyncMock(return_value=(file_path, None))),
+            patch("app.parsing.pipeline.get_upload_mapping_async", AsyncMock(return_value={})),
+            patch("app.parsing.pipeline.upsert_activities_async", AsyncMock(return_value=activities)),
+            patch("app.parsing.pipeline.insert_emissions_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.complete_upload_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.mark_as_failed_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.mark_as_pending_review_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.save_upload_inference_audit_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.set_upload_activity_type_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.update_upload_fields_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.insert_parsing_events_async", AsyncMock(return_value=0)),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=mock_sb),
+        ]
+
+    def _run_async(self, uploads: List[Dict[str, Any]], file_path: str) -> List[Any]:
+        from app.parsing.pipeline import run_parsing_pipeline_async
+
+        dummy_activity = {"id": "act-001", "upload_id": "test-upload-001"}
+        with ExitStack() as stack:
+            for p in self._async_patches(file_path, _mock_supabase_with_factor(0.233), [dummy_activity]):
+                stack.enter_context(p)
+
+            async def _main():
+                return await asyncio.gather(
+                    *(run_parsing_pipeline_async(upload) for upload in uploads),
+                    return_exceptions=True,
+                )
+
+            return asyncio.run(_main())
+
+    def test_async_pipeline_matches_sync(self):
+        file_path = str(DATA_DIR / "stationary_combustion_large.csv")
+        sync_result = TestPipelineStageCounters()._run_pipeline_offline(
+            "stationary_combustion_large.csv", "stationary_combustion"
+        )
+
+        uploads = [
+            {**_make_upload(file_path, "stationary_combustion"), "id": f"upload-{i}"}
+            for i in range(3)
+        ]
+        results = self._run_async(uploads, file_path)
+
+        for result in results:
+            assert not isinstance(result, BaseException)
+            assert result["validated_count"] == sync_result["validated_count"]
+            assert result["error_count"] == sync_result["error_count"]
+            assert result["stage_counters"] == sync_result["stage_counters"]
+
+    def test_async_pipeline_marks_failed_upload(self):
+        from app.parsing.pipeline import run_parsing_pipeline_async
+
+        upload = _make_upload("missing.csv", "stationary_combustion")
+        with ExitStack() as stack:
+            for p in self._async_patches("missing.csv", MagicMock(), []):
+                stack.enter_context(p)
+            stack.enter_context(patch(
+                "app.parsing.pipeline.resolve_upload_file_path_async",
+                AsyncMock(side_effect=FileNotFoundError("no file")),
+            ))
+            import app.parsing.pipeline as pipeline
+
+            with pytest.raises(FileNotFoundError):
+                asyncio.run(run_parsing_pipeline_async(upload))
+
+            pipeline.mark_as_failed_async.assert_awaited_once_with(upload["id"], "no file")
+            pipeline.insert_parsing_events_async.assert_awaited()
+
+    def test_async_logger_flushes_in_background(self):
+        from app.db.logs import AsyncParsingEventLogger
+
+        batches: List[int] = []
+
+        async def sink(events):
+            await asyncio.sleep(0)
+            batches.append(len(events))
+            return len(events)
+
+        async def _main():
+            event_log = AsyncParsingEventLogger("upload-1", max_events=2, flush_interval_seconds=3600, sink=sink)
+            event_log.log("ERROR", "a", row_number=1)
+            event_log.log("ERROR", "b", row_number=2)
+            event_log.log("WARN", "c")
+            # The first batch was handed to a task; log() did not wait for it.
+            assert batches == []
+            await event_log.aflush()
+            return event_log.written
+
+        assert asyncio.run(_main()) == 3
+        assert sorted(batches) == [1, 2]
+
+
+# ---------------------------------------------------------------------------
+# 13. Sharded row processing
+# ---------------------------------------------------------------------------
+
+class TestShardedProcessing:
+
+    def _sparse_rows(self, count: int) -> List[Dict[str, Any]]:
+        fuels = ["natural_gas", "coal", "lpg"]
+        rows: List[Dict[str, Any]] = []
+        for i in range(count):
+            if i % 11 == 5:
+                rows.append({"date": "", "facility_id": "", "fuel_type": "", "consumption": "", "unit": ""})
+            elif i % 9 == 0:
+                rows.append({
+                    "date": f"2024-01-{i % 28 + 1:02d}",
+                    "facility_id": f"FAC-{i}",
+                    "fuel_type": fuels[i % 3] if i % 4 else "jet_fuel",
+                    "consumption": str(100 + i),
+                    "unit": "m3",
+                })
+            else:
+                rows.append({"date": "", "facility_id": "", "fuel_type": "", "consumption": str(i), "unit": ""})
+        return rows
+
+    def test_sharded_chunk_matches_serial_run(self):
+        from app.parsing import pipeline
+
+        upload = {**_make_upload("unused.csv", "stationary_combustion"), "company_location_id": None}
+        rows = self._sparse_rows(90)
+        incoming = {"facility_id": "FAC-PREV", "fuel_type": "coal", "unit": "m3", "date": "2023-12-31"}
+
+        serial_state = dict(incoming)
+        serial = pipeline._process_rows(rows, 100, upload, "stationary_combustion", {}, serial_state)
+
+        sharded_state = dict(incoming)
+        try:
+            with (
+                patch.object(pipeline.settings, "INGEST_PROCESS_POOL_SIZE", 3),
+                patch.object(pipeline.settings, "INGEST_SHARD_MIN_ROWS", 10),
+            ):
+                sharded = pipeline._process_chunk(rows, 100, upload, "stationary_combustion", {}, sharded_state)
+        finally:
+            pipeline.shutdown_process_pool()
+
+        assert [r["row_index"] for r in sharded[0]] == [r["row_index"] for r in serial[0]]
+        assert sharded[0] == serial[0]
+        assert sharded[1] == serial[1]
+        assert sharded[2] == serial[2]
+        assert sharded_state == serial_state
+
+    def test_shard_reports_rows_that_need_incoming_carry_state(self):
+        from app.parsing import pipeline
+
+        upload = {**_make_upload("unused.csv", "stationary_combustion"), "company_location_id": None}
+        rows = self._sparse_rows(30)[1:]
+        shard = pipeline._process_shard(rows, 1, upload, "stationary_combustion", {})
+
+        # Rows 1-8 lean on carried values; row 9 supplies every carried field itself.
+        assert shard.boundary_rows == 8
+        assert all(r["row_index"] >= 9 for r in shard.validated_rows + shard.errors)
+
+
+# ---------------------------------------------------------------------------
+# 14. Upload claiming
+# ---------------------------------------------------------------------------
+
+class TestUploadClaiming:
+
+    def test_claim_uses_single_rpc_call(self):
+        import app.db.uploads as uploads
+
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.return_value = MagicMock(data=[{"id": "u1"}, {"id": "u2"}])
+
+        with patch.object(uploads, "supabase", mock_sb), patch.object(uploads, "_claim_rpc_available", None):
+            assert uploads.claim_pending_uploads(2) == [{"id": "u1"}, {"id": "u2"}]
+            assert uploads._claim_rpc_available is True
+
+        mock_sb.rpc.assert_called_once_with(
+            "claim_pending_uploads",
+            {"batch_size": 2, "stale_after_seconds": uploads.STALE_PROCESSING_SECONDS},
+        )
+        mock_sb.table.assert_not_called()
+
+    def test_missing_rpc_falls_back_to_compare_and_swap_once(self):
+        from postgrest.exceptions import APIError
+        import app.db.uploads as uploads
+
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.side_effect = APIError({"message": "Could not find the function", "code": "PGRST202"})
+
+        with (
+            patch.object(uploads, "supabase", mock_sb),
+            patch.object(uploads, "_claim_rpc_available", None),
+            patch.object(uploads, "_claim_with_compare_and_swap", side_effect=[{"id": "u1"}, None]) as cas,
+        ):
+            assert uploads.get_pending_upload() == {"id": "u1"}
+            assert uploads.get_pending_upload() is None
+            assert uploads._claim_rpc_available is False
+
+        mock_sb.rpc.assert_called_once()
+        assert cas.call_count == 2
+
+    def test_rpc_errors_raise_once_rpc_is_known_to_work(self):
+        from postgrest.exceptions import APIError
+        import app.db.uploads as uploads
+
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.side_effect = APIError({"message": "deadlock detected", "code": "40P01"})
+
+        with patch.object(uploads, "supabase", mock_sb), patch.object(uploads, "_claim_rpc_available", True):
+            with pytest.raises(APIError):
+                uploads.get_pending_upload()
+
+
+# ---------------------------------------------------------------------------
+# 15. Worker wake-up
+# ---------------------------------------------------------------------------
+
+class TestWorkerWakeUp:
+
+    def test_notification_before_wait_is_not_lost(self):
+        from app.workers.notifications import UploadNotifier
+
+        async def _main():
+            notifier = UploadNotifier()
+            seen = notifier.sequence
+            notifier.notify()
+            started = time.perf_counter()
+            assert await notifier.wait(seen, timeout=5) == seen + 1
+            return time.perf_counter() - started
+
+        assert asyncio.run(_main()) < 0.5
+
+    def test_idle_worker_wakes_on_notification(self):
+        import app.workers.polling as polling
+        from app.workers.notifications import UploadNotifier
+
+        claims: List[Optional[Dict[str, Any]]] = [None, {"id": "u1"}]
+
+        async def _claim(*args):
+            return claims.pop(0) if claims else None
+
+        async def _main():
+            notifier = UploadNotifier()
+            notifier.connected = True
+            processed = asyncio.Event()
+
+            async def _run(upload):
+                processed.set()
+                return {}
+
+            with (
+                patch.object(polling, "get_pending_upload_async", side_effect=_claim),
+                patch.object(polling, "run_parsing_pipeline_async", side_effect=_run),
+                patch.object(polling.settings, "INGEST_SAFETY_POLL_SECONDS", 60.0),
+            ):
+                worker = asyncio.create_task(polling._worker_loop(1, 60.0, notifier))
+                await asyncio.sleep(0.05)
+                assert not processed.is_set()
+
+                # Stand-in for a realtime insert event.
+                notifier.notify()
+                await asyncio.wait_for(processed.wait(), timeout=1)
+                worker.cancel()
+
+        asyncio.run(_main())
+
+    def test_subscription_filters_on_detected_status_column(self):
+        import app.workers.notifications as notifications
+
+        channel = MagicMock()
+        channel.subscribe = AsyncMock()
+        client = MagicMock()
+        client.channel.return_value = channel
+
+        with (
+            patch.object(notifications, "_detect_status_column_async", AsyncMock(return_value="status")),
+            patch.object(notifications, "get_async_supabase_client", AsyncMock(return_value=client)),
+        ):
+            assert asyncio.run(notifications.subscribe_to_upload_changes(notifications.UploadNotifier())) is channel
+
+        filters = {call.kwargs["filter"] for call in channel.on_postgres_changes.call_args_list}
+        assert filters == {"status=eq.pending"}
+
+
+# ---------------------------------------------------------------------------
+# 16. Worker autoscaling
+# ---------------------------------------------------------------------------
+
+class TestWorkerAutoscaling:
+
+    def test_pool_grows_for_burst_and_shrinks_gradually(self):
+        from app.workers.polling import WorkerPoolController
+
+        async def _main():
+            controller = WorkerPoolController(min_workers=1, max_workers=8, initial_workers=2, target_drain_seconds=60)
+            controller.record_latency(30.0)
+            # 20 queued uploads at ~30s each need 10 workers to drain in a minute; capped at 8.
+            assert controller.resize(20) == 8
+            controller.busy = 3
+            assert controller.resize(0) == 7
+            assert controller.resize(0) == 6
+            controller.busy = 0
+            for _ in range(10):
+                controller.resize(0)
+            return controller.active
+
+        assert asyncio.run(_main()) == 1
+
+    def test_parked_worker_resumes_when_pool_grows(self):
+        from app.workers.polling import WorkerPoolController
+
+        async def _main():
+            controller = WorkerPoolController(min_workers=1, max_workers=3, initial_workers=1, target_drain_seconds=60)
+            parked = asyncio.create_task(controller.wait_until_active(3))
+            await asyncio.sleep(0.01)
+            assert not parked.done()
+            controller.resize(5)
+            await asyncio.wait_for(parked, timeout=1)
+
+        asyncio.run(_main())
+
+    def test_idle_backoff_is_exponential_and_capped(self):
+        import app.workers.polling as polling
+
+        with patch.object(polling.settings, "INGEST_IDLE_BACKOFF_MAX_SECONDS", 30.0):
+            waits = [polling._idle_backoff_seconds(2.0, n) for n in range(6)]
+        assert waits == [2.0, 4.0, 8.0, 16.0, 30.0, 30.0]
+
+
+# ---------------------------------------------------------------------------
+# 17. Fair scheduling
+# ---------------------------------------------------------------------------
+
+class TestFairScheduling:
+
+    @staticmethod
+    def _upload(upload_id: str, org: str, minute: int, priority: int = 0) -> Dict[str, Any]:
+        return {
+            "id": upload_id,
+            "organization_id": org,
+            "created_at": f"2026-01-01T00:{minute:02d}:00+00:00",
+            "priority": priority,
+        }
+
+    def test_small_org_is_not_starved_by_bulk_drop(self):
+        from app.db.uploads import _fair_order
+
+        bulk = [self._upload(f"big-{i}", "big", i) for i in range(10)]
+        small = [self._upload("small-0", "small", 30)]
+        order = [row["id"] for row in _fair_order(bulk + small, [])]
+        assert order[:3] == ["big-0", "small-0", "big-1"]
+
+    def test_in_flight_uploads_push_org_back_and_priority_wins(self):
+        from app.db.uploads import _fair_order
+
+        pending = [
+            self._upload("a-0", "a", 0),
+            self._upload("b-0", "b", 5),
+            self._upload("c-0", "c", 9, priority=1),
+        ]
+        order = [row["id"] for row in _fair_order(pending, [{"organization_id": "a"}])]
+        assert order == ["c-0", "b-0", "a-0"]
+
+    def test_compare_and_swap_claims_in_fair_order(self):
+        import app.db.uploads as uploads
+
+        pending = [self._upload("big-0", "big", 0), self._upload("small-0", "small", 1)]
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(data=pending)
+        mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(data=[{"organization_id": "big"}])
+
+        with patch.object(uploads, "supabase", mock_sb), patch.object(uploads, "_claim_upload", return_value=True) as claim:
+            assert uploads._claim_pending_upload("parsing_status")["id"] == "small-0"
+        claim.assert_called_once()
+
+    def test_queue_wait_stats_are_per_organization(self):
+        from datetime import datetime, timezone
+        from app.workers.queue_waits import QueueWaitStats
+
+        stats = QueueWaitStats()
+        now = datetime(2026, 1, 1, 0, 10, tzinfo=timezone.utc)
+        assert stats.record(self._upload("a-0", "a", 0), now=now) == 600.0
+        stats.record(self._upload("b-0", "b", 9), now=now)
+        stats.record({"id": "x", "organization_id": "b"}, now=now)
+
+        snapshot = stats.snapshot()
+        assert snapshot["a"]["max_wait_seconds"] == 600.0
+        assert snapshot["b"] == {"claimed": 1, "mean_wait_seconds": 60.0, "p95_wait_seconds": 60.0, "max_wait_seconds": 60.0}
+
+
+# ---------------------------------------------------------------------------
+# 18. Upload lanes
+# ---------------------------------------------------------------------------
+
+class TestUploadLanes:
+
+    def test_classifies_by_size_and_sniffed_row_count(self, tmp_path):
+        from app.workers.lanes import BULK_LANE, FAST_LANE, classify_upload_size
+
+        small = tmp_path / "small.csv"
+        small.write_text("a,b\n1,2\n3,4\n")
+        tall = tmp_path / "tall.csv"
+        tall.write_text("a\n" + "1\n" * 200)
+
+        assert classify_upload_size({"file_path": str(small)}, small.stat().st_size).lane == FAST_LANE
+        with patch("app.workers.lanes.settings.INGEST_FAST_LANE_MAX_ROWS", 100):
+            sized = classify_upload_size({"file_path": str(tall)}, tall.stat().st_size)
+        assert sized.lane == BULK_LANE and sized.estimated_rows == 201
+        assert classify_upload_size({"storage_path": "org/big.xlsx"}, None).lane == BULK_LANE
+        assert classify_upload_size({"storage_path": "org/f.xls"}, 100).memory_bytes == 1000
+
+    def test_bulk_lane_limits_concurrency_and_memory(self):
+        from app.workers.lanes import BulkLane
+
+        async def _main():
+            lane = BulkLane(concurrency=2, memory_budget_bytes=100)
+            async with lane.slot(80):
+                # Over budget while another upload runs, so it waits.
+                second = lane.slot(50)
+                waiting = asyncio.create_task(second.__aenter__())
+                await asyncio.sleep(0.01)
+                assert not waiting.done()
+            await asyncio.wait_for(waiting, timeout=1)
+            assert lane.running == 1 and lane.memory_in_use == 50
+            await second.__aexit__(None, None, None)
+
+            # Alone, an upload bigger than the whole budget still runs.
+            solo = BulkLane(concurrency=1, memory_budget_bytes=10)
+            async with solo.slot(500):
+                assert solo.running == 1
+
+        asyncio.run(_main())
+
+    def test_fast_lane_claims_skip_large_and_unsized_uploads(self):
+        import app.db.uploads as uploads
+
+        pending = [
+            {"id": "big", "organization_id": "a", "created_at": "2026-01-01T00:00:00+00:00", "file_size_bytes": 10_000},
+            {"id": "unknown", "organization_id": "b", "created_at": "2026-01-01T00:01:00+00:00"},
+            {"id": "small", "organization_id": "c", "created_at": "2026-01-01T00:02:00+00:00", "file_size_bytes": 10},
+        ]
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(data=pending)
+        mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+
+        with patch.object(uploads, "supabase", mock_sb), patch.object(uploads, "_claim_upload", return_value=True):
+            assert uploads._claim_pending_upload("parsing_status", max_file_size_bytes=100)["id"] == "small"
+        assert uploads._claim_rpc_params(1, 100)["max_file_size_bytes"] == 100
+
+    def test_rpc_without_size_filter_only_moves_fast_lane_to_compare_and_swap(self):
+        from postgrest.exceptions import APIError
+        import app.db.uploads as uploads
+
+        def _rpc(name, params):
+            call = MagicMock()
+            if "max_file_size_bytes" in params or "worker_id" in params:
+                call.execute.side_effect = APIError({"message": "Could not find the function", "code": "PGRST202"})
+            else:
+                call.execute.return_value = MagicMock(data=[{"id": "bulk"}])
+            return call
+
+        mock_sb = MagicMock()
+        mock_sb.rpc.side_effect = _rpc
+
+        with (
+            patch.object(uploads, "supabase", mock_sb),
+            patch.object(uploads, "_claim_rpc_available", None),
+            patch.object(uploads, "_claim_rpc_leases", None),
+            patch.object(uploads, "_claim_rpc_size_filter", None),
+            patch.object(uploads, "_claim_with_compare_and_swap", side_effect=[{"id": "small"}, None]) as cas,
+        ):
+            assert uploads.get_pending_upload(100, "fast-1") == {"id": "small"}
+            assert uploads._claim_rpc_size_filter is False
+            assert uploads._claim_rpc_available is None
+            assert uploads._claim_rpc_leases is None
+
+            assert uploads.get_pending_upload(worker_id="bulk-1") == {"id": "bulk"}
+            assert uploads._claim_rpc_available is True
+
+            # Once learned, size-limited claims skip the RPC.
+            rpc_calls = mock_sb.rpc.call_count
+            assert uploads.get_pending_upload(100, "fast-1") is None
+            assert mock_sb.rpc.call_count == rpc_calls
+
+        cas.assert_called_with(100, "fast-1")
+
+    def test_bulk_upload_waits_for_lane_while_small_ones_run(self):
+        import app.workers.polling as polling
+        from app.workers.lanes import BulkLane
+
+        async def _main():
+            lane = BulkLane(concurrency=1, memory_budget_bytes=0)
+            ran: List[str] = []
+
+            async def _run(upload):
+                ran.append(upload["id"])
+                return {}
+
+            with (
+                patch.object(polling, "run_parsing_pipeline_async", side_effect=_run),
+                patch.object(polling.settings, "INGEST_FAST_LANE_MAX_BYTES", 100),
+            ):
+                async with lane.slot(0):
+                    bulk = asyncio.create_task(polling._run_upload(1, {"id": "big", "file_size_bytes": 1000}, lane))
+                    await polling._run_upload(2, {"id": "small", "file_size_bytes": 10}, lane)
+                    await asyncio.sleep(0.01)
+                    assert ran == ["small"]
+                await asyncio.wait_for(bulk, timeout=1)
+            assert ran == ["small", "big"]
+
+        asyncio.run(_main())
+
+
+# ---------------------------------------------------------------------------
+# 19. Upload leases
+# ---------------------------------------------------------------------------
+
+class TestUploadLeases:
+
+    def test_only_expired_leases_are_reclaimed(self):
+        from datetime import datetime, timedelta, timezone
+        from app.db.uploads import _first_stale
+
+        now = datetime.now(timezone.utc)
+        long_ago = (now - timedelta(hours=1)).isoformat()
+        held = {"id": "held", "updated_at": long_ago, "lease_expires_at": (now + timedelta(seconds=20)).isoformat()}
+        expired = {"id": "expired", "updated_at": now.isoformat(), "lease_expires_at": (now - timedelta(seconds=1)).isoformat()}
+        unleased = {"id": "unleased", "updated_at": long_ago, "lease_expires_at": None}
+
+        assert _first_stale([held], 300) is None
+        assert _first_stale([held, expired], 300)["id"] == "expired"
+        assert _first_stale([held, unleased], 300)["id"] == "unleased"
+
+    def test_leased_claim_falls_back_when_rpc_predates_leases(self):
+        from postgrest.exceptions import APIError
+        import app.db.uploads as uploads
+
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.side_effect = [
+            APIError({"message": "Could not find the function", "code": "PGRST202"}),
+            MagicMock(data=[{"id": "u1"}]),
+        ]
+
+        with (
+            patch.object(uploads, "supabase", mock_sb),
+            patch.object(uploads, "_claim_rpc_available", True),
+            patch.object(uploads, "_claim_rpc_leases", None),
+        ):
+            assert uploads.get_pending_upload(worker_id="host:1:1") == {"id": "u1"}
+            assert uploads._claim_rpc_leases is False
+
+        leased_params, unleased_params = (c.args[1] for c in mock_sb.rpc.call_args_list)
+        assert leased_params["worker_id"] == "host:1:1"
+        assert leased_params["lease_seconds"] == uploads.settings.INGEST_LEASE_SECONDS
+        assert "worker_id" not in unleased_params
+
+    def test_compare_and_swap_claim_takes_lease(self):
+        import app.db.uploads as uploads
+
+        mock_sb = MagicMock()
+        update = mock_sb.table.return_value.update
+        update.return_value.eq.return_value.eq.return_value.execute.return_value = MagicMock(count=1)
+        upload = {"id": "u1", "lease_expires_at": None}
+
+        with patch.object(uploads, "supabase", mock_sb):
+            assert uploads._claim_upload(upload, "parsing_status", "pending", "host:1:1")
+
+        payload = update.call_args.args[0]
+        assert payload["worker_id"] == "host:1:1" and payload["lease_expires_at"]
+        assert upload["worker_id"] == "host:1:1"
+
+    def test_heartbeat_renews_lease_and_stops_run_when_lost(self):
+        import app.workers.polling as polling
+
+        async def _slow_run(upload):
+            await asyncio.sleep(0.5)
+            return {"status": "completed"}
+
+        async def _main(renewed: bool):
+            renew = AsyncMock(return_value=renewed)
+            with (
+                patch.object(polling, "run_parsing_pipeline_async", side_effect=_slow_run),
+                patch.object(polling, "renew_upload_lease_async", renew),
+                patch.object(polling, "upload_finished_under_lease_async", AsyncMock(return_value=False)),
+                patch.object(polling.settings, "INGEST_LEASE_SECONDS", 1),
+            ):
+                upload = {"id": "u1", "worker_id": "me"}
+                try:
+                    return await polling._run_leased_upload(1, upload, None, "me")
+                finally:
+                    renew.assert_awaited_with("u1", "me")
+
+        assert asyncio.run(_main(True)) == {"status": "completed"}
+        with pytest.raises(polling.LeaseLostError):
+            asyncio.run(_main(False))
+
+    def test_heartbeat_leaves_run_alone_once_upload_is_completed(self):
+        import app.workers.polling as polling
+
+        completed = False
+
+        async def _run(upload):
+            nonlocal completed
+            # complete_upload has moved the row out of processing; the last
+            # events are still being flushed when the heartbeat ticks.
+            completed = True
+            await asyncio.sleep(0.5)
+            return {"status": "completed"}
+
+        async def _finished(upload_id, lease_id):
+            return completed
+
+        async def _main():
+            with (
+                patch.object(polling, "run_parsing_pipeline_async", side_effect=_run),
+                patch.object(polling, "renew_upload_lease_async", AsyncMock(return_value=False)),
+                patch.object(polling, "upload_finished_under_lease_async", side_effect=_finished) as finished,
+                patch.object(polling.settings, "INGEST_LEASE_SECONDS", 1),
+            ):
+                result = await polling._run_leased_upload(1, {"id": "u1", "worker_id": "me"}, None, "me")
+                finished.assert_awaited_with("u1", "me")
+                return result
+
+        assert asyncio.run(_main()) == {"status": "completed"}
+
+
+# ---------------------------------------------------------------------------
+# 20. Chunk checkpoints
+# ---------------------------------------------------------------------------
+
+class TestChunkCheckpoints:
+
+    def _run(self, upload: Dict[str, Any], inserted_rows: List[Dict[str, Any]], saved: List[Dict[str, Any]]) -> Dict[str, Any]:
+        file_path = upload["file_path"]
+
+        def _upsert_activities(rows):
+            inserted_rows.extend(rows)
+            return {row["row_index"]: {"id": f"act-{row['row_index']}"} for row in rows}
+
+        def _update_fields(upload_id, fields):
+            if fields.get("parsing_checkpoint"):
+                saved.append(fields["parsing_checkpoint"])
+
+        with (
+            patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
+            patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
+            patch("app.parsing.pipeline.upsert_activities", side_effect=_upsert_activities),
+            patch("app.parsing.pipeline.insert_emissions", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", return_value=None),
+            patch("app.parsing.pipeline.mark_as_failed", return_value=None),
+            patch("app.parsing.pipeline.update_upload_fields", side_effect=_update_fields),
+            patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=_mock_supabase_with_factor(0.233)),
+        ):
+            from app.parsing.pipeline import run_parsing_pipeline
+            return run_parsing_pipeline(upload)
+
+    def test_checkpoint_saved_after_each_persisted_chunk(self):
+        from app.core.config import settings
+
+        upload = _make_upload(str(DATA_DIR / "stationary_combustion_large.csv"), "stationary_combustion")
+        saved: List[Dict[str, Any]] = []
+        with patch.object(settings, "INGEST_CHUNK_SIZE", 100):
+            self._run(upload, [], saved)
+
+        assert [c["next_row_index"] for c in saved] == list(range(100, 1300, 100))
+        assert all(c["activity_type"] == "stationary_combustion" for c in saved)
+
+    def test_resume_skips_finished_chunks_and_matches_full_run(self):
+        from app.core.config import settings
+
+        upload = _make_upload(str(DATA_DIR / "stationary_combustion_large.csv"), "stationary_combustion")
+        full_rows: List[Dict[str, Any]] = []
+        saved: List[Dict[str, Any]] = []
+        with patch.object(settings, "INGEST_CHUNK_SIZE", 100):
+            full = self._run(upload, full_rows, saved)
+
+            # A crash after the ninth chunk: the retry only does the last three.
+            checkpoint = saved[8]
+            resumed_rows: List[Dict[str, Any]] = []
+            resumed = self._run({**upload, "parsing_checkpoint": checkpoint}, resumed_rows, [])
+
+        assert checkpoint["next_row_index"] == 900
+        assert len(resumed_rows) == len(full_rows) - checkpoint["activities_inserted"]
+        assert resumed_rows == full_rows[checkpoint["activities_inserted"]:]
+        assert resumed["validated_count"] == full["validated_count"]
+        assert resumed["stage_counters"] == full["stage_counters"]
+
+    def test_checkpoint_for_another_file_is_ignored(self):
+        from app.parsing.pipeline import _load_checkpoint
+
+        checkpoint = {"version": 1, "storage_path": "org/a.csv", "next_row_index": 500}
+        assert _load_checkpoint({"storage_path": "org/a.csv", "parsing_checkpoint": checkpoint}) == checkpoint
+        assert _load_checkpoint({"storage_path": "org/b.csv", "parsing_checkpoint": checkpoint}) is None
+        assert _load_checkpoint({"storage_path": "org/a.csv", "parsing_checkpoint": {**checkpoint, "version": 0}}) is None
+
+
+# ---------------------------------------------------------------------------
+# 21. Activity upserts
+# ---------------------------------------------------------------------------
+
+class TestActivityUpserts:
+
+    @staticmethod
+    def _rows(count: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "upload_id": "u1",
+                "organization_id": "11111111-1111-1111-1111-111111111111",
+                "activity_type": "stationary_combustion",
+                "row_index": i,
+                "unit": "kwh",
+            }
+            for i in range(count)
+        ]
+
+    def test_chunks_are_bounded_by_bytes_and_rows(self):
+        import json
+        from app.db.bulk import chunk_rows
+
+        rows = [{"i": i, "pad": "x" * 100} for i in range(50)]
+        chunks = chunk_rows(rows, max_bytes=1000, max_rows=1000)
+        assert sum(len(chunk) for chunk in chunks) == 50
+        assert all(len(json.dumps(chunk, separators=(",", ":"))) <= 1000 for chunk in chunks)
+        assert [len(chunk) for chunk in chunk_rows(rows, max_bytes=10**6, max_rows=20)] == [20, 20, 10]
+        assert chunk_rows([{"pad": "x" * 5000}], max_bytes=1000, max_rows=10) == [[{"pad": "x" * 5000}]]
+
+    def test_upsert_returns_activities_keyed_by_row_index(self):
+        import app.db.activities as activities
+        from app.core.config import settings
+
+        def _execute_for(chunk):
+            return MagicMock(data=[{"id": f"act-{row['row_index']}", "row_index": row["row_index"]} for row in reversed(chunk)])
+
+        mock_sb = MagicMock()
+        table = mock_sb.table.return_value
+        table.upsert.side_effect = lambda chunk, on_conflict: MagicMock(execute=lambda: _execute_for(chunk))
+
+        with (
+            patch.object(activities, "supabase", mock_sb),
+            patch.object(activities, "_activity_upsert_available", None),
+            patch.object(settings, "SUPABASE_BULK_MAX_ROWS", 2),
+        ):
+            keyed = activities.upsert_activities(self._rows(5))
+
+        assert {index: activity["id"] for index, activity in keyed.items()} == {i: f"act-{i}" for i in range(5)}
+        assert table.upsert.call_count == 3
+        assert all(c.kwargs["on_conflict"] == "source_upload_id,row_index" for c in table.upsert.call_args_list)
+
+    def test_missing_row_index_key_falls_back_to_positional_insert(self):
+        from postgrest.exceptions import APIError
+        import app.db.activities as activities
+
+        mock_sb = MagicMock()
+        table = mock_sb.table.return_value
+        table.upsert.return_value.execute.side_effect = APIError({"message": "Could not find the 'row_index' column", "code": "PGRST204"})
+        table.insert.return_value.execute.return_value = MagicMock(data=[{"id": "a"}, {"id": "b"}])
+
+        with patch.object(activities, "supabase", mock_sb), patch.object(activities, "_activity_upsert_available", None):
+            keyed = activities.upsert_activities(self._rows(2))
+            assert activities._activity_upsert_available is False
+
+        assert keyed == {0: {"id": "a"}, 1: {"id": "b"}}
+        assert all("row_index" not in row for row in table.insert.call_args.args[0])
+
+    def test_emissions_match_activities_by_row_index(self):
+        from app.parsing.emissions import calculate_emissions_for_batch
+
+        rows = [
+            {"activity_type": "purchased_electricity", "consumption": 100.0, "unit": "kwh", "row_index": 7},
+            {"activity_type": "purchased_electricity", "consumption": 200.0, "unit": "kwh", "row_index": 3},
+        ]
+        result = calculate_emissions_for_batch(
+            _mock_supabase_with_factor(0.5),
+            rows,
+            {3: {"id": "act-3"}},
+        )
+        assert [row["activity_id"] for row in result["rows"]] == ["act-3"]
+        assert result["skipped_rows"][0]["row_index"] == 7
+
+
+# ---------------------------------------------------------------------------
+# 22. Emissions bulk writes
+# ---------------------------------------------------------------------------
+
+class TestEmissionsBulkWrite:
+
+    @staticmethod
+    def _rows(count: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "activity_id": f"act-{i}",
+                "emission_factor_id": "f1",
+                "co2e": float(i),
+                "calculated_at": "2026-01-01T00:00:00+00:00",
+                "factor_match": "exact",
+            }
+            for i in range(count)
+        ]
+
+    def test_upserts_chunks_on_activity_id_and_reports_rate(self):
+        import app.db.emissions as emissions
+        from app.core.config import settings
+
+        mock_sb = MagicMock()
+        table = mock_sb.table.return_value
+        rows = self._rows(5) + [dict(self._rows(1)[0], co2e=99.0)]
+
+        with (
+            patch.object(emissions, "supabase", mock_sb),
+            patch.object(emissions, "_emission_full_columns", None),
+            patch.object(emissions, "_emission_upsert_available", None),
+            patch.object(settings, "SUPABASE_BULK_MAX_ROWS", 2),
+        ):
+            stats = emissions.insert_emissions(rows)
+            assert emissions._emission_upsert_available is True
+
+        sent = [row for c in table.upsert.call_args_list for row in c.args[0]]
+        assert stats["rows"] == 5 and stats["chunks"] == 3
+        assert stats["rows_per_second"] > 0
+        assert sorted(row["activity_id"] for row in sent) == [f"act-{i}" for i in range(5)]
+        assert next(row for row in sent if row["activity_id"] == "act-0")["co2e"] == 99.0
+        assert all(c.kwargs["on_conflict"] == "activity_id" for c in table.upsert.call_args_list)
+        table.insert.assert_not_called()
+
+    def test_learns_core_columns_and_missing_key_once(self):
+        from postgrest.exceptions import APIError
+        import app.db.emissions as emissions
+
+        mock_sb = MagicMock()
+        table = mock_sb.table.return_value
+        table.upsert.return_value.execute.side_effect = [
+            APIError({"message": "Could not find the 'factor_match' column", "code": "PGRST204"}),
+            APIError({"message": "no unique or exclusion constraint matching the ON CONFLICT specification", "code": "42P10"}),
+        ]
+
+        with (
+            patch.object(emissions, "supabase", mock_sb),
+            patch.object(emissions, "_emission_full_columns", None),
+            patch.object(emissions, "_emission_upsert_available", None),
+        ):
+            emissions.insert_emissions(self._rows(2))
+            emissions.insert_emissions(self._rows(2))
+            assert emissions._emission_full_columns is False
+            assert emissions._emission_upsert_available is False
+
+        assert table.upsert.call_count == 2
+        assert table.insert.call_count == 2
+        assert all(set(c.args[0][0]) == {"activity_id", "emission_factor_id", "co2e", "calculated_at"} for c in table.insert.call_args_list)
+
+    def test_real_errors_are_not_retried_in_another_shape(self):
+        from postgrest.exceptions import APIError
+        import app.db.emissions as emissions
+
+        mock_sb = MagicMock()
+        table = mock_sb.table.return_value
+        table.upsert.return_value.execute.side_effect = APIError({"message": "violates foreign key constraint", "code": "23503"})
+
+        with (
+            patch.object(emissions, "supabase", mock_sb),
+            patch.object(emissions, "_emission_full_columns", True),
+            patch.object(emissions, "_emission_upsert_available", True),
+        ):
+            with pytest.raises(RuntimeError, match="company_emissions"):
+                emissions.insert_emissions(self._rows(2))
+
+        assert table.upsert.call_count == 1
+        table.insert.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# 23. Schema capabilities
+# ---------------------------------------------------------------------------
+
+class TestSchemaCapabilities:
+
+    _SPEC = {
+        "definitions": {
+            "company_raw_uploads": {"properties": {"id": {}, "status": {}, "quality_score": {}}},
+            "company_parsing_logs": {"properties": {"upload_id": {}, "message": {}, "level": {}, "created_at": {}}},
+            "company_upload_mappings": {"properties": {"raw_upload_id": {}, "original_column": {}, "mapped_field": {}}},
+            "company_emissions": {"properties": {"activity_id": {}, "emission_factor_id": {}, "co2e": {}, "calculated_at": {}}},
+            "unrelated_table": {"properties": {"id": {}}},
+        }
+    }
+
+    @classmethod
+    def _capabilities(cls):
+        from app.db.schema import SchemaCapabilities, _parse_openapi
+
+        return SchemaCapabilities(_parse_openapi(cls._SPEC))
+
+    def test_introspects_once_and_backs_off_after_a_failure(self, monkeypatch):
+        import httpx
+        import app.db.schema as schema
+
+        session = MagicMock()
+        session.get.return_value = MagicMock(json=lambda: self._SPEC)
+        monkeypatch.setattr(schema, "_capabilities", None)
+        monkeypatch.setattr(schema, "_failed_at", None)
+
+        with patch.object(schema.supabase.postgrest, "session", session):
+            first = schema.get_schema_capabilities()
+            assert schema.get_schema_capabilities() is first
+            assert session.get.call_count == 1
+            assert first.has_column("company_raw_uploads", "status") is True
+            assert first.has_column("company_raw_uploads", "parsing_status") is False
+            assert first.has_column("company_activities", "row_index") is None
+            assert "unrelated_table" not in first.tables
+
+            monkeypatch.setattr(schema, "_capabilities", None)
+            session.get.side_effect = httpx.ConnectError("down")
+            assert schema.get_schema_capabilities().tables == {}
+            assert schema.get_schema_capabilities().tables == {}
+            assert session.get.call_count == 2
+
+    def test_writers_send_the_accepted_shape_first(self, monkeypatch):
+        import app.db.emissions as emissions
+        import app.db.logs as logs
+        import app.db.mappings as mappings
+        import app.db.schema as schema
+        import app.db.uploads as uploads
+
+        monkeypatch.setattr(schema, "_capabilities", self._capabilities())
+        monkeypatch.setattr(uploads, "_status_column_cache", None)
+        monkeypatch.setattr(logs, "_accepted_shape", None)
+        monkeypatch.setattr(emissions, "_emission_full_columns", None)
+        monkeypatch.setattr(emissions, "_emission_upsert_available", True)
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(data=[{"id": "m1"}])
+        for module in (uploads, logs, mappings, emissions):
+            monkeypatch.setattr(module, "supabase", mock_sb)
+
+        assert uploads._detect_status_column() == "status"
+        logs.log_parsing_event("u1", "INFO", "hello", row_number=3)
+        assert mappings.get_upload_mapping("u1") == {"id": "m1"}
+        emissions.insert_emissions([{"activity_id": "a1", "co2e": 1.0, "factor_match": "exact"}])
+
+        # No probe queries and no rejected payloads: every write is the first and only one.
+        table = mock_sb.table.return_value
+        assert table.insert.call_count == 1
+        assert set(table.insert.call_args.args[0][0]) == {"upload_id", "message", "level", "created_at"}
+        table.select.return_value.eq.assert_called_once_with("raw_upload_id", "u1")
+        assert table.upsert.call_args.args[0] == [{"activity_id": "a1", "co2e": 1.0}]
+
+    def test_completion_is_one_update_without_unknown_columns(self, monkeypatch):
+        import app.db.schema as schema
+        import app.db.uploads as uploads
+
+        monkeypatch.setattr(schema, "_capabilities", self._capabilities())
+        monkeypatch.setattr(uploads, "_status_column_cache", "status")
+        mock_sb = MagicMock()
+        monkeypatch.setattr(uploads, "supabase", mock_sb)
+
+        uploads.complete_upload("u1", {"quality_score": 0.9, "parsing_checkpoint": None})
+
+        mock_sb.table.return_value.update.assert_called_once_with({"status": "completed", "quality_score": 0.9})
+
+
+# ---------------------------------------------------------------------------
+# 24. Stage timings and metrics
+# ---------------------------------------------------------------------------
+
+class TestStageTimings:
+
+    _STAGES = {
+        "download", "extract", "activity_type_inference", "mapping_load", "row_processing",
+        "activity_insert", "emissions_lookup", "emissions_insert", "log_flush",
+    }
+
+    def test_registry_renders_prometheus_text(self):
+        from app.core.telemetry import Registry
+
+        registry = Registry()
+        counter = registry.counter("t_rows_total", "Rows.", ("stage",))
+        gauge = registry.gauge("t_depth", "Depth.")
+        histogram = registry.histogram("t_seconds", "Seconds.", (0.1, 1), ("stage",))
+        counter.inc(3, stage='say "hi"')
+        gauge.set(7)
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value, stage="x")
+
+        text = registry.render()
+        assert '# TYPE t_rows_total counter\nt_rows_total{stage="say \\"hi\\""} 3.0' in text
+        assert "t_depth 7.0" in text
+        assert 't_seconds_bucket{stage="x",le="0.1"} 2.0' in text
+        assert 't_seconds_bucket{stage="x",le="1.0"} 3.0' in text
+        assert 't_seconds_bucket{stage="x",le="+Inf"} 4.0' in text
+        assert 't_seconds_sum{stage="x"} 5.65' in text
+        assert 't_seconds_count{stage="x"} 4.0' in text
+        with pytest.raises(ValueError):
+            counter.inc(stage="x", other="y")
+
+    def test_sync_pipeline_stores_and_exports_stage_timings(self):
+        from app.core import telemetry
+
+        file_path = str(DATA_DIR / "stationary_combustion_happy.csv")
+        upload = _make_upload(file_path, "stationary_combustion")
+        completed: Dict[str, Any] = {}
+        before = telemetry.stage_wall_seconds.count(stage="row_processing")
+        completed_before = telemetry.uploads_processed.value(status="completed")
+
+        with (
+            patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
+            patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
+            patch(
+                "app.parsing.pipeline.upsert_activities",
+                side_effect=lambda rows: {row["row_index"]: {"id": f"act-{row['row_index']}"} for row in rows},
+            ),
+            patch("app.parsing.pipeline.insert_emissions", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", side_effect=lambda upload_id, fields: completed.update(fields)),
+            patch("app.parsing.pipeline.mark_as_failed", return_value=None),
+            patch("app.parsing.pipeline.update_upload_fields", return_value=None),
+            patch("app.parsing.pipeline.insert_parsing_events", side_effect=len),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=_mock_supabase_with_factor(0.233)),
+        ):
+            from app.parsing.pipeline import run_parsing_pipeline
+            result = run_parsing_pipeline(upload)
+
+        timings = completed["parsing_stage_summary"]["stage_timings"]
+        assert self._STAGES <= set(timings)
+        # The completion update itself is timed after it is written.
+        assert set(result["stage_timings"]) - set(timings) == {"finalize"}
+        extracted = result["stage_counters"]["extracted_rows"]
+        assert timings["row_processing"]["rows"] == extracted
+        assert timings["activity_insert"]["rows"] == result["validated_count"]
+        assert timings["emissions_insert"]["rows"] == result["emissions_calculated_count"]
+        assert all("cpu_seconds" in stage for stage in timings.values())
+        assert timings["row_processing"]["rows_per_second"] > 0
+        assert telemetry.stage_wall_seconds.count(stage="row_processing") == before + 1
+        assert telemetry.uploads_processed.value(status="completed") == completed_before + 1
+
+    def test_async_pipeline_measures_cpu_for_cpu_steps_only(self):
+        from app.parsing.pipeline import run_parsing_pipeline_async
+
+        file_path = str(DATA_DIR / "stationary_combustion_happy.csv")
+        upload = _make_upload(file_path, "stationary_combustion")
+        with ExitStack() as stack:
+            for p in TestAsyncPipeline()._async_patches(file_path, _mock_supabase_with_factor(0.233), [{"id": "act-001"}]):
+                stack.enter_context(p)
+            result = asyncio.run(run_parsing_pipeline_async(upload))
+
+        timings = result["stage_timings"]
+        assert self._STAGES <= set(timings)
+        assert "cpu_seconds" in timings["row_processing"]
+        assert "cpu_seconds" not in timings["download"]
+        assert "cpu_seconds" not in timings["activity_insert"]
+
+    def test_factor_cache_counts_hits_and_misses(self):
+        from app.core import telemetry
+        from app.parsing.emissions import _TTLFactorCache
+
+        cache = _TTLFactorCache(maxsize=4, ttl_seconds=60)
+        key = ("electricity", "kwh", "uk", 2024, "")
+        hits = telemetry.factor_cache_lookups.value(result="hit")
+        misses = telemetry.factor_cache_lookups.value(result="miss")
+
+        assert cache.get(key) is None
+        cache.set(key, {"id": "f1"}, [])
+        assert cache.get(key) == ({"id": "f1"}, [])
+
+        assert telemetry.factor_cache_lookups.value(result="hit") == hits + 1
+        assert telemetry.factor_cache_lookups.value(result="miss") == misses + 1
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        from app.api.metrics import get_ingest_metrics
+
+        response = get_ingest_metrics()
+        assert response.media_type.startswith("text/plain; version=0.0.4")
+        body = response.body.decode()
+        for name in (
+            "stackmint_ingest_stage_wall_seconds",
+            "stackmint_ingest_queue_depth",
+            "stackmint_ingest_claim_seconds",
+            "stackmint_emission_factor_cache_lookups_total",
+        ):
+            assert f"# TYPE {name} " in body
+
+
+# ---------------------------------------------------------------------------
+# 25. Excel streaming
+# ---------------------------------------------------------------------------
+
+class TestExcelStreaming:
+
+    @staticmethod
+    def _workbook(path: pathlib.Path, rows: List[List[Any]]) -> str:
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        return str(path)
+
+    @staticmethod
+    def _records(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        import pandas as pd
+
+        # NaN != NaN, so compare blanks as None.
+        return [{key: None if pd.isna(value) else value for key, value in row.items()} for row in rows]
+
+    def test_streamed_rows_match_pandas(self, tmp_path):
+        from datetime import datetime as dt
+        import pandas as pd
+        from app.parsing.extractors import iter_row_chunks
+
+        path = self._workbook(tmp_path / "fuel.xlsx", [
+            ["date", "fuel", None, "fuel", "consumption"],
+            [dt(2024, 1, 15), "diesel", "x", "petrol", 12.5],
+            [None, None, None, None, None],
+            [dt(2024, 1, 16), "diesel", None, "petrol", 13.5],
+            [dt(2024, 1, 17), "", "y"],
+            [None],
+        ])
+
+        streamed = [row for chunk in iter_row_chunks({"file_path": path}, chunk_size=2) for row in chunk]
+        expected = pd.read_excel(path).to_dict(orient="records")
+
+        assert self._records(streamed) == self._records(expected)
+        assert list(streamed[0]) == ["date", "fuel", "Unnamed: 2", "fuel.1", "consumption"]
+        assert [len(chunk) for chunk in iter_row_chunks({"file_path": path}, chunk_size=2)] == [2, 2]
+
+    def test_max_rows_reads_only_a_sample(self, tmp_path):
+        from app.parsing.extractors import extract_rows, iter_row_chunks
+
+        path = self._workbook(tmp_path / "big.xlsx", [["n"], *[[i] for i in range(50)]])
+        csv_path = str(DATA_DIR / "stationary_combustion_large.csv")
+
+        assert [row["n"] for row in extract_rows({"file_path": path}, max_rows=7)] == list(range(7))
+        assert [len(chunk) for chunk in iter_row_chunks({"file_path": path}, chunk_size=3, max_rows=7)] == [3, 3, 1]
+        assert len(extract_rows({"file_path": csv_path}, max_rows=25)) == 25
+        assert [len(chunk) for chunk in iter_row_chunks({"file_path": csv_path}, chunk_size=10, max_rows=25)] == [10, 10, 5]
+
+    def test_excel_upload_matches_csv_upload(self, tmp_path):
+        import pandas as pd
+
+        csv_path = str(DATA_DIR / "stationary_combustion_large.csv")
+        xlsx_path = str(tmp_path / "stationary_combustion_large.xlsx")
+        pd.read_csv(csv_path).to_excel(xlsx_path, index=False)
+
+        def _run(file_path: str) -> Dict[str, Any]:
+            with (
+                patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
+                patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
+                patch(
+                    "app.parsing.pipeline.upsert_activities",
+                    side_effect=lambda rows: {row["row_index"]: {"id": f"act-{row['row_index']}"} for row in rows},
+                ),
+                patch("app.parsing.pipeline.insert_emissions", return_value=None),
+                patch("app.parsing.pipeline.complete_upload", return_value=None),
+                patch("app.parsing.pipeline.mark_as_failed", return_value=None),
+                patch("app.parsing.pipeline.update_upload_fields", return_value=None),
+                patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+                patch("app.parsing.pipeline.get_supabase_client", return_value=_mock_supabase_with_factor(0.233)),
+            ):
+                from app.parsing.pipeline import run_parsing_pipeline
+                return run_parsing_pipeline(_make_upload(file_path, "stationary_combustion"))
+
+        csv_result, xlsx_result = _run(csv_path), _run(xlsx_path)
+        assert xlsx_result["validated_count"] == csv_result["validated_count"]
+        assert xlsx_result["error_count"] == csv_result["error_count"]
+        assert xlsx_result["emissions_calculated_count"] == csv_result["emissions_calculated_count"]
+        assert xlsx_result["stage_counters"] == csv_result["stage_counters"]
+
+
+# ---------------------------------------------------------------------------
+# 26. Workbook sheets
+# ---------------------------------------------------------------------------
+
+class TestWorkbookSheets:
+
+    @staticmethod
+    def _workbook(path: pathlib.Path, sheets: Dict[str, Any]) -> str:
+        """One sheet per entry: a CSV from DATA_DIR, a list of row dicts, or None for an empty sheet."""
+        import pandas as pd
+
+        with pd.ExcelWriter(path) as writer:
+            for name, content in sheets.items():
+                if content is None:
+                    frame = pd.DataFrame({"notes": []})
+                elif isinstance(content, str):
+                    frame = pd.read_csv(DATA_DIR / content)
+                else:
+                    frame = pd.DataFrame(content)
+                frame.to_excel(writer, sheet_name=name, index=False)
+        return str(path)
+
+    @staticmethod
+    def _run(
+        upload: Dict[str, Any],
+        inserted_rows: List[Dict[str, Any]],
+        completed: List[Dict[str, Any]],
+        events: Optional[List[Dict[str, Any]]] = None,
+        audit: Optional[MagicMock] = None,
+        set_type: Optional[MagicMock] = None,
+    ) -> Dict[str, Any]:
+        file_path = upload["file_path"]
+        events = [] if events is None else events
+
+        def _upsert_activities(rows):
+            inserted_rows.extend(rows)
+            return {row["row_index"]: {"id": f"act-{row['row_index']}"} for row in rows}
+
+        with (
+            patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
+            patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
+            patch("app.parsing.pipeline.upsert_activities", side_effect=_upsert_activities),
+            patch("app.parsing.pipeline.insert_emissions", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", side_effect=lambda upload_id, fields: completed.append(fields)),
+            patch("app.parsing.pipeline.mark_as_failed", return_value=None),
+            patch("app.parsing.pipeline.mark_as_pending_review", return_value=None),
+            patch("app.parsing.pipeline.save_upload_inference_audit", audit or MagicMock()),
+            patch("app.parsing.pipeline.set_upload_activity_type", set_type or MagicMock()),
+            patch("app.parsing.pipeline.update_upload_fields", return_value=None),
+            patch("app.parsing.pipeline.insert_parsing_events", side_effect=lambda batch: events.extend(batch) or len(batch)),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=_mock_supabase_with_factor(0.233)),
+        ):
+            from app.parsing.pipeline import run_parsing_pipeline
+            return run_parsing_pipeline(upload)
+
+    def test_sheets_are_listed_and_read_by_name(self, tmp_path):
+        import pandas as pd
+        from app.parsing.extractors import iter_row_chunks, list_sheet_names
+
+        path = self._workbook(tmp_path / "footprint.xlsx", {
+            "Gas": "stationary_combustion_happy.csv",
+            "Electricity": "purchased_electricity_happy.csv",
+        })
+
+        assert list_sheet_names({"file_path": path}) == ["Gas", "Electricity"]
+        assert list_sheet_names({"file_path": str(DATA_DIR / "stationary_combustion_happy.csv")}) == []
+
+        streamed = [row for chunk in iter_row_chunks({"file_path": path}, sheet_name="Electricity") for row in chunk]
+        assert streamed == pd.read_excel(path, sheet_name="Electricity").to_dict(orient="records")
+        first = [row for chunk in iter_row_chunks({"file_path": path}) for row in chunk]
+        assert first == pd.read_excel(path).to_dict(orient="records")
+
+    def test_each_sheet_is_ingested_with_its_own_activity_type(self, tmp_path):
+        from app.parsing.pipeline import _SHEET_ROW_STRIDE
+
+        path = self._workbook(tmp_path / "footprint.xlsx", {
+            "Gas": "stationary_combustion_large.csv",
+            "Electricity": "purchased_electricity_happy.csv",
+            "Notes": [{"comment": "checked by finance", "owner": "ops"}],
+            "Blank": None,
+        })
+        inserted: List[Dict[str, Any]] = []
+        completed: List[Dict[str, Any]] = []
+        result = self._run(_make_upload(path), inserted, completed)
+
+        gas_rows, gas_completed = [], []
+        gas = self._run(
+            _make_upload(str(DATA_DIR / "stationary_combustion_large.csv"), "stationary_combustion"),
+            gas_rows,
+            gas_completed,
+        )
+
+        types_by_sheet = {
+            row["row_index"] // _SHEET_ROW_STRIDE: row["activity_type"] for row in inserted
+        }
+        assert types_by_sheet == {0: "stationary_combustion", 1: "purchased_electricity"}
+        assert len({row["row_index"] for row in inserted}) == len(inserted)
+
+        sheets = result["stage_counters"]["sheets"]
+        assert [(sheet["sheet"], sheet["status"]) for sheet in sheets] == [
+            ("Gas", "completed"),
+            ("Electricity", "completed"),
+            ("Notes", "skipped"),
+            ("Blank", "empty"),
+        ]
+        assert sheets[0]["validated_rows"] == gas["validated_count"]
+        assert sheets[0]["stage_counters"] == gas["stage_counters"]
+        assert result["validated_count"] == sum(sheet.get("validated_rows", 0) for sheet in sheets)
+        assert result["stage_counters"]["extracted_rows"] == sum(
+            sheet["stage_counters"]["extracted_rows"] for sheet in sheets if sheet["status"] == "completed"
+        )
+
+        assert len(completed) == 1
+        summary = completed[0]["parsing_stage_summary"]
+        assert summary["sheets"] == sheets
+        assert completed[0]["validated_rows"] == result["validated_count"]
+
+    def test_async_driver_runs_sheets_concurrently(self, tmp_path):
+        from app.parsing.pipeline import run_parsing_pipeline_async
+
+        path = self._workbook(tmp_path / "footprint.xlsx", {
+            "Gas": "stationary_combustion_happy.csv",
+            "Electricity": "purchased_electricity_happy.csv",
+        })
+        in_flight = 0
+        most_in_flight = 0
+
+        async def _get_upload_mapping(upload):
+            nonlocal in_flight, most_in_flight
+            in_flight += 1
+            most_in_flight = max(most_in_flight, in_flight)
+            # Both sheets get here together unless they run one after the other.
+            for _ in range(100):
+                if most_in_flight > 1:
+                    break
+                await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {}
+
+        async def _upsert_activities(rows):
+            return {row["row_index"]: {"id": f"act-{row['row_index']}"} for row in rows}
+
+        with (
+            patch("app.parsing.pipeline.resolve_upload_file_path_async", AsyncMock(return_value=(path, None))),
+            patch("app.parsing.pipeline.get_upload_mapping_async", side_effect=_get_upload_mapping),
+            patch("app.parsing.pipeline.upsert_activities_async", side_effect=_upsert_activities),
+            patch("app.parsing.pipeline.insert_emissions_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.complete_upload_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.mark_as_failed_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.insert_parsing_events_async", AsyncMock(return_value=0)),
+            patch("app.parsing.pipeline.save_upload_inference_audit_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.set_upload_activity_type_async", AsyncMock(return_value=None)),
+            patch("app.parsing.pipeline.get_supabase_client", return_value=_mock_supabase_with_factor(0.233)),
+        ):
+            result = asyncio.run(run_parsing_pipeline_async(_make_upload(path)))
+
+        assert most_in_flight == 2
+        assert [sheet["activity_type"] for sheet in result["stage_counters"]["sheets"]] == [
+            "stationary_combustion",
+            "purchased_electricity",
+        ]
+        assert result["validated_count"] == sum(
+            sheet["validated_rows"] for sheet in result["stage_counters"]["sheets"]
+        )
+
+    def test_workbook_with_no_recognisable_sheet_goes_to_review(self, tmp_path):
+        path = self._workbook(tmp_path / "notes.xlsx", {
+            "Notes": [{"comment": "checked by finance"}],
+            "Contacts": [{"owner": "ops", "phone": "0123"}],
+        })
+
+        completed: List[Dict[str, Any]] = []
+        with (
+            patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(path, None)),
+            patch("app.parsing.pipeline.mark_as_pending_review") as pending,
+            patch("app.parsing.pipeline.mark_as_failed", return_value=None),
+            patch("app.parsing.pipeline.complete_upload", side_effect=lambda upload_id, fields: completed.append(fields)),
+            patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+        ):
+            from app.parsing.pipeline import run_parsing_pipeline
+            result = run_parsing_pipeline(_make_upload(path))
+
+        assert result["status"] == "pending_review"
+        assert pending.call_count == 1
+        assert "Notes" in pending.call_args.args[1] and "Contacts" in pending.call_args.args[1]
+        assert completed == []
+
+    def test_explicit_type_only_stands_in_for_first_data_sheet(self, tmp_path):
+        from app.parsing.activity_type_inference import InferenceResult
+        from app.parsing.pipeline import _SHEET_ROW_STRIDE
+
+        path = self._workbook(tmp_path / "footprint.xlsx", {
+            "Blank": None,
+            "Gas": "stationary_combustion_happy.csv",
+            "Totals": "stationary_combustion_happy.csv",
+        })
+        unsure = InferenceResult("stationary_combustion", 0.3, 4.0, "mobile_combustion", 3.5, True)
+        inserted: List[Dict[str, Any]] = []
+        completed: List[Dict[str, Any]] = []
+        with patch("app.parsing.pipeline.infer_activity_type", return_value=unsure):
+            result = self._run(_make_upload(path, "stationary_combustion"), inserted, completed)
+
+        sheets = result["stage_counters"]["sheets"]
+        assert [(sheet["sheet"], sheet["status"]) for sheet in sheets] == [
+            ("Blank", "empty"),
+            ("Gas", "completed"),
+            ("Totals", "skipped"),
+        ]
+        assert "confidence 0.30" in sheets[2]["reason"]
+        # Totals rows are never ingested, so nothing is counted twice.
+        assert {row["row_index"] // _SHEET_ROW_STRIDE for row in inserted} == {1}
+        assert result["validated_count"] == sheets[1]["validated_rows"]
+
+    def test_workbook_upload_records_primary_type_and_audit(self, tmp_path):
+        path = self._workbook(tmp_path / "footprint.xlsx", {
+            "Electricity": "purchased_electricity_happy.csv",
+            "Gas": "stationary_combustion_large.csv",
+        })
+
+        audit, set_type = MagicMock(), MagicMock()
+        # Inference overrides the type given for the upload on both sheets.
+        self._run(_make_upload(path, "mobile_combustion"), [], [], audit=audit, set_type=set_type)
+
+        set_type.assert_called_once_with("test-upload-001", "stationary_combustion")
+        fields = audit.call_args.kwargs
+        assert fields["inferred_activity_type"] == "stationary_combustion"
+        assert fields["activity_type_review_status"] == "auto_corrected"
+        assert "Electricity=purchased_electricity" in fields["activity_type_review_reason"]
+
+    def test_strict_mode_skips_failing_sheet_and_gates_whole_workbook(self, tmp_path):
+        from app.parsing.validation import ValidationError
+
+        lookup = [
+            {"date": "2024-01-15", "facility_id": "FAC-001", "fuel_type": "natural_gas", "consumption": None, "unit": "m3"}
+            for _ in range(5)
+        ]
+        path = self._workbook(tmp_path / "footprint.xlsx", {
+            "Gas": "stationary_combustion_large.csv",
+            "Lookup": lookup,
+        })
+        inserted: List[Dict[str, Any]] = []
+        completed: List[Dict[str, Any]] = []
+        events: List[Dict[str, Any]] = []
+        result = self._run(_make_upload(path, strict_mode=True), inserted, completed, events)
+
+        sheets = result["stage_counters"]["sheets"]
+        assert [(sheet["sheet"], sheet["status"]) for sheet in sheets] == [("Gas", "completed"), ("Lookup", "skipped")]
+        assert len(completed) == 1 and result["emissions_calculated_count"] > 0
+        lookup_events = [event for event in events if "'Lookup'" in event["message"]]
+        assert [event["severity"] for event in lookup_events] == ["WARN"]
+        assert "skipped" in lookup_events[0]["message"]
+
+        # Coverage is judged over the ingested sheets together.
+        with patch("app.parsing.pipeline.STRICT_MIN_COVERAGE", 1.01):
+            with pytest.raises(ValidationError, match="Strict mode"):
+                self._run(_make_upload(path, strict_mode=True), [], [])
+
+
+# ---------------------------------------------------------------------------
+# 27. CSV sniffing
+# ---------------------------------------------------------------------------
+
+class TestCsvSniffing:
+
+    @staticmethod
+    def _european(rows: List[Dict[str, Any]]) -> bytes:
+        """`rows` as a European spreadsheet exports them: a title line, semicolons, decimal commas, cp1252."""
+        lines = ["Rapport énergie 2024", "", ";".join(rows[0])]
+        for row in rows:
+            lines.append(";".join(
+                f"{value:.1f}".replace(".", ",") if isinstance(value, float) else str(value)
+                for value in row.values()
+            ))
+        return ("\n".join(lines) + "\n").encode("cp1252")
+
+    def test_european_export_is_read_as_written(self, tmp_path):
+        from app.parsing.extractors import extract_rows
+        from app.parsing.sniffing import sniff_bytes
+
+        data = (
+            "Rapport énergie 2024\n\n"
+            "date;facility_id;fuel_type;consumption;unit\n"
+            "2024-01-15;Usine Île;natural_gas;1.200,5;m3\n"
+            "2024-02-15;FAC-001;natural_gas;980,0;m3\n"
+        ).encode("cp1252")
+        dialect = sniff_bytes(data)
+
+        assert (dialect.delimiter, dialect.decimal, dialect.thousands, dialect.header_row) == (";", ",", ".", 2)
+        path = tmp_path / "energie.csv"
+        path.write_bytes(data)
+        rows = extract_rows({"file_path": str(path)})
+        assert [row["consumption"] for row in rows] == [1200.5, 980.0]
+        assert rows[0]["facility_id"] == "Usine Île"
+
+    def test_trailing_delimiters_keep_the_header(self, tmp_path):
+        from app.parsing.extractors import extract_rows
+        from app.parsing.sniffing import sniff_bytes
+
+        data = b"date,amount\n" + b"".join(b"2024-01-%02d,%d,\n" % (day, day) for day in range(1, 6))
+        assert sniff_bytes(data).header_row == 0
+
+        path = tmp_path / "trailing.csv"
+        path.write_bytes(data)
+        rows = extract_rows({"file_path": str(path)})
+        assert [(row["date"], row["amount"]) for row in rows[:2]] == [("2024-01-01", 1), ("2024-01-02", 2)]
+
+    def test_quotes_and_tabs_are_detected(self):
+        from app.parsing.sniffing import sniff_bytes
+
+        quoted = sniff_bytes(b"'date','site'\n'2024-01-01','A, B'\n")
+        assert (quoted.delimiter, quoted.quotechar) == (",", "'")
+        tabbed = sniff_bytes(b"date\tconsumption\n2024-01-01\t12,5\n")
+        assert (tabbed.delimiter, tabbed.decimal) == ("\t", ",")
+
+    def test_only_the_head_of_the_file_is_inspected(self, tmp_path):
+        from app.parsing.extractors import extract_rows
+        from app.parsing.sniffing import sniff_csv
+
+        head = b"n,site\n" + b"".join(b"%d,plant\n" % i for i in range(100))
+        path = tmp_path / "long.csv"
+        # A latin-1 byte past the sample can't change the verdict, and doesn't fail the read.
+        path.write_bytes(head + b"100,Usine \xce\n")
+
+        dialect = sniff_csv(path, sample_bytes=len(head))
+        assert (dialect.encoding, dialect.delimiter) == ("utf-8", ",")
+        rows = extract_rows({"file_path": str(path)})
+        assert len(rows) == 101
+        assert rows[-1]["site"].startswith("Usine ")
+
+    def test_european_upload_matches_csv_upload(self, tmp_path):
+        import pandas as pd
+
+        csv_path = str(DATA_DIR / "stationary_combustion_large.csv")
+        european_path = tmp_path / "stationary_combustion_large_eu.csv"
+        european_path.write_bytes(self._european(pd.read_csv(csv_path).to_dict(orient="records")))
+
+        def _run(file_path: str) -> Dict[str, Any]:
+            with (
+                patch("app.parsing.pipeline.resolve_upload_file_path", return_value=(file_path, None)),
+                patch("app.parsing.pipeline.get_upload_mapping", return_value={}),
+                patch(
+                    "app.parsing.pipeline.upsert_activities",
+                    side_effect=lambda rows: {row["row_index"]: {"id": f"act-{row['row_index']}"} for row in rows},
+                ),
+                patch("app.parsing.pipeline.insert_emissions", return_value=None),
+                patch("app.parsing.pipeline.complete_upload", return_value=None),
+                patch("app.parsing.pipeline.mark_as_failed", return_value=None),
+                patch("app.parsing.pipeline.update_upload_fields", return_value=None),
+                patch("app.parsing.pipeline.insert_parsing_events", return_value=0),
+                patch("app.parsing.pipeline.get_supabase_client", return_value=_mock_supabase_with_factor(0.233)),
+            ):
+                from app.parsing.pipeline import run_parsing_pipeline
+                return run_parsing_pipeline(_make_upload(file_path, "stationary_combustion"))
+
+        csv_result, european_result = _run(csv_path), _run(str(european_path))
+        assert european_result["validated_count"] == csv_result["validated_count"]
+        assert european_result["error_count"] == csv_result["error_count"]
+        assert european_result["emissions_calculated_count"] == csv_result["emissions_calculated_count"]
+        assert european_result["stage_counters"] == csv_result["stage_counters"]
+
+
+# ---------------------------------------------------------------------------
+# 28. Upload file cache
+# ---------------------------------------------------------------------------
+
+class TestUploadCache:
+
+    CONTENT = b"date,facility_id,consumption\n2024-01-15,FAC-001,1200.5\n"
+
+    @staticmethod
+    def _storage(objects: Dict[str, Dict[str, Any]], requests: List[str]):
+        """Storage REST API over `objects` (path -> {"content", "etag"}), recording "METHOD path"."""
+        import httpx
+
+        def _handler(request: httpx.Request) -> httpx.Response:
+            path = request.url.path.split("/object/esg-data-2/", 1)[1]
+            requests.append(f"{request.method} {path}")
+            stored = objects.get(path)
+            if stored is None:
+                return httpx.Response(404)
+            headers = {"etag": stored["etag"]} if stored.get("etag") else {}
+            if request.method == "HEAD":
+                return httpx.Response(200, headers=headers)
+            return httpx.Response(200, headers=headers, content=stored["content"])
+
+        return httpx.MockTransport(_handler)
+
+    def _resolve(self, tmp_path, objects, requests, storage_path="org/fuel.csv", max_bytes=1_000_000):
+        import httpx
+        from app.parsing.storage import resolve_upload_file_path
+        from app.parsing.upload_cache import UploadCache
+
+        client = httpx.Client(base_url="http://storage.test/storage/v1/", transport=self._storage(objects, requests))
+        with (
+            patch("app.parsing.storage.get_storage_http_client", return_value=client),
+            patch("app.parsing.storage.get_upload_cache", return_value=UploadCache(tmp_path / "cache", max_bytes)),
+        ):
+            return resolve_upload_file_path({"storage_path": storage_path})
+
+    def test_second_resolve_reuses_the_download(self, tmp_path):
+        objects = {"org/fuel.csv": {"content": self.CONTENT, "etag": '"v1"'}}
+        requests: List[str] = []
+
+        first, first_temp = self._resolve(tmp_path, objects, requests)
+        second, second_temp = self._resolve(tmp_path, objects, requests)
+
+        assert requests == ["HEAD org/fuel.csv", "GET org/fuel.csv", "HEAD org/fuel.csv"]
+        assert (first, second) == (first_temp, second_temp) and first != second
+        assert first.endswith(".csv")
+        # Each caller deletes its own copy without touching the other's or the cache's.
+        pathlib.Path(first).unlink()
+        assert pathlib.Path(second).read_bytes() == self.CONTENT
+        third, _ = self._resolve(tmp_path, objects, requests)
+        assert pathlib.Path(third).read_bytes() == self.CONTENT
+        assert requests.count("GET org/fuel.csv") == 1
+
+    def test_new_version_or_missing_etag_downloads_again(self, tmp_path):
+        objects = {"org/fuel.csv": {"content": self.CONTENT, "etag": '"v1"'}}
+        requests: List[str] = []
+
+        self._resolve(tmp_path, objects, requests)
+        objects["org/fuel.csv"] = {"content": self.CONTENT + b"2024-02-15,FAC-001,980.0\n", "etag": '"v2"'}
+        updated, _ = self._resolve(tmp_path, objects, requests)
+        assert pathlib.Path(updated).read_bytes().endswith(b"980.0\n")
+
+        # Without a version there is nothing safe to key on, so nothing is cached.
+        objects["org/plain.csv"] = {"content": self.CONTENT}
+        self._resolve(tmp_path, objects, requests, storage_path="org/plain.csv")
+        self._resolve(tmp_path, objects, requests, storage_path="org/plain.csv")
+        assert requests.count("GET org/fuel.csv") == 2
+        assert requests.count("GET org/plain.csv") == 2
+
+    def test_least_recently_used_entries_are_evicted_past_the_cap(self, tmp_path):
+        import os
+        from app.parsing.upload_cache import UploadCache
+
+        cache = UploadCache(tmp_path / "cache", max_bytes=250)
+        for key in ("a", "b"):
+            pathlib.Path(cache.store(key, ".csv", [b"x" * 100])).unlink()
+        os.utime(tmp_path / "cache" / "objects" / "a.csv", (1000, 1000))
+        os.utime(tmp_path / "cache" / "objects" / "b.csv", (2000, 2000))
+
+        assert cache.checkout("a", ".csv") is not None
+        checkout = cache.store("c", ".csv", [b"y" * 100])
+
+        assert cache.checkout("b", ".csv") is None
+        assert cache.checkout("a", ".csv") is not None
+        assert pathlib.Path(checkout).read_bytes() == b"y" * 100
+
+    def test_checkout_outlives_its_evicted_entry(self, tmp_path):
+        from app.parsing.upload_cache import UploadCache
+
+        cache = UploadCache(tmp_path / "cache", max_bytes=50)
+        checkout = cache.store("big", ".xlsx", [b"z" * 60, b"z" * 40])
+
+        assert cache.checkout("big", ".xlsx") is None
+        assert pathlib.Path(checkout).read_bytes() == b"z" * 100
+
+    def test_async_resolve_shares_the_cache(self, tmp_path):
+        import httpx
+        from app.parsing.storage import resolve_upload_file_path_async
+        from app.parsing.upload_cache import UploadCache
+
+        objects = {"org/fuel.csv": {"content": self.CONTENT, "etag": '"v1"'}}
+        requests: List[str] = []
+        self._resolve(tmp_path, objects, requests)
+
+        async def _main():
+            client = httpx.AsyncClient(
+                base_url="http://storage.test/storage/v1/",
+                transport=self._storage(objects, requests),
+            )
+            with (
+                patch("app.parsing.storage.get_async_storage_http_client", AsyncMock(return_value=client)),
+                patch("app.parsing.storage.get_upload_cache", return_value=UploadCache(tmp_path / "cache", 1_000_000)),
+            ):
+                return await resolve_upload_file_path_async({"storage_path": "org/fuel.csv"})
+
+        local_path, _ = asyncio.run(_main())
+        assert pathlib.Path(local_path).read_bytes() == self.CONTENT
+        assert requests == ["HEAD org/fuel.csv", "GET org/fuel.csv", "HEAD org/fuel.csv"]